@@ -1,36 +1,34 @@
+"""
+master.csv から references/<キーワード>.md を生成する
+
+内容が変わったファイルだけを書き換え、master.csv から削除されたキーワードのファイルは削除する。
+手で追記したセクション（「## 似ているキーワード」など、masterにない見出し）は書き換え後も残す。
+生成結果（追記したセクションを含む）はこのディレクトリの references から1回だけ組み立て、
+同じ内容を backend/skills にも書き出す。追記はこのディレクトリの references に行う
+（backend/skills 側だけに追記したセクションは次の生成で上書きされる）。
+
+Usage:
+    python generate_references.py          # 変更されたファイルだけを更新
+    python generate_references.py --force  # すべてのファイルを書き直す
+    python generate_references.py --dry-run
+"""
+
 import csv
+import shutil
+import argparse
 from pathlib import Path
 
 BASE_DIR = Path(__file__).parent
 CSV_PATH = BASE_DIR / "master.csv"
 REF_DIR = BASE_DIR / "references"
 
-REF_DIR.mkdir(exist_ok=True)
-
-with CSV_PATH.open("r", encoding="utf-8", newline="") as f:
-    reader = csv.reader(f, delimiter="\t")
-    rows = list(reader)
+# master.csv から生成する見出し（これ以外の見出しのセクションは手で追記したものとして残す）
+GENERATED_SECTIONS = {"対応", "表示例", "判断", "OKの場合", "NGの場合", "備考", "ガイドライン等の出典"}
 
-# 1行目がヘッダーだが、最後の列名が改行を含んでいるため連結する
-header = []
-data_start_index = 1
+# 生成結果の同期先（バックエンドが読み込むスキル）
+BACKEND_SKILL_DIR = BASE_DIR.parents[2] / "backend" / "skills" / BASE_DIR.name
 
-# ヘッダー行の復元
-# rows[0] と rows[1] の先頭列が空で、ヘッダー最終列名が2行に分かれている前提で処理
-if len(rows) >= 2 and len(rows[0]) == len(rows[1]):
-    header = rows[0]
-    # 最後の列名が途中で閉じている可能性があるので、2行目の同じ列位置が空でなければ結合
-    last_idx = len(header) - 1
-    if rows[1][0] == "" and rows[1][last_idx]:
-        header[last_idx] = (header[last_idx] + "\n" + rows[1][last_idx]).strip('"')
-        data_start_index = 2
-else:
-    header = rows[0]
-
-# 列名から必要カラムのインデックスを取得
-col_index = {name: i for i, name in enumerate(header)}
-
-required_cols = [
+REQUIRED_COLS = [
     "番号",
     "チェック用キーワード",
     "対応",
@@ -43,41 +41,79 @@ required_cols = [
     "備考",
 ]
 
-# 「ガイドライン等」の列名は改行を含んでいる可能性があるので曖昧検索
-guideline_key = None
-for name in header:
-    if "ガイドライン等" in name:
-        guideline_key = name
-        break
-
-if guideline_key:
-    required_cols.append(guideline_key)
-
-for row in rows[data_start_index:]:
-    if not row or all(not cell for cell in row):
-        continue
-
-    try:
-        keyword = row[col_index["チェック用キーワード"]].strip()
-    except KeyError:
-        continue
-
-    if not keyword:
-        continue
-
-    # ファイル名用に最低限のサニタイズ（スラッシュだけ別文字に）
-    filename = keyword.replace("/", "／") + ".md"
-    out_path = REF_DIR / filename
-
-    values = {}
-    for col in required_cols:
-        idx = col_index.get(col)
-        if idx is None or idx >= len(row):
-            values[col] = ""
-        else:
-            values[col] = row[idx].strip()
 
-    # Markdown本文生成
+def read_master(csv_path):
+    """
+    master.csv を読み込み、キーワードごとのreferenceの内容を返す
+
+    Returns:
+        {ファイル名（拡張子なし）: Markdown本文}
+    """
+    with csv_path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, delimiter="\t")
+        rows = list(reader)
+
+    # 1行目がヘッダーだが、最後の列名が改行を含んでいるため連結する
+    header = []
+    data_start_index = 1
+
+    # ヘッダー行の復元
+    # rows[0] と rows[1] の先頭列が空で、ヘッダー最終列名が2行に分かれている前提で処理
+    if len(rows) >= 2 and len(rows[0]) == len(rows[1]):
+        header = rows[0]
+        # 最後の列名が途中で閉じている可能性があるので、2行目の同じ列位置が空でなければ結合
+        last_idx = len(header) - 1
+        if rows[1][0] == "" and rows[1][last_idx]:
+            header[last_idx] = (header[last_idx] + "\n" + rows[1][last_idx]).strip('"')
+            data_start_index = 2
+    else:
+        header = rows[0]
+
+    # 列名から必要カラムのインデックスを取得
+    col_index = {name: i for i, name in enumerate(header)}
+
+    required_cols = list(REQUIRED_COLS)
+
+    # 「ガイドライン等」の列名は改行を含んでいる可能性があるので曖昧検索
+    guideline_key = None
+    for name in header:
+        if "ガイドライン等" in name:
+            guideline_key = name
+            break
+
+    if guideline_key:
+        required_cols.append(guideline_key)
+
+    references = {}
+    for row in rows[data_start_index:]:
+        if not row or all(not cell for cell in row):
+            continue
+
+        try:
+            keyword = row[col_index["チェック用キーワード"]].strip()
+        except KeyError:
+            continue
+
+        if not keyword:
+            continue
+
+        values = {}
+        for col in required_cols:
+            idx = col_index.get(col)
+            if idx is None or idx >= len(row):
+                values[col] = ""
+            else:
+                values[col] = row[idx].strip()
+
+        # ファイル名用に最低限のサニタイズ（スラッシュだけ別文字に）
+        ref_name = keyword.replace("/", "／")
+        references[ref_name] = render_reference(keyword, values, guideline_key)
+
+    return references
+
+
+def render_reference(keyword, values, guideline_key):
+    """1キーワード分のMarkdown本文を生成する"""
     lines = []
     lines.append(f"# チェック用キーワード: {keyword}")
     lines.append("")
@@ -115,4 +151,120 @@ for row in rows[data_start_index:]:
         lines.append(values.get(guideline_key, ""))
         lines.append("")
 
-    out_path.write_text("\n".join(lines), encoding="utf-8")
+    return "\n".join(lines)
+
+
+def extra_sections(existing):
+    """既存ファイルのうち、master.csv から生成されない見出しのセクション"""
+    sections = []
+    current = None
+    for line in existing.split("\n"):
+        if line.startswith("## "):
+            current = None if line[3:].strip() in GENERATED_SECTIONS else [line]
+            if current:
+                sections.append(current)
+        elif current is not None:
+            current.append(line)
+    return ["\n".join(section).rstrip("\n") for section in sections]
+
+
+def build_references(references, source_dir):
+    """
+    出力するファイルの内容を組み立てる
+
+    master.csv から生成した本文に、source_dir の既存ファイルで手で追記したセクションを加える
+
+    Returns:
+        {ファイル名（拡張子なし）: ファイルの内容（bytes）}
+    """
+    contents = {}
+    for ref_name, content in references.items():
+        source_path = source_dir / f"{ref_name}.md"
+        if source_path.exists():
+            extras = extra_sections(source_path.read_text(encoding="utf-8"))
+            if extras:
+                content = "\n\n".join([content.rstrip("\n"), *extras])
+        contents[ref_name] = content.encode("utf-8")
+    return contents
+
+
+def sync_references(contents, ref_dir, force=False, dry_run=False):
+    """
+    references ディレクトリを build_references の出力に合わせる
+
+    内容が既存ファイルと同じキーワードは書き換えない
+
+    Returns:
+        {"added": [...], "updated": [...], "removed": [...], "unchanged": 件数}
+    """
+    changes = {"added": [], "updated": [], "removed": [], "unchanged": 0}
+    if not dry_run:
+        ref_dir.mkdir(parents=True, exist_ok=True)
+
+    for ref_name, content in contents.items():
+        out_path = ref_dir / f"{ref_name}.md"
+        existing = out_path.read_bytes() if out_path.exists() else None
+
+        if existing is None:
+            changes["added"].append(ref_name)
+        elif existing == content and not force:
+            changes["unchanged"] += 1
+            continue
+        else:
+            changes["updated"].append(ref_name)
+
+        if not dry_run:
+            out_path.write_bytes(content)
+
+    # master.csv から削除されたキーワード
+    for path in sorted(ref_dir.glob("*.md")):
+        if path.stem not in contents:
+            changes["removed"].append(path.stem)
+            if not dry_run:
+                path.unlink()
+
+    return changes
+
+
+def sync_skill_file(target_dir, dry_run=False):
+    """SKILL.md を同期先にコピーする（内容が同じなら何もしない）"""
+    source = BASE_DIR / "SKILL.md"
+    target = target_dir / "SKILL.md"
+    if target.exists() and target.read_bytes() == source.read_bytes():
+        return False
+    if not dry_run:
+        target_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, target)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="master.csv から references を生成する")
+    parser.add_argument("--force", action="store_true", help="変更の有無にかかわらずすべてのファイルを書き直す")
+    parser.add_argument("--dry-run", action="store_true", help="変更内容を表示するだけでファイルは書き換えない")
+    parser.add_argument("--no-sync", action="store_true", help="backend/skills への同期を行わない")
+    args = parser.parse_args()
+
+    # 追記したセクションはこのディレクトリの references から読み、すべての出力先に同じ内容を書き出す
+    contents = build_references(read_master(CSV_PATH), REF_DIR)
+
+    targets = [REF_DIR]
+    if not args.no_sync:
+        targets.append(BACKEND_SKILL_DIR / "references")
+
+    for ref_dir in targets:
+        changes = sync_references(contents, ref_dir, force=args.force, dry_run=args.dry_run)
+        print(
+            f"{ref_dir}: 追加 {len(changes['added'])}件 / 更新 {len(changes['updated'])}件 / "
+            f"削除 {len(changes['removed'])}件 / 変更なし {changes['unchanged']}件"
+        )
+        for label in ("added", "updated", "removed"):
+            for ref_name in changes[label]:
+                print(f"  {label}: {ref_name}")
+
+    if not args.no_sync and sync_skill_file(BACKEND_SKILL_DIR, dry_run=args.dry_run):
+        print(f"{BACKEND_SKILL_DIR / 'SKILL.md'}: 更新")
+
+
+if __name__ == "__main__":
+    main()
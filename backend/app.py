@@ -4,16 +4,37 @@ Provides API endpoints for product copy checking with Excel support
 """
 
 import os
-import io
+import re
+import json
+import time
+import shutil
 import logging
+import tempfile
+import threading
+import functools
+import itertools
+import contextvars
+import unicodedata
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
+import httpx
 import litellm
 import pandas as pd
 from skill_manager import SkillManager
+from result_cache import ResultCache
+from job_manager import JobManager
+from excel_io import CheckSheetReader, ResultWorkbookWriter, SUMMARY_SHEET_NAME
+from prescreen import REASON_NO_KEYWORDS, REASON_EXEMPT_TERM, REASON_CATEGORY
+import structured_output
+import metrics
+from rate_limiter import LLMScheduler, retry_reason
+from web_fetcher import WebFetcher
+from batching import estimate_tokens, plan_batches, build_batch_message, split_batch_response
 
 # Load environment variables
 load_dotenv()
@@ -54,82 +75,1218 @@ os.environ["OPENAI_API_KEY"] = os.getenv('OPENAI_API_KEY', 'sk-xxxxxx')
 LITELLM_API_BASE = os.getenv('LITELLM_API_BASE', 'https://askul-gpt.askul-it.com/v1')
 LITELLM_MODEL = os.getenv('LITELLM_MODEL', 'gpt-5-mini')
 
-# LiteLLMのリトライ設定（エラー時のリトライ回数を制限）
-litellm.num_retries = 2  # デフォルト3回から2回に減らす
-litellm.request_timeout = 120  # タイムアウトを120秒に設定
+# LiteLLMのリトライ設定（再試行は llm_scheduler がバックオフ付きで行うため、LiteLLM自体は再試行しない）
+litellm.num_retries = 0
+# LLM呼び出し1回あたりのタイムアウト（秒）
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS') or '120')
+litellm.request_timeout = LLM_TIMEOUT_SECONDS
+
+# LLMの出力形式: text（SKILL.mdのMarkdown形式）/ json（JSONスキーマによる構造化出力）
+CHECK_OUTPUT_FORMAT = os.getenv('CHECK_OUTPUT_FORMAT', 'text').lower()
+STRUCTURED_OUTPUT = CHECK_OUTPUT_FORMAT == 'json'
+# 1商品あたりの最大出力トークン数（構造化出力では冗長な文章がないため小さくできる）
+CHECK_MAX_TOKENS = int(os.getenv('CHECK_MAX_TOKENS') or ('2048' if STRUCTURED_OUTPUT else '4096'))
+
+# Excel一括チェックの同時実行数（LLMへの最大同時リクエスト数）
+CHECK_MAX_WORKERS = max(1, int(os.getenv('CHECK_MAX_WORKERS', '8')))
+
+# LLMゲートウェイのレート制限（1分あたりのリクエスト数・トークン数、0で無制限）
+LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE') or '0')
+LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE') or '0')
+# レート制限を分け合うプロセス数（gunicorn.conf.py がワーカー数を設定する）
+# 制限はプロセスごとに守るため、全体の制限をプロセス数で割った値を各プロセスの制限とする
+LLM_RATE_LIMIT_PROCESSES = max(1, int(os.getenv('LLM_RATE_LIMIT_PROCESSES') or '1'))
+
+
+def per_process_limit(limit):
+    """Share of a gateway-wide per-minute limit for one process (0 = unlimited)"""
+    return max(1, limit // LLM_RATE_LIMIT_PROCESSES) if limit else 0
+
+# 429・5xx・タイムアウト時の試行回数（初回を含む）と、再試行までの待ち時間（指数バックオフ + ジッター）
+LLM_MAX_ATTEMPTS = max(1, int(os.getenv('LLM_MAX_ATTEMPTS') or '4'))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv('LLM_BACKOFF_BASE_SECONDS') or '1')
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv('LLM_BACKOFF_MAX_SECONDS') or '60')
+# 再試行しても一時的なエラーになった行を、そのチャンクの最後に再チェックする回数（0で再チェックしない）
+CHECK_REQUEUE_PASSES = max(0, int(os.getenv('CHECK_REQUEUE_PASSES') or '1'))
+
+# LLM呼び出しのスケジューラー（過負荷を検知すると同時実行数を CHECK_MAX_WORKERS から自動で下げ、成功が続くと戻す）
+llm_scheduler = LLMScheduler(
+    CHECK_MAX_WORKERS,
+    requests_per_minute=per_process_limit(LLM_REQUESTS_PER_MINUTE),
+    tokens_per_minute=per_process_limit(LLM_TOKENS_PER_MINUTE),
+    max_attempts=LLM_MAX_ATTEMPTS,
+    backoff_base=LLM_BACKOFF_BASE_SECONDS,
+    backoff_max=LLM_BACKOFF_MAX_SECONDS,
+    on_retry=lambda reason: metrics.RETRIES.inc(reason=reason)
+)
+
+# 一括チェックで一度に読み込んで処理する行数（メモリ使用量の上限を決める）
+CHECK_CHUNK_SIZE = max(1, int(os.getenv('CHECK_CHUNK_SIZE', '500')))
+
+# 複数商品を1リクエストにまとめる件数（1の場合はバッチ化しない）
+CHECK_BATCH_SIZE = max(1, int(os.getenv('CHECK_BATCH_SIZE', '1')))
+# バッチ1リクエストあたりのプロンプトトークン数の目安（SKILL.md本文 + references + 商品情報）
+CHECK_BATCH_TOKEN_BUDGET = int(os.getenv('CHECK_BATCH_TOKEN_BUDGET', '24000'))
+# バッチ1リクエストあたりの最大出力トークン数
+CHECK_BATCH_MAX_TOKENS = int(os.getenv('CHECK_BATCH_MAX_TOKENS', '16384'))
+
+# URLチェックで取得した商品ページの本文（Excelにはない列）
+PAGE_TEXT_COLUMN = 'ページ本文'
+
+# チェック対象列（商品名以外）
+CHECK_COLUMNS = [
+    '*変更前_商品の特徴BtoB',
+    '*変更前_MDおすすめコメントBtoB',
+    '*変更前_短いキャッチコピーBtoB',
+    '*変更前_キャッチコピーBtoC',
+    '*変更前_商品の特徴BtoC',
+    PAGE_TEXT_COLUMN
+]
+
+# 列ごとに個別にLLMでチェックし、列のテキスト単位で結果をキャッシュする
+# （1列だけ変更された場合、その列だけを再チェックする。CHECK_BATCH_SIZE は無視される）
+CHECK_FIELD_MODE = os.getenv('CHECK_FIELD_MODE', 'False').lower() == 'true'
+
+# 行全体の結論は、各列の結論のうち最も重いものに合わせる
+CONCLUSION_SEVERITY = ['OK', 'UNKNOWN', 'ERROR', 'NG']
+
+# 商品名以外のチェック対象が同一の行は1回だけLLMでチェックし、結果を共有する
+CHECK_DEDUP_ENABLED = os.getenv('CHECK_DEDUP_ENABLED', 'True').lower() == 'true'
+# チャンクをまたいで共有するチェック結果の最大件数
+CHECK_DEDUP_MAX_ENTRIES = int(os.getenv('CHECK_DEDUP_MAX_ENTRIES', '10000'))
+
+# 明らかに問題のない行をLLMに送らずOKと判定する（ルールは各スキルの prescreen.yaml）
+# LLMを通さずに結論が変わるため、明示的に有効にした場合だけ使う
+PRESCREEN_ENABLED = os.getenv('PRESCREEN_ENABLED', 'False').lower() == 'true'
+# チェックのモード: LLMでチェックする通常モードと、references と商品カテゴリーから
+# LLMを使わずに暫定判定する高速モード（ルールは各スキルの fast_rules.yaml）
+CHECK_MODE_LLM = 'llm'
+CHECK_MODE_FAST = 'fast'
+CHECK_MODES = (CHECK_MODE_LLM, CHECK_MODE_FAST)
+# 一括チェックで各行をどう判定したか（事前判定・重複・LLM）の累計件数（/api/health で確認）
+decision_totals = Counter()
+decision_lock = threading.Lock()
+
+# 検出キーワードの組み合わせごとにsystem_promptをメモ化する件数
+PROMPT_CACHE_SIZE = int(os.getenv('PROMPT_CACHE_SIZE', '1024'))
+# system_promptのトークン数の上限（超える場合は references の出典・表示例・備考を省略、0で無制限）
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET') or '16000')
+
+
+def count_tokens(text):
+    """
+    Count the tokens of a text for the configured model
+    
+    モデルのトークナイザーが使えない場合は文字数で見積もる
+    """
+    try:
+        return litellm.token_counter(model=LITELLM_MODEL, text=text)
+    except Exception:
+        return estimate_tokens(text)
+
+
+# 同じsystem_promptは何度も数えるためメモ化する
+count_prompt_tokens = functools.lru_cache(maxsize=PROMPT_CACHE_SIZE)(count_tokens)
+
 
 # Initialize Skill Manager
 SKILLS_DIR = Path(__file__).parent / "skills"
-skill_manager = SkillManager(SKILLS_DIR)
+skill_manager = SkillManager(
+    SKILLS_DIR,
+    prompt_cache_size=PROMPT_CACHE_SIZE,
+    prompt_suffix=structured_output.OUTPUT_INSTRUCTION if STRUCTURED_OUTPUT else '',
+    token_counter=count_prompt_tokens,
+    prompt_token_budget=PROMPT_TOKEN_BUDGET
+)
 skill_manager.load_all_skills()
 
+# Initialize Result Cache（同一プロンプト・同一商品テキスト・同一モデルの結果を再利用）
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'True').lower() == 'true'
+result_cache = None
+if RESULT_CACHE_ENABLED:
+    result_cache = ResultCache(
+        os.getenv('RESULT_CACHE_PATH') or str(Path(__file__).parent / "cache" / "results.sqlite3"),
+        ttl_seconds=int(os.getenv('RESULT_CACHE_TTL_SECONDS', str(30 * 24 * 3600))),
+        max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '100000'))
+    )
+    result_cache.purge_expired()
+    # SKILL.md / references / ルールファイルが変更されていれば該当スキルのキャッシュを破棄
+    for _skill in skill_manager.skills.values():
+        result_cache.sync_skill_fingerprint(_skill['name'], _skill['fingerprint'])
+
+
+def on_skills_reloaded(skill_names):
+    """Drop cached results of skills that were reloaded while running"""
+    if not result_cache:
+        return
+    for skill_name in skill_names:
+        skill = skill_manager.get_skill_by_name(skill_name)
+        if skill:
+            result_cache.sync_skill_fingerprint(skill_name, skill['fingerprint'])
+
+
+# SKILL.md / references / prescreen.yaml / バンドルの変更を監視し、再起動なしで反映する（0で無効）
+# 監視スレッドは start_worker で各ワーカープロセスに起動する
+SKILL_RELOAD_INTERVAL = float(os.getenv('SKILL_RELOAD_INTERVAL') or '5')
+
+
+def iter_check_fields(row):
+    """
+    Yield the non-empty check columns of an Excel row
+    
+    Args:
+        row: Row data (dict or pandas Series)
+        
+    Yields:
+        Tuples of (column name, value)
+    """
+    for column in CHECK_COLUMNS:
+        if column in row and pd.notna(row[column]) and row[column] != '':
+            yield column, row[column]
+
+
+def build_product_message(row):
+    """
+    Build a product message from Excel row data
+    
+    Args:
+        row: Pandas Series containing product data
+        
+    Returns:
+        Tuple: (product_message, has_check_data)
+        - product_message: String containing formatted product information
+        - has_check_data: Boolean indicating if there's data to check (other than product name)
+    """
+    message_parts = []
+    has_check_data = False
+    
+    # 商品名を最初に追加
+    if '*商品名' in row and pd.notna(row['*商品名']) and row['*商品名'] != '':
+        message_parts.append(f"商品名: {row['*商品名']}")
+    
+    # チェック対象列を追加
+    for column, value in iter_check_fields(row):
+        message_parts.append(f"{column}: {value}")
+        has_check_data = True
+    
+    return "\n".join(message_parts), has_check_data
+
+
+def build_dedup_key(product_message):
+    """
+    Build the key identifying rows whose check content is identical
+    
+    The product name line is left out so that colour/size variants sharing the
+    same copy are checked once; text is NFKC-normalized and whitespace collapsed
+    
+    Args:
+        product_message: Output of build_product_message
+        
+    Returns:
+        Normalized check content
+    """
+    lines = product_message.split('\n')
+    if lines and lines[0].startswith('商品名: '):
+        lines = lines[1:]
+    
+    text = unicodedata.normalize('NFKC', '\n'.join(lines))
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def format_shared_result(source_row_index, result_text):
+    """Build the result text of a row that reuses the check of an identical row"""
+    return f"（行 {source_row_index + 1} と同じチェック対象のため、同じ結果を適用）\n{result_text}"
+
+
+def extract_conclusion(result_text):
+    """
+    Extract OK/NG conclusion from LLM result
+    
+    Args:
+        result_text: Text result from LLM
+        
+    Returns:
+        "OK" or "NG" or "UNKNOWN"
+    """
+    # Look for conclusion pattern in the result
+    # 複数商品の回答では「結論」が商品ごとにあるため、すべて確認していずれかがNGならNG
+    lines = result_text.split('\n')
+    conclusions = set()
+    for idx, line in enumerate(lines):
+        if '結論' in line:
+            # Check the next few lines for OK or NG
+            for i in range(idx, min(idx + 5, len(lines))):
+                if 'NG' in lines[i]:
+                    conclusions.add("NG")
+                    break
+                elif 'OK' in lines[i]:
+                    conclusions.add("OK")
+                    break
+    
+    if conclusions:
+        return "NG" if "NG" in conclusions else "OK"
+    
+    # Fallback: search entire text
+    if 'NG' in result_text:
+        return "NG"
+    elif 'OK' in result_text:
+        return "OK"
+    
+    return "UNKNOWN"
+
+
+def call_llm(system_prompt, user_message, max_tokens=None, stream=False):
+    """
+    Call the LLM with the given system prompt and user message
+    
+    Args:
+        system_prompt: System prompt built from the skill
+        user_message: Product information to check
+        max_tokens: Maximum number of output tokens (default: CHECK_MAX_TOKENS)
+        stream: Return the answer as a stream of chunks (the last chunk carries the usage)
+        
+    Returns:
+        LiteLLM response object (or chunk stream when stream is True)
+    """
+    extra_params = {}
+    if STRUCTURED_OUTPUT:
+        extra_params['response_format'] = structured_output.RESPONSE_FORMAT
+    if stream:
+        extra_params['stream'] = True
+        extra_params['stream_options'] = {'include_usage': True}
+    
+    system_tokens = count_prompt_tokens(system_prompt)
+    user_tokens = count_tokens(user_message)
+    logger.info(
+        f"LLM呼び出し: プロンプト {system_tokens + user_tokens} tokens "
+        f"(system {system_tokens} + user {user_tokens})"
+    )
+    
+    def request():
+        try:
+            with metrics.LLM_REQUEST_SECONDS.time():
+                return litellm.completion(
+                    model=LITELLM_MODEL,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": system_prompt
+                        },
+                        {
+                            "role": "user",
+                            "content": user_message
+                        }
+                    ],
+                    api_base=LITELLM_API_BASE,
+                    max_tokens=max_tokens or CHECK_MAX_TOKENS,
+                    timeout=LLM_TIMEOUT_SECONDS,
+                    **extra_params
+                )
+        except Exception as e:
+            metrics.LLM_ERRORS.inc(type=type(e).__name__)
+            raise
+    
+    # レート制限内で呼び出し、429・5xx・タイムアウトはバックオフして再試行する
+    # （トークン数はプロンプト分を先に確保し、出力分は応答後（ストリームでは受信し終えた後）に差し引く）
+    response = llm_scheduler.call(
+        request,
+        prompt_tokens=system_tokens + user_tokens,
+        used_tokens=lambda response: response.usage.total_tokens if getattr(response, 'usage', None) else None,
+        stream=stream
+    )
+    
+    # ストリームでは所要時間は最初の応答までとなり、トークン数は受信し終えた呼び出し側で記録する
+    if stream:
+        return response
+    
+    metrics.PROMPT_TOKENS.observe(response.usage.prompt_tokens)
+    metrics.COMPLETION_TOKENS.observe(response.usage.completion_tokens)
+    return response
+
+
+def interpret_response(result_text):
+    """
+    Turn an LLM answer into the report text and conclusion
+    
+    Args:
+        result_text: Content of the LLM response
+        
+    Returns:
+        Tuple: (report_text, conclusion)
+        - 構造化出力ではJSONをそのまま解釈し、SKILL.mdの形式に整形した文章を返す
+    """
+    if not STRUCTURED_OUTPUT:
+        return result_text, extract_conclusion(result_text)
+    
+    try:
+        products = structured_output.parse_result(result_text)
+    except ValueError as e:
+        logger.warning(f"構造化出力を解釈できません: {e}")
+        return result_text, "UNKNOWN"
+    
+    return structured_output.render_result(products), structured_output.overall_conclusion(products)
+
+
+def split_answers(result_text, product_count):
+    """
+    Split a batched LLM answer into per-product report texts and conclusions
+    
+    Args:
+        result_text: Content of the LLM response to a batch message
+        product_count: Number of products in the batch
+        
+    Returns:
+        Dictionary mapping 1-based product ids to (report_text, conclusion)
+        (products without an answer are missing from the dictionary)
+    """
+    if not STRUCTURED_OUTPUT:
+        return {
+            product_id: (section, extract_conclusion(section))
+            for product_id, section in split_batch_response(result_text, product_count).items()
+        }
+    
+    try:
+        products = structured_output.parse_result(result_text)
+    except ValueError as e:
+        logger.warning(f"構造化出力を解釈できません: {e}")
+        return {}
+    
+    answers = {}
+    for product in products:
+        product_id = product.get('product_id')
+        if isinstance(product_id, int) and 1 <= product_id <= product_count and product_id not in answers:
+            answers[product_id] = (
+                structured_output.render_product(product),
+                structured_output.product_conclusion(product)
+            )
+    return answers
+
+
+def find_keywords(skill_name, text):
+    """Detect the keywords of a product text (timed for /api/metrics)"""
+    with metrics.KEYWORD_DETECTION_SECONDS.time():
+        return skill_manager.find_keyword_matches(skill_name, text)
+
+
+def build_prompt(skill_name, detected_keywords):
+    """Build the dynamic system prompt for detected keywords (timed for /api/metrics)"""
+    with metrics.PROMPT_BUILD_SECONDS.time():
+        return skill_manager.build_dynamic_system_prompt(skill_name, detected_keywords)
+
+
+def lookup_result(cache_key):
+    """Look up the result cache and count hits and misses for /api/metrics"""
+    cached = result_cache.get(cache_key)
+    metrics.RESULT_CACHE_LOOKUPS.inc(result='hit' if cached else 'miss')
+    return cached
+
+
+def run_check(skill_name, system_prompt, user_message):
+    """
+    Check a product with the LLM, reusing a cached result when available
+    
+    Args:
+        skill_name: Name of the skill used to build the prompt
+        system_prompt: System prompt built from the skill
+        user_message: Product information to check
+        
+    Returns:
+        Dictionary with result_text, conclusion, usage and cached flag
+    """
+    cache_key = None
+    if result_cache:
+        cache_key = ResultCache.make_key(system_prompt, user_message, LITELLM_MODEL)
+        cached = lookup_result(cache_key)
+        if cached:
+            return {**cached, 'cached': True}
+    
+    response = call_llm(system_prompt, user_message)
+    
+    result_text, conclusion = interpret_response(response.choices[0].message.content)
+    usage = {
+        'input_tokens': response.usage.prompt_tokens,
+        'output_tokens': response.usage.completion_tokens
+    }
+    
+    # 判定不能な結果はキャッシュせず、次回再チェックさせる
+    if result_cache and conclusion != "UNKNOWN":
+        result_cache.put(cache_key, skill_name, result_text, conclusion, usage)
+    
+    return {
+        'result_text': result_text,
+        'conclusion': conclusion,
+        'usage': usage,
+        'cached': False
+    }
+
+
+def sse_event(event, data, event_id=None):
+    """Format a Server-Sent Events message with a JSON payload"""
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def stream_check(skill_name, product_info):
+    """
+    Check a product and relay the LLM answer as Server-Sent Events while it is generated
+    
+    Events:
+        keywords: {"detected_keywords": [...]}
+        token: {"text": "..."} for each chunk of the answer
+        result: same payload as the non-streaming /api/check response
+        error: {"error": "..."}
+    """
+    try:
+        detected_keywords = list(find_keywords(skill_name, product_info))
+        system_prompt = build_prompt(skill_name, detected_keywords)
+        yield sse_event('keywords', {'detected_keywords': detected_keywords})
+        
+        cache_key = None
+        if result_cache:
+            cache_key = ResultCache.make_key(system_prompt, product_info, LITELLM_MODEL)
+            cached = lookup_result(cache_key)
+            if cached:
+                yield sse_event('result', {
+                    'result': cached['result_text'],
+                    'conclusion': cached['conclusion'],
+                    'detected_keywords': detected_keywords,
+                    'usage': cached['usage'],
+                    'cached': True
+                })
+                return
+        
+        parts = []
+        usage = None
+        for chunk in call_llm(system_prompt, product_info, stream=True):
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield sse_event('token', {'text': chunk.choices[0].delta.content})
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+        
+        answer = ''.join(parts)
+        result_text, conclusion = interpret_response(answer)
+        usage = {
+            'input_tokens': usage.prompt_tokens if usage else count_prompt_tokens(system_prompt) + count_tokens(product_info),
+            'output_tokens': usage.completion_tokens if usage else count_tokens(answer)
+        }
+        metrics.PROMPT_TOKENS.observe(usage['input_tokens'])
+        metrics.COMPLETION_TOKENS.observe(usage['output_tokens'])
+        
+        # 判定不能な結果はキャッシュせず、次回再チェックさせる
+        if result_cache and conclusion != "UNKNOWN":
+            result_cache.put(cache_key, skill_name, result_text, conclusion, usage)
+        
+        yield sse_event('result', {
+            'result': result_text,
+            'conclusion': conclusion,
+            'detected_keywords': detected_keywords,
+            'usage': usage,
+            'cached': False
+        })
+    except Exception as e:
+        logger.error(f"ストリーミングチェックでエラー: {e}", exc_info=True)
+        yield sse_event('error', {'error': str(e)})
+
+
+def event_stream_response(events):
+    """Build a text/event-stream response that is not buffered by proxies"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def prepare_row(row_index, row, skill_name):
+    """
+    Build the check payload of an Excel row and detect its keywords
+    
+    Args:
+        row_index: 0-based row index in the sheet
+        row: Pandas Series containing product data
+        skill_name: Name of the skill to use
+        
+    Returns:
+        Dictionary with row_index, product_message, detected_keywords and the row itself.
+        'result' holds (result_text, conclusion) when the row is decided without the LLM,
+        'prescreen' the reason code when the pre-screen decided it
+    """
+    row_number = row_index + 1
+    item = {
+        'row_index': row_index,
+        'product_message': '',
+        'detected_keywords': [],
+        'result': None,
+        'prescreen': None,
+        'row': row
+    }
+    
+    # Build product message from row
+    product_message, has_check_data = build_product_message(row)
+    item['product_message'] = product_message
+    
+    # Skip empty rows
+    if not product_message or product_message.strip() == '':
+        logger.warning(f"行 {row_number} はスキップ（空行）")
+        item['result'] = ("(空行)", "SKIPPED")
+        return item
+    
+    # チェックデータが存在しない場合（商品名のみの場合）
+    if not has_check_data:
+        logger.warning(f"行 {row_number} はチェックデータなし（商品名のみ）")
+        item['result'] = ("チェックデータが存在しません（商品名以外の列にデータがありません）", "NO_DATA")
+        return item
+    
+    # 商品テキストからキーワードを検出
+    keyword_matches = find_keywords(skill_name, product_message)
+    detected_keywords = list(keyword_matches.keys())
+    item['detected_keywords'] = detected_keywords
+    
+    # 事前判定: 明らかに問題のない行はLLMに送らない
+    if PRESCREEN_ENABLED:
+        decision = skill_manager.prescreen(skill_name, product_message, keyword_matches, row)
+        if decision:
+            reason_code, reason = decision
+            logger.info(f"行 {row_number}: 事前判定でOK（{reason}）")
+            item['prescreen'] = reason_code
+            item['result'] = (format_prescreen_result(row, detected_keywords, reason), "OK")
+            return item
+    
+    # 検出されたキーワード（references/*.mdファイル）をログ出力
+    if detected_keywords:
+        logger.info(f"行 {row_number}: 検出されたキーワード数 = {len(detected_keywords)}")
+        logger.info(f"  → 使用するreferencesファイル: {', '.join(sorted(detected_keywords))}")
+    else:
+        logger.info(f"行 {row_number}: キーワード検出なし（一般的なチェックのみ実施）")
+    
+    return item
+
+
+def format_prescreen_result(row, detected_keywords, reason):
+    """
+    Build a result text for a row decided by the pre-screen, in the same layout as the LLM output
+    
+    Args:
+        row: Row data of the product
+        detected_keywords: Keywords detected in the row
+        reason: Why the row was judged OK
+        
+    Returns:
+        Result text with conclusion OK
+    """
+    product_name = row['*商品名'] if '*商品名' in row and pd.notna(row['*商品名']) else ''
+    lines = [
+        f"- {product_name}",
+        "  - 結論",
+        "    - OK",
+        "  - 根拠(対象キーワード)"
+    ]
+    lines.extend(f"    - {keyword}" for keyword in detected_keywords or ['なし'])
+    lines.extend([
+        "  - コメント・懸念点",
+        "    - 項目１",
+        "      - 内容: 事前判定（LLMチェックなし）",
+        f"      - 理由: {reason}",
+        "      - 修正案: なし"
+    ])
+    return "\n".join(lines)
+
+
+FULLWIDTH_DIGITS = str.maketrans('0123456789', '０１２３４５６７８９')
+
+
+def format_fast_result(product_name, evaluation):
+    """
+    Build a result text for a product judged in fast mode, in the same layout as the LLM output
+    
+    Args:
+        product_name: Name of the product
+        evaluation: Output of SkillManager.fast_check
+        
+    Returns:
+        Result text with the per-keyword verdicts
+    """
+    if evaluation['product_class']:
+        product_class = f"{evaluation['product_class']}（{evaluation['category_column']}）"
+    else:
+        product_class = "不明"
+    
+    lines = [
+        f"- {product_name}",
+        "  - 結論",
+        f"    - {evaluation['conclusion']}",
+        "  - 根拠(対象キーワード)"
+    ]
+    lines.extend(f"    - {item['keyword']}" for item in evaluation['verdicts'] or [{'keyword': 'なし'}])
+    lines.extend([
+        "  - コメント・懸念点",
+        "    - 項目１",
+        "      - 内容: 高速モード（LLMチェックなしの暫定判定）",
+        f"      - 理由: 薬事区分: {product_class}"
+    ])
+    
+    # 項目の番号はLLMの出力と同じく全角
+    numbers = (str(number).translate(FULLWIDTH_DIGITS) for number in itertools.count(2))
+    for item in evaluation['verdicts']:
+        lines.extend([
+            f"    - 項目{next(numbers)}",
+            f"      - 内容: 「{item['keyword']}」 {item['verdict']}",
+            f"      - 理由: {item['reason']}"
+        ])
+    if evaluation['risk_expression']:
+        lines.extend([
+            f"    - 項目{next(numbers)}",
+            f"      - 内容: 「{evaluation['risk_expression']}」 REVIEW",
+            "      - 理由: キーワード以外の注意表現（効能効果・最上級・価格表示など）"
+        ])
+    return "\n".join(lines)
+
+
+def fast_check_row(row, skill_name):
+    """
+    Judge an Excel row in fast mode
+    
+    Args:
+        row: Row data (dict or pandas Series)
+        skill_name: Name of the skill to use
+        
+    Returns:
+        Tuple: (result_text, conclusion)
+    """
+    product_message, has_check_data = build_product_message(row)
+    if not product_message or product_message.strip() == '':
+        return "(空行)", "SKIPPED"
+    if not has_check_data:
+        return "チェックデータが存在しません（商品名以外の列にデータがありません）", "NO_DATA"
+    
+    detected_keywords = list(find_keywords(skill_name, product_message))
+    evaluation = skill_manager.fast_check(skill_name, product_message, detected_keywords, row)
+    product_name = row['*商品名'] if '*商品名' in row and pd.notna(row['*商品名']) else ''
+    return format_fast_result(product_name, evaluation), evaluation['conclusion']
+
+
+def log_row_error(row_number, product_message, error):
+    """
+    Log a row-level error and build its result entry
+    
+    Returns:
+        Tuple: ("エラー: ...", "ERROR")
+    """
+    error_message = str(error)
+    logger.error(f"行 {row_number} でエラー: {error_message}", exc_info=True)
+    
+    # リトライエラーの場合は特別に記録
+    if 'retry' in error_message.lower() or 'timeout' in error_message.lower():
+        logger.warning(f"行 {row_number}: LLM APIリトライ/タイムアウトエラー。商品情報: {product_message[:100]}...")
+    
+    return f"エラー: {error_message}", "ERROR"
+
+
+def check_item(item, skill_name):
+    """
+    Check a prepared row with its own LLM request
+    
+    Args:
+        item: Dictionary returned by prepare_row
+        skill_name: Name of the skill to use
+        
+    Returns:
+        Tuple: (result_text, conclusion)
+        - 行単位のエラーは例外を投げずに ("エラー: ...", "ERROR") を返す
+    """
+    if CHECK_FIELD_MODE:
+        return check_fields(item, skill_name)
+    
+    row_number = item['row_index'] + 1
+    product_message = item['product_message']
+    try:
+        # 検出されたキーワードに基づいて動的にsystem_promptを構築
+        system_prompt = build_prompt(skill_name, item['detected_keywords'])
+        
+        # Call LiteLLM API (キャッシュヒット時は呼び出さない)
+        check_result = run_check(skill_name, system_prompt, product_message)
+        
+        result_text = check_result['result_text']
+        conclusion = check_result['conclusion']
+        
+        # Log if conclusion is UNKNOWN
+        if conclusion == "UNKNOWN":
+            logger.warning(f"行 {row_number} で結論が不明 (UNKNOWN)")
+            logger.debug(f"商品情報: {product_message[:100]}...")
+            logger.debug(f"LLM応答の一部: {result_text[:200]}...")
+        
+        return result_text, conclusion
+        
+    except Exception as e:
+        item['retry_reason'] = retry_reason(e)
+        return log_row_error(row_number, product_message, e)
+
+
+def check_fields(item, skill_name):
+    """
+    Check each check column of a row with its own LLM request and merge the verdicts
+    
+    The product name is not sent, so every column is cached by its own text and
+    only columns whose text changed are sent to the LLM again
+    
+    Args:
+        item: Dictionary returned by prepare_row
+        skill_name: Name of the skill to use
+        
+    Returns:
+        Tuple: (result_text, conclusion) with one section per column
+    """
+    row_number = item['row_index'] + 1
+    sections = []
+    conclusions = []
+    sources = Counter()
+    
+    for column, value in iter_check_fields(item['row']):
+        field_message = f"{column}: {value}"
+        try:
+            keyword_matches = find_keywords(skill_name, field_message)
+            decision = None
+            if PRESCREEN_ENABLED:
+                decision = skill_manager.prescreen(skill_name, field_message, keyword_matches, item['row'])
+            
+            if decision:
+                result_text = format_prescreen_result(item['row'], list(keyword_matches), decision[1])
+                conclusion = "OK"
+                sources['事前判定'] += 1
+            else:
+                system_prompt = build_prompt(skill_name, list(keyword_matches))
+                check_result = run_check(skill_name, system_prompt, field_message)
+                result_text = check_result['result_text']
+                conclusion = check_result['conclusion']
+                sources['キャッシュ' if check_result['cached'] else 'LLM'] += 1
+                
+                if conclusion == "UNKNOWN":
+                    logger.warning(f"行 {row_number} の {column} で結論が不明 (UNKNOWN)")
+        except Exception as e:
+            item['retry_reason'] = retry_reason(e)
+            result_text, conclusion = log_row_error(row_number, field_message, e)
+        
+        sections.append(f"【{column}】\n{result_text.strip()}")
+        conclusions.append(conclusion)
+    
+    logger.info(
+        f"行 {row_number}: 列単位チェック "
+        + ' / '.join(f"{source} {count}列" for source, count in sources.items())
+    )
+    
+    return "\n\n".join(sections), max(conclusions, key=CONCLUSION_SEVERITY.index)
+
+
+def row_cache_key(item, skill_name):
+    """
+    Build the result cache key a row would use when checked on its own
+    
+    バッチで得た商品ごとの結果も同じキーで保存し、単独チェックとキャッシュを共有する
+    """
+    system_prompt = build_prompt(skill_name, item['detected_keywords'])
+    return ResultCache.make_key(system_prompt, item['product_message'], LITELLM_MODEL)
+
+
+def check_batch(batch, skill_name):
+    """
+    Check several prepared rows with a single LLM request
+    
+    Args:
+        batch: List of dictionaries returned by prepare_row
+        skill_name: Name of the skill to use
+        
+    Returns:
+        List of tuples: (row_index, result_text, conclusion)
+    """
+    if len(batch) == 1:
+        return [(batch[0]['row_index'], *check_item(batch[0], skill_name))]
+    
+    row_numbers = ', '.join(str(item['row_index'] + 1) for item in batch)
+    try:
+        # バッチ内の全商品のキーワードを合わせたreferencesでsystem_promptを構築
+        keywords = sorted({keyword for item in batch for keyword in item['detected_keywords']})
+        system_prompt = build_prompt(skill_name, keywords)
+        user_message = build_batch_message(
+            [item['product_message'] for item in batch],
+            structured=STRUCTURED_OUTPUT
+        )
+        
+        logger.info(f"行 {row_numbers}: {len(batch)}件を1リクエストでチェック（キーワード {len(keywords)}件）")
+        
+        response = call_llm(
+            system_prompt,
+            user_message,
+            max_tokens=min(CHECK_MAX_TOKENS * len(batch), CHECK_BATCH_MAX_TOKENS)
+        )
+        answers = split_answers(response.choices[0].message.content, len(batch))
+        
+    except Exception as e:
+        reason = retry_reason(e)
+        for item in batch:
+            item['retry_reason'] = reason
+        return [
+            (item['row_index'], *log_row_error(item['row_index'] + 1, item['product_message'], e))
+            for item in batch
+        ]
+    
+    results = []
+    for product_id, item in enumerate(batch, start=1):
+        answer = answers.get(product_id)
+        
+        # 回答を商品ごとに分割できなかった行は単独で再チェック
+        if answer is None:
+            logger.warning(f"行 {item['row_index'] + 1}: バッチ回答から該当商品の結果を取り出せないため単独で再チェック")
+            metrics.RETRIES.inc(reason='batch_split')
+            results.append((item['row_index'], *check_item(item, skill_name)))
+            continue
+        
+        section, conclusion = answer
+        if conclusion == "UNKNOWN":
+            logger.warning(f"行 {item['row_index'] + 1} で結論が不明 (UNKNOWN)")
+        elif result_cache:
+            # キー（プロンプト）の構築や保存に失敗した行だけをエラーにする
+            try:
+                result_cache.put(row_cache_key(item, skill_name), skill_name, section, conclusion, {
+                    'input_tokens': response.usage.prompt_tokens // len(batch),
+                    'output_tokens': response.usage.completion_tokens // len(batch)
+                })
+            except Exception as e:
+                results.append((item['row_index'], *log_row_error(item['row_index'] + 1, item['product_message'], e)))
+                continue
+        
+        results.append((item['row_index'], section, conclusion))
+    
+    return results
+
+
+def check_chunk(chunk, skill_name, executor, on_result, decisions, shared_results, requeue=None):
+    """
+    Check one chunk of rows with the shared thread pool
+    
+    Args:
+        chunk: List of (row_index, row) tuples
+        skill_name: Name of the skill to use
+        executor: ThreadPoolExecutor running the LLM requests
+        on_result: Callable(row_index, result_text, conclusion)
+        decisions: Counter of local decisions (pre-screen, dedup, LLM), updated in place
+        shared_results: OrderedDict mapping dedup keys to (row_index, result_text, conclusion)
+            of rows checked in earlier chunks, updated in place
+        requeue: Optional list collecting (item, follower row indexes) of rows that failed
+            with a transient error instead of delivering them, updated in place
+    """
+    pending = []
+    # 代表行の row_index -> 同じチェック対象を持つ行の row_index
+    followers = {}
+    representatives = {}
+    dedup_keys = {}
+    
+    for row_index, row in chunk:
+        try:
+            item = prepare_row(row_index, row, skill_name)
+        except Exception as e:
+            on_result(row_index, *log_row_error(row_index + 1, '', e))
+            continue
+        
+        if item['prescreen']:
+            decisions[item['prescreen']] += 1
+        
+        if item['result']:
+            on_result(row_index, *item['result'])
+            continue
+        
+        if CHECK_DEDUP_ENABLED:
+            key = build_dedup_key(item['product_message'])
+            if key in shared_results:
+                shared_results.move_to_end(key)
+                source_row_index, result_text, conclusion = shared_results[key]
+                decisions['duplicate'] += 1
+                on_result(row_index, format_shared_result(source_row_index, result_text), conclusion)
+                continue
+            if key in representatives:
+                decisions['duplicate'] += 1
+                followers[representatives[key]].append(row_index)
+                continue
+            representatives[key] = row_index
+            dedup_keys[row_index] = key
+            followers[row_index] = []
+        
+        decisions['llm'] += 1
+        pending.append(item)
+    
+    items = {item['row_index']: item for item in pending}
+    
+    def deliver(row_index, result_text, conclusion):
+        # レート制限などの一時的なエラーは、チャンクの最後に再チェックする（同じ内容の行も結果を待つ）
+        item = items.get(row_index)
+        if requeue is not None and conclusion == "ERROR" and item and item.get('retry_reason'):
+            requeue.append((item, followers.get(row_index, [])))
+            return
+        
+        on_result(row_index, result_text, conclusion)
+        for follower in followers.get(row_index, ()):
+            on_result(follower, format_shared_result(row_index, result_text), conclusion)
+        
+        # エラーは後続チャンクに持ち越さない（次に同じ内容が出てきたら再チェックする）
+        if row_index in dedup_keys and conclusion != "ERROR":
+            shared_results[dedup_keys[row_index]] = (row_index, result_text, conclusion)
+            if len(shared_results) > CHECK_DEDUP_MAX_ENTRIES:
+                shared_results.popitem(last=False)
+    
+    if CHECK_BATCH_SIZE > 1 and not CHECK_FIELD_MODE:
+        # 単独チェック時のキャッシュがある行はバッチに含めない
+        if result_cache:
+            uncached = []
+            for item in pending:
+                # キー（プロンプト）の構築や参照に失敗した行だけをエラーにする
+                try:
+                    cached = lookup_result(row_cache_key(item, skill_name))
+                except Exception as e:
+                    deliver(item['row_index'], *log_row_error(item['row_index'] + 1, item['product_message'], e))
+                    continue
+                if cached:
+                    deliver(item['row_index'], cached['result_text'], cached['conclusion'])
+                else:
+                    uncached.append(item)
+            pending = uncached
+        
+        skill = skill_manager.get_skill_by_name(skill_name)
+        units = plan_batches(
+            pending,
+            max_batch_size=CHECK_BATCH_SIZE,
+            token_budget=CHECK_BATCH_TOKEN_BUDGET,
+            base_tokens=estimate_tokens(skill['content']),
+            reference_tokens=lambda keyword: estimate_tokens(skill['references'].get(keyword, ''))
+        )
+        logger.info(f"バッチ化: {len(pending)}行 → {len(units)}リクエスト（最大 {CHECK_BATCH_SIZE}件/リクエスト）")
+    else:
+        units = [[item] for item in pending]
+    
+    # 集計中の一括チェック（metrics.collect_run）をワーカースレッドに引き継ぐ
+    futures = [
+        executor.submit(contextvars.copy_context().run, check_batch, unit, skill_name)
+        for unit in units
+    ]
+    
+    for future in as_completed(futures):
+        for row_index, result_text, conclusion in future.result():
+            deliver(row_index, result_text, conclusion)
+
 
-def build_product_message(row):
+def check_requeued(requeued, skill_name, executor, on_result, final):
     """
-    Build a product message from Excel row data
+    Check again the rows that failed with a transient error (rate limit, 5xx, timeout)
     
     Args:
-        row: Pandas Series containing product data
+        requeued: List of (item, follower row indexes) collected by check_chunk
+        skill_name: Name of the skill to use
+        executor: ThreadPoolExecutor running the LLM requests
+        on_result: Callable(row_index, result_text, conclusion)
+        final: Deliver rows failing again as errors instead of returning them
         
     Returns:
-        Tuple: (product_message, has_check_data)
-        - product_message: String containing formatted product information
-        - has_check_data: Boolean indicating if there's data to check (other than product name)
+        List of (item, follower row indexes) to check again in a later pass
     """
-    # チェック対象列（商品名以外）
-    check_columns = [
-        '*変更前_商品の特徴BtoB',
-        '*変更前_MDおすすめコメントBtoB',
-        '*変更前_短いキャッチコピーBtoB',
-        '*変更前_キャッチコピーBtoC',
-        '*変更前_商品の特徴BtoC'
-    ]
+    logger.info(f"一時的なエラーの {len(requeued)}行を再チェック")
     
-    message_parts = []
-    has_check_data = False
+    futures = {}
+    for item, followers in requeued:
+        item.pop('retry_reason', None)
+        metrics.RETRIES.inc(reason='requeue')
+        future = executor.submit(contextvars.copy_context().run, check_item, item, skill_name)
+        futures[future] = (item, followers)
     
-    # 商品名を最初に追加
-    if '*商品名' in row and pd.notna(row['*商品名']) and row['*商品名'] != '':
-        message_parts.append(f"商品名: {row['*商品名']}")
+    failed = []
+    for future in as_completed(futures):
+        item, followers = futures[future]
+        result_text, conclusion = future.result()
+        if conclusion == "ERROR" and item.get('retry_reason') and not final:
+            failed.append((item, followers))
+            continue
+        
+        on_result(item['row_index'], result_text, conclusion)
+        for follower in followers:
+            on_result(follower, format_shared_result(item['row_index'], result_text), conclusion)
     
-    # チェック対象列を追加
-    for column in check_columns:
-        if column in row and pd.notna(row[column]) and row[column] != '':
-            message_parts.append(f"{column}: {row[column]}")
-            has_check_data = True
+    return failed
+
+
+def check_rows(indexed_rows, skill_name, on_result, chunk_size=None):
+    """
+    Check rows in parallel with a bounded thread pool
+    Rows are consumed lazily in chunks of CHECK_CHUNK_SIZE, so only one chunk
+    is held in memory at a time. Rows failing with a transient error are checked
+    again at the end of their chunk (up to CHECK_REQUEUE_PASSES times)
     
-    return "\n".join(message_parts), has_check_data
+    Args:
+        indexed_rows: Iterable of (row_index, row) tuples
+        skill_name: Name of the skill to use
+        on_result: Callable(row_index, result_text, conclusion) called in the
+            calling thread as each row finishes (in completion order)
+        chunk_size: Rows per chunk (default: CHECK_CHUNK_SIZE)
+            
+    Returns:
+        Dictionary counting how rows were decided: pre-screen reason codes,
+        'duplicate' (shared the result of an identical row) and 'llm'
+    """
+    decisions = Counter()
+    shared_results = OrderedDict()
+    chunk_size = chunk_size or CHECK_CHUNK_SIZE
+    
+    def count_result(row_index, result_text, conclusion):
+        metrics.ROWS.inc(conclusion=conclusion)
+        on_result(row_index, result_text, conclusion)
+    
+    def run_chunk(chunk):
+        # 一時的なエラーの行は次のチャンクに進む前に再チェックする
+        # （最後まで持ち越すと、行順に書き出す呼び出し側が後続の全行の結果を保持し続けるため）
+        requeue = [] if CHECK_REQUEUE_PASSES else None
+        check_chunk(chunk, skill_name, executor, count_result, decisions, shared_results, requeue)
+        for attempt in range(1, CHECK_REQUEUE_PASSES + 1):
+            if not requeue:
+                break
+            requeue = check_requeued(
+                requeue, skill_name, executor, count_result, final=attempt == CHECK_REQUEUE_PASSES
+            )
+    
+    with ThreadPoolExecutor(max_workers=CHECK_MAX_WORKERS) as executor:
+        chunk = []
+        for row_index, row in indexed_rows:
+            chunk.append((row_index, row))
+            if len(chunk) >= chunk_size:
+                run_chunk(chunk)
+                chunk = []
+        
+        if chunk:
+            run_chunk(chunk)
+    
+    if PRESCREEN_ENABLED:
+        auto_ok = sum(count for code, count in decisions.items() if code not in ('llm', 'duplicate'))
+        logger.info(
+            f"事前判定: 自動OK {auto_ok}行"
+            f"（キーワードなし {decisions[REASON_NO_KEYWORDS]} / 除外語 {decisions[REASON_EXEMPT_TERM]}"
+            f" / 薬事区分 {decisions[REASON_CATEGORY]}）、LLMチェック {decisions['llm']}行"
+        )
+    
+    if CHECK_DEDUP_ENABLED:
+        checked = decisions['llm'] + decisions['duplicate']
+        logger.info(
+            f"重複除外: {checked}行 → ユニーク {decisions['llm']}件"
+            f"（重複 {decisions['duplicate']}行, 重複率 {dedup_ratio(decisions):.1%}）"
+        )
+    
+    with decision_lock:
+        decision_totals.update(decisions)
+    for decision, count in decisions.items():
+        metrics.ROW_DECISIONS.inc(count, decision=decision)
+    
+    return dict(decisions)
 
 
-def extract_conclusion(result_text):
+def fast_check_rows(indexed_rows, skill_name, on_result):
     """
-    Extract OK/NG conclusion from LLM result
+    Judge rows in fast mode (no LLM calls, rows are judged in order in the calling thread)
     
     Args:
-        result_text: Text result from LLM
+        indexed_rows: Iterable of (row_index, row) tuples
+        skill_name: Name of the skill to use
+        on_result: Callable(row_index, result_text, conclusion) called for each row
         
     Returns:
-        "OK" or "NG" or "UNKNOWN"
+        Dictionary counting the rows by conclusion
     """
-    # Look for conclusion pattern in the result
-    lines = result_text.split('\n')
-    for line in lines:
-        if '結論' in line:
-            # Check the next few lines for OK or NG
-            idx = lines.index(line)
-            for i in range(idx, min(idx + 5, len(lines))):
-                if 'NG' in lines[i]:
-                    return "NG"
-                elif 'OK' in lines[i]:
-                    return "OK"
+    conclusions = Counter()
+    for row_index, row in indexed_rows:
+        try:
+            result_text, conclusion = fast_check_row(row, skill_name)
+        except Exception as e:
+            result_text, conclusion = log_row_error(row_index + 1, '', e)
+        conclusions[conclusion] += 1
+        metrics.ROWS.inc(conclusion=conclusion)
+        on_result(row_index, result_text, conclusion)
     
-    # Fallback: search entire text
-    if 'NG' in result_text:
-        return "NG"
-    elif 'OK' in result_text:
-        return "OK"
+    logger.info(f"高速モード: {sum(conclusions.values())}行（{', '.join(f'{key} {count}' for key, count in sorted(conclusions.items()))}）")
     
-    return "UNKNOWN"
+    rows = sum(conclusions.values())
+    with decision_lock:
+        decision_totals[CHECK_MODE_FAST] += rows
+    metrics.ROW_DECISIONS.inc(rows, decision=CHECK_MODE_FAST)
+    
+    return dict(conclusions)
+
+
+def check_rows_in_mode(indexed_rows, skill_name, on_result, mode=CHECK_MODE_LLM):
+    """
+    Check rows with the LLM (check_rows) or judge them offline (fast_check_rows)
+    
+    Args:
+        indexed_rows: Iterable of (row_index, row) tuples
+        skill_name: Name of the skill to use
+        on_result: Callable(row_index, result_text, conclusion) called as each row finishes
+        mode: CHECK_MODE_LLM (or None), or CHECK_MODE_FAST to judge the rows without the LLM
+        
+    Returns:
+        Dictionary counting the rows by how they were decided (as check_rows)
+    """
+    if mode == CHECK_MODE_FAST:
+        conclusions = fast_check_rows(indexed_rows, skill_name, on_result)
+        return {CHECK_MODE_FAST: sum(conclusions.values())}
+    
+    return check_rows(indexed_rows, skill_name, on_result)
+
+
+def dedup_ratio(decisions):
+    """Share of the rows needing a check that reused the result of an identical row"""
+    checked = decisions.get('llm', 0) + decisions.get('duplicate', 0)
+    return decisions.get('duplicate', 0) / checked if checked else 0.0
+
+
+def check_workbook(reader, skill_name, output_path, mode=CHECK_MODE_LLM):
+    """
+    Check every row of a sheet and stream the results into a workbook
+    The workbook gets a summary sheet with the latency, token and cache metrics of the run
+    
+    Args:
+        reader: CheckSheetReader of the uploaded file
+        skill_name: Name of the skill to use
+        output_path: Path of the result .xlsx file
+        mode: CHECK_MODE_LLM, or CHECK_MODE_FAST to judge the rows without the LLM
+        
+    Returns:
+        Number of checked rows
+    """
+    writer = ResultWorkbookWriter(output_path, reader.header)
+    
+    # 読み込み済みで未出力の行と、その結果（完了順に届くため元の行順に並べ直して書き出す）
+    unwritten_rows = {}
+    finished = {}
+    next_index = 0
+    
+    def indexed_rows():
+        for row_index, row in enumerate(reader.iter_rows()):
+            unwritten_rows[row_index] = row
+            yield row_index, dict(zip(reader.header, row))
+    
+    def on_result(row_index, result_text, conclusion):
+        nonlocal next_index
+        finished[row_index] = (result_text, conclusion)
+        
+        while next_index in finished:
+            writer.append(unwritten_rows.pop(next_index), *finished.pop(next_index))
+            next_index += 1
+            
+            # Progress logging
+            if next_index % 100 == 0 or next_index == 1:
+                logger.info(f"進捗: {next_index} 行処理済み")
+    
+    with metrics.collect_run() as run_metrics:
+        check_rows_in_mode(indexed_rows(), skill_name, on_result, mode)
+    writer.add_sheet(SUMMARY_SHEET_NAME, metrics.summary_rows(run_metrics.snapshot()))
+    writer.close()
+    
+    return next_index
 
 
 @app.route('/api/health', methods=['GET'])
@@ -137,10 +1294,31 @@ def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'skills_loaded': len(skill_manager.skills)
+        'skills_loaded': len(skill_manager.skills),
+        'result_cache': result_cache.stats() if result_cache else None,
+        'prompt_cache': skill_manager.prompt_cache_stats(),
+        'skill_versions': {
+            skill['name']: skill['fingerprint'] for skill in skill_manager.list_skills()
+        },
+        'row_decisions': dict(decision_totals),
+        'llm_scheduler': llm_scheduler.stats(),
+        'web_fetch_cache': web_fetcher.stats()
     })
 
 
+@metrics.REGISTRY.on_collect
+def collect_gauges():
+    """Set the gauges of this process before its metrics are rendered or shared"""
+    metrics.PROMPT_CACHE_HIT_RATIO.set(skill_manager.prompt_cache_stats()['hit_rate'])
+    metrics.LLM_CONCURRENCY_LIMIT.set(llm_scheduler.stats()['concurrency_limit'])
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Metrics in the Prometheus text exposition format (summed over all worker processes)"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/skills', methods=['GET'])
 def list_skills():
     """List all available skills"""
@@ -157,7 +1335,10 @@ def check_keywords():
     Request JSON:
         {
             "skill_name": "商品コピーチェック",
-            "product_info": "商品名: テスト商品\n説明: ..."
+            "product_info": "商品名: テスト商品\n説明: ...",
+            "stream": false,
+            "mode": "llm",
+            "categories": {"管理カテゴリー大": "...", "管理カテゴリー中": "..."}
         }
         
     Response JSON:
@@ -166,6 +1347,13 @@ def check_keywords():
             "conclusion": "OK" or "NG",
             "usage": {...}
         }
+        
+    With "stream": true the response is a text/event-stream relaying the LLM
+    answer as it is generated (see stream_check)
+    
+    With "mode": "fast" the product is judged offline from the references and
+    "categories" (used as the row's category columns); the conclusion is OK, NG
+    or REVIEW and "verdicts" lists the verdict of each detected keyword
     """
     try:
         data = request.json
@@ -175,43 +1363,146 @@ def check_keywords():
         if not product_info:
             return jsonify({'error': 'product_info is required'}), 400
         
-        # Build system prompt from skill
-        system_prompt = skill_manager.build_system_prompt(skill_name)
-        
-        # Call LiteLLM API
-        response = litellm.completion(
-            model=LITELLM_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": product_info
-                }
-            ],
-            api_base=LITELLM_API_BASE,
-            max_tokens=4096,
-            timeout=120  # 個別API呼び出しのタイムアウト: 120秒
-        )
+        mode = data.get('mode') or CHECK_MODE_LLM
+        if mode not in CHECK_MODES:
+            return jsonify({'error': f"mode must be one of: {', '.join(CHECK_MODES)}"}), 400
         
-        result_text = response.choices[0].message.content
-        conclusion = extract_conclusion(result_text)
+        if mode == CHECK_MODE_FAST:
+            categories = data.get('categories') or {}
+            if not isinstance(categories, dict):
+                return jsonify({'error': 'categories must be an object of column names to values'}), 400
+            
+            detected_keywords = list(find_keywords(skill_name, product_info))
+            evaluation = skill_manager.fast_check(skill_name, product_info, detected_keywords, categories)
+            name_match = re.search(r'^\*?商品名[:：]\s*(.*)$', product_info, re.MULTILINE)
+            return jsonify({
+                'result': format_fast_result(name_match.group(1) if name_match else '', evaluation),
+                'conclusion': evaluation['conclusion'],
+                'detected_keywords': detected_keywords,
+                'verdicts': evaluation['verdicts'],
+                'product_class': evaluation['product_class'],
+                'mode': mode,
+                'usage': None,
+                'cached': False
+            })
+        
+        if data.get('stream'):
+            return event_stream_response(stream_check(skill_name, product_info))
+        
+        # Build system prompt from skill（検出したキーワードの references だけを含める）
+        detected_keywords = list(find_keywords(skill_name, product_info))
+        system_prompt = build_prompt(skill_name, detected_keywords)
+        
+        # Call LiteLLM API (キャッシュヒット時は呼び出さない)
+        check_result = run_check(skill_name, system_prompt, product_info)
         
         return jsonify({
-            'result': result_text,
-            'conclusion': conclusion,
-            'usage': {
-                'input_tokens': response.usage.prompt_tokens,
-                'output_tokens': response.usage.completion_tokens
-            }
+            'result': check_result['result_text'],
+            'conclusion': check_result['conclusion'],
+            'detected_keywords': detected_keywords,
+            'usage': check_result['usage'],
+            'cached': check_result['cached']
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def validate_excel_upload():
+    """
+    Validate the uploaded Excel file in the current request
+    
+    Returns:
+        Tuple: (file, error_message)
+        - error_message is None when the upload is valid
+    """
+    # Check if file is provided
+    if 'file' not in request.files:
+        return None, 'No file provided'
+    
+    file = request.files['file']
+    
+    if file.filename == '':
+        return None, 'No file selected'
+    
+    # Check file extension
+    allowed_extensions = ['.xlsx', '.xls', '.xlsm']
+    file_ext = os.path.splitext(file.filename)[1].lower()
+    
+    if file_ext not in allowed_extensions:
+        return None, f'Unsupported file format: {file_ext}. Allowed formats: .xlsx, .xls, .xlsm'
+    
+    return file, None
+
+
+# Initialize Job Manager（大きなExcelはジョブとしてバックグラウンドで処理）
+JOBS_DIR = Path(os.getenv('JOBS_DIR') or str(Path(__file__).parent / "jobs"))
+job_manager = JobManager(JOBS_DIR, check_rows=check_rows_in_mode)
+
+
+# Initialize Web Fetcher（URLチェックの商品ページ取得。接続はリクエスト間で使い回す）
+WEB_FETCH_MAX_CONNECTIONS = max(1, int(os.getenv('WEB_FETCH_MAX_CONNECTIONS') or '16'))
+WEB_FETCH_MAX_PER_HOST = max(1, int(os.getenv('WEB_FETCH_MAX_PER_HOST') or '4'))
+WEB_FETCH_TIMEOUT = float(os.getenv('WEB_FETCH_TIMEOUT') or '15')
+# ETag / Last-Modified で再検証するページの保持件数（0で無効）
+WEB_FETCH_CACHE_SIZE = int(os.getenv('WEB_FETCH_CACHE_SIZE') or '1000')
+# 1リクエストで受け付けるURL数と、チェックするページ本文の最大文字数
+URL_CHECK_MAX_URLS = int(os.getenv('URL_CHECK_MAX_URLS') or '200')
+URL_CHECK_MAX_CHARS = int(os.getenv('URL_CHECK_MAX_CHARS') or '8000')
+# 取得を許可するホスト（カンマ区切り）。指定した場合はこれらのホストだけを取得し、内部アドレスも許可する
+# 指定しない場合は、プライベート・ループバック・リンクローカルなどのアドレスに解決されるホストを取得しない
+WEB_FETCH_ALLOWED_HOSTS = [
+    host.strip() for host in (os.getenv('WEB_FETCH_ALLOWED_HOSTS') or '').split(',') if host.strip()
+]
+
+web_fetcher = WebFetcher(
+    max_connections=WEB_FETCH_MAX_CONNECTIONS,
+    max_per_host=WEB_FETCH_MAX_PER_HOST,
+    timeout=WEB_FETCH_TIMEOUT,
+    cache_size=WEB_FETCH_CACHE_SIZE,
+    allowed_hosts=WEB_FETCH_ALLOWED_HOSTS
+)
+
+
+def check_urls(urls, skill_name):
+    """
+    Fetch product pages and check their text like Excel rows
+    
+    取得できたページから順にチェックに回すため、ページ取得とLLMチェックは並行して進む
+    
+    Args:
+        urls: List of page URLs
+        skill_name: Name of the skill to use
+        
+    Returns:
+        List of result dictionaries in the order of urls
+    """
+    results = [{'url': url} for url in urls]
+    
+    def indexed_rows():
+        for index, page in web_fetcher.fetch_all(urls):
+            results[index].update(
+                url=page['url'], title=page['title'], status=page['status'], not_modified=page['cached']
+            )
+            if page['error']:
+                logger.warning(f"URL {page['url']} を取得できません: {page['error']}")
+                results[index].update(result=f"エラー: ページを取得できません（{page['error']}）", conclusion="ERROR")
+                continue
+            
+            text = page['text']
+            if len(text) > URL_CHECK_MAX_CHARS:
+                logger.info(f"URL {page['url']}: 本文 {len(text)}文字のうち先頭 {URL_CHECK_MAX_CHARS}文字をチェック")
+                text = text[:URL_CHECK_MAX_CHARS]
+            yield index, {'*商品名': page['title'] or page['url'], PAGE_TEXT_COLUMN: text}
+    
+    def on_result(index, result_text, conclusion):
+        results[index].update(result=result_text, conclusion=conclusion)
+    
+    # 少数の行ずつチェックを始め、残りのページの取得を待たない
+    check_rows(indexed_rows(), skill_name, on_result, chunk_size=CHECK_MAX_WORKERS)
+    return results
+
+
 @app.route('/api/check-excel', methods=['POST'])
 def check_excel():
     """
@@ -220,175 +1511,290 @@ def check_excel():
     Request:
         - file: Excel file (multipart/form-data)
         - skill_name: Skill name (optional, defaults to '商品コピーチェック')
+        - mode: 'llm' (default) or 'fast' to judge the rows offline from the references
+          and the 管理カテゴリー columns (conclusion OK / NG / REVIEW, no LLM calls)
         
     Response:
         Excel file with check results
     """
     try:
-        # Check if file is provided
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
+        file, error_message = validate_excel_upload()
+        if error_message:
+            return jsonify({'error': error_message}), 400
         
-        file = request.files['file']
         skill_name = request.form.get('skill_name', '商品コピーチェック')
+        mode = request.form.get('mode') or CHECK_MODE_LLM
+        if mode not in CHECK_MODES:
+            return jsonify({'error': f"mode must be one of: {', '.join(CHECK_MODES)}"}), 400
         
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        # Check file extension
-        allowed_extensions = ['.xlsx', '.xls', '.xlsm']
-        file_ext = os.path.splitext(file.filename)[1].lower()
-        
-        if file_ext not in allowed_extensions:
-            return jsonify({
-                'error': f'Unsupported file format: {file_ext}. Allowed formats: .xlsx, .xls, .xlsm'
-            }), 400
-        
-        # Read Excel file - pandas will auto-detect the format
+        # アップロードされたファイルと結果ファイルはメモリではなく一時ディレクトリに置く
+        work_dir = Path(tempfile.mkdtemp(prefix='check_excel_'))
         try:
-            # シート「チェック対象」を読み込み（全列を文字列として読み込み、元の型を保持）
-            df = pd.read_excel(file, sheet_name='チェック対象', dtype=str)
-        except ValueError as e:
-            # シートが存在しない場合
-            if 'Worksheet' in str(e) or 'チェック対象' in str(e):
-                return jsonify({'error': 'シート「チェック対象」が見つかりません。Excelファイルに「チェック対象」という名前のシートが存在することを確認してください。'}), 400
+            input_path = work_dir / f"input{os.path.splitext(file.filename)[1].lower()}"
+            file.save(str(input_path))
+            
+            try:
+                reader = CheckSheetReader(input_path)
+            except ValueError as e:
+                shutil.rmtree(work_dir, ignore_errors=True)
+                return jsonify({'error': str(e)}), 400
+            
+            logger.info(f"📊 Excel一括チェック開始: (ファイル: {file.filename}, モード: {mode}, 同時実行数: {CHECK_MAX_WORKERS})")
+            
+            output_path = work_dir / "result.xlsx"
+            total_rows = check_workbook(reader, skill_name, output_path, mode)
+            
+            logger.info(f"✅ 処理完了: {total_rows}行")
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
             raise
-        except Exception as e:
-            return jsonify({'error': f'Failed to read Excel file: {str(e)}'}), 400
-        
-        if df.empty:
-            return jsonify({'error': 'Excel file is empty'}), 400
-        
-        # 必須列のチェック
-        required_columns = ['*商品名']
-        check_columns = [
-            '*変更前_商品の特徴BtoB',
-            '*変更前_MDおすすめコメントBtoB',
-            '*変更前_短いキャッチコピーBtoB',
-            '*変更前_キャッチコピーBtoC',
-            '*変更前_商品の特徴BtoC'
-        ]
         
-        # 商品名列の存在チェック
-        if '*商品名' not in df.columns:
-            return jsonify({'error': '「*商品名」列が見つかりません。シート「チェック対象」に「*商品名」列が必要です。'}), 400
+        # Send file (送信後に一時ディレクトリを削除)
+        response = send_file(
+            output_path,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name='check_result.xlsx'
+        )
+        response.call_on_close(lambda: shutil.rmtree(work_dir, ignore_errors=True))
+        return response
         
-        # Process each row
-        results = []
-        conclusions = []
-        total_rows = len(df)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/check-urls', methods=['POST'])
+def check_urls_endpoint():
+    """
+    Check the text of product pages
+    
+    Request JSON:
+        {
+            "skill_name": "商品コピーチェック",
+            "urls": ["https://example.com/products/1", ...]
+        }
         
-        logger.info(f"📊 Excel一括チェック開始: {total_rows}行 (ファイル: {file.filename})")
+    Response JSON:
+        {
+            "results": [
+                {"url": "...", "title": "...", "status": 200, "not_modified": false,
+                 "result": "チェック結果...", "conclusion": "OK" or "NG" or "ERROR"},
+                ...
+            ]
+        }
+    """
+    try:
+        data = request.json or {}
+        skill_name = data.get('skill_name', '商品コピーチェック')
+        urls = data.get('urls')
         
-        for idx, row in df.iterrows():
-            try:
-                # Progress logging
-                if (idx + 1) % 100 == 0 or idx == 0:
-                    logger.info(f"進捗: {idx + 1}/{total_rows} 行処理中...")
-                
-                # Build product message from row
-                product_message, has_check_data = build_product_message(row)
-                
-                # Skip empty rows
-                if not product_message or product_message.strip() == '':
-                    logger.warning(f"行 {idx + 1} はスキップ（空行）")
-                    results.append("(空行)")
-                    conclusions.append("SKIPPED")
-                    continue
-                
-                # チェックデータが存在しない場合（商品名のみの場合）
-                if not has_check_data:
-                    logger.warning(f"行 {idx + 1} はチェックデータなし（商品名のみ）")
-                    results.append("チェックデータが存在しません（商品名以外の列にデータがありません）")
-                    conclusions.append("NO_DATA")
-                    continue
-                
-                # 商品テキストからキーワードを検出
-                detected_keywords = skill_manager.detect_keywords(skill_name, product_message)
-                
-                # 検出されたキーワード（references/*.mdファイル）をログ出力
-                if detected_keywords:
-                    logger.info(f"行 {idx + 1}: 検出されたキーワード数 = {len(detected_keywords)}")
-                    logger.info(f"  → 使用するreferencesファイル: {', '.join(sorted(detected_keywords))}")
-                else:
-                    logger.info(f"行 {idx + 1}: キーワード検出なし（一般的なチェックのみ実施）")
-                
-                # 検出されたキーワードに基づいて動的にsystem_promptを構築
-                system_prompt = skill_manager.build_dynamic_system_prompt(skill_name, detected_keywords)
-                
-                # Call LiteLLM API
-                response = litellm.completion(
-                    model=LITELLM_MODEL,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": system_prompt
-                        },
-                        {
-                            "role": "user",
-                            "content": product_message
-                        }
-                    ],
-                    api_base=LITELLM_API_BASE,
-                    max_tokens=4096,
-                    timeout=120  # 個別API呼び出しのタイムアウト: 120秒
-                )
-                
-                result_text = response.choices[0].message.content
-                conclusion = extract_conclusion(result_text)
-                
-                # Log if conclusion is UNKNOWN
-                if conclusion == "UNKNOWN":
-                    logger.warning(f"行 {idx + 1} で結論が不明 (UNKNOWN)")
-                    logger.debug(f"商品情報: {product_message[:100]}...")
-                    logger.debug(f"LLM応答の一部: {result_text[:200]}...")
-                
-                results.append(result_text)
-                conclusions.append(conclusion)
-                
-            except Exception as e:
-                error_message = str(e)
-                logger.error(f"行 {idx + 1} でエラー: {error_message}", exc_info=True)
-                
-                # リトライエラーの場合は特別に記録
-                if 'retry' in error_message.lower() or 'timeout' in error_message.lower():
-                    logger.warning(f"行 {idx + 1}: LLM APIリトライ/タイムアウトエラー。商品情報: {product_message[:100]}...")
-                
-                results.append(f"エラー: {error_message}")
-                conclusions.append("ERROR")
+        if not urls or not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            return jsonify({'error': 'urls must be a non-empty list of strings'}), 400
+        if len(urls) > URL_CHECK_MAX_URLS:
+            return jsonify({'error': f'Too many urls: {len(urls)} (max {URL_CHECK_MAX_URLS})'}), 400
+        
+        logger.info(f"🌐 URLチェック開始: {len(urls)}件")
+        results = check_urls(urls, skill_name)
+        logger.info(f"✅ URLチェック完了: {dict(Counter(result['conclusion'] for result in results))}")
+        
+        return jsonify({'results': results})
         
-        logger.info(f"✅ 処理完了: {total_rows}行")
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Submit an Excel file as a background check job
+    
+    Request:
+        - file: Excel file (multipart/form-data)
+        - skill_name: Skill name (optional, defaults to '商品コピーチェック')
+        - mode: 'llm' (default) or 'fast' to judge the rows offline from the references
         
-        # Add results to dataframe (文字列型として明示的に設定)
-        df['チェック結果'] = pd.Series(results, dtype=str)
-        df['結論'] = pd.Series(conclusions, dtype=str)
+    Response JSON (202):
+        {
+            "job_id": "...",
+            "status": "queued",
+            "mode": "llm",
+            "total_rows": 123
+        }
+    """
+    try:
+        file, error_message = validate_excel_upload()
+        if error_message:
+            return jsonify({'error': error_message}), 400
         
-        # Create Excel file in memory
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='チェック結果')
+        skill_name = request.form.get('skill_name', '商品コピーチェック')
+        mode = request.form.get('mode') or CHECK_MODE_LLM
+        if mode not in CHECK_MODES:
+            return jsonify({'error': f"mode must be one of: {', '.join(CHECK_MODES)}"}), 400
         
-        output.seek(0)
+        try:
+            job_id = job_manager.submit(file, file.filename, skill_name, mode)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Send file
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name='check_result.xlsx'
-        )
+        return jsonify(job_manager.get_status(job_id)), 202
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Get the progress of a check job
+    
+    Response JSON:
+        {
+            "job_id": "...",
+            "status": "queued" | "running" | "completed" | "failed",
+            "mode": "llm" | "fast",
+            "total_rows": 123,
+            "rows_done": 45,
+            "counts": {"OK": 30, "NG": 14, "ERROR": 1},
+            "eta_seconds": 120.5
+        }
+    """
+    status = job_manager.get_status(job_id)
+    if not status:
+        return jsonify({'error': f'Job not found: {job_id}'}), 404
+    
+    return jsonify(status)
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """
+    Stream the finished rows of a job as Server-Sent Events
+    
+    再接続時は EventSource が送る Last-Event-ID（または ?after=）の続きから送信する
+    
+    Events:
+        row: {"row_index": 0, "conclusion": "NG", "result": "..."} for each finished row
+        end: job status (same as GET /api/jobs/<job_id>) when the job is completed or failed
+    """
+    if not job_manager.get_status(job_id):
+        return jsonify({'error': f'Job not found: {job_id}'}), 404
+    
+    after = request.headers.get('Last-Event-ID') or request.args.get('after') or '0'
+    if not after.isdigit():
+        return jsonify({'error': f'Invalid event id: {after}'}), 400
+    
+    def events():
+        last_sent = time.monotonic()
+        for row in job_manager.iter_row_events(job_id, after=int(after)):
+            if row is None:
+                # 行が届かない間も、プロキシに切断されないよう15秒ごとにコメントを送る
+                if time.monotonic() - last_sent >= 15:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+                continue
+            event_id, row_index, result_text, conclusion = row
+            last_sent = time.monotonic()
+            yield sse_event('row', {
+                'row_index': row_index,
+                'conclusion': conclusion,
+                'result': result_text
+            }, event_id=event_id)
+        yield sse_event('end', job_manager.get_status(job_id))
+    
+    return event_stream_response(events())
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def download_job_result(job_id):
+    """
+    Download the result workbook of a completed job
+    
+    Response:
+        Excel file with check results
+    """
+    status = job_manager.get_status(job_id)
+    if not status:
+        return jsonify({'error': f'Job not found: {job_id}'}), 404
+    
+    result_path = job_manager.get_result_path(job_id)
+    if not result_path:
+        return jsonify({'error': f'Job is not completed: {status["status"]}'}), 409
+    
+    return send_file(
+        result_path,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name='check_result.xlsx'
+    )
+
+
+# LLMゲートウェイへの接続プールの上限（プロセスごとに1つのプールをすべてのLLM呼び出しで共有する）
+LLM_HTTP_MAX_CONNECTIONS = max(1, int(os.getenv('LLM_HTTP_MAX_CONNECTIONS') or '64'))
+
+# 各ワーカープロセスのメトリクスを書き出し、スクレイプ時に合算するディレクトリと書き出し間隔（秒）
+# 以前の起動時の値はアプリの読み込み時（gunicorn ではマスタープロセス）に削除する
+METRICS_DIR = Path(os.getenv('METRICS_DIR') or str(Path(__file__).parent / "cache" / "metrics"))
+METRICS_SHARE_INTERVAL = float(os.getenv('METRICS_SHARE_INTERVAL') or '5')
+metrics.REGISTRY.clear_shared(METRICS_DIR)
+
+# アプリを読み込んだプロセスと、start_worker を実行済みのプロセス
+_loaded_pid = os.getpid()
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+
+def start_worker():
+    """
+    Start the per-process resources: connection pools, database connections and background threads
+    
+    スレッド・ソケット・SQLiteの接続は fork した子プロセスに引き継げないため、アプリの読み込み時ではなく
+    リクエストを処理するプロセスごとに1回呼び出す（gunicorn では gunicorn.conf.py の post_fork）
+    スキルは読み込み済みのものを fork 前から共有する
+    """
+    global _worker_pid
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+    
+    if _loaded_pid != os.getpid():
+        if result_cache:
+            result_cache.reopen()
+        job_manager.reopen()
+        web_fetcher.reopen()
+    
+    litellm.client_session = httpx.Client(
+        timeout=litellm.request_timeout,
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS
+        )
+    )
+    
+    if SKILL_RELOAD_INTERVAL > 0:
+        skill_manager.start_watching(SKILL_RELOAD_INTERVAL, on_reload=on_skills_reloaded)
+    job_manager.start()
+    metrics.REGISTRY.share(METRICS_DIR, METRICS_SHARE_INTERVAL)
+    
+    logger.info(f"ワーカープロセスを開始しました: pid {os.getpid()}")
+
+
+@app.before_request
+def ensure_worker_started():
+    """Start the per-process resources on the first request (e.g. under flask run)"""
+    if _worker_pid != os.getpid():
+        start_worker()
+
+
 if __name__ == '__main__':
     # Log loaded skills
     logger.info("Loaded skills:")
     for skill in skill_manager.list_skills():
         logger.info(f"  - {skill['name']}: {skill['description']}")
     
-    # Run server
+    start_worker()
+    
+    # Run server（開発用。本番環境では gunicorn -c gunicorn.conf.py app:app で起動する）
     logger.info("Starting Flask server on http://0.0.0.0:5001")
     
     # デバッグモード（環境変数で制御、本番環境ではFalseにする）
@@ -0,0 +1,137 @@
+"""
+Batching helpers for Keywords Checker
+Packs several products into one LLM request and splits the answer back per product
+"""
+
+import re
+
+# バッチ内の各商品を識別する見出し（LLMにも同じ見出しで回答させる）
+PRODUCT_HEADING = "### 商品ID: {product_id}"
+PRODUCT_HEADING_PATTERN = re.compile(r'^\s*#{1,6}\s*商品ID\s*[:：]\s*(\d+)\s*$', re.MULTILINE)
+
+
+def estimate_tokens(text):
+    """
+    Roughly estimate the token count of a text
+
+    日本語は1文字あたりおおよそ1トークン以下になるため、文字数を上限の目安として使う
+
+    Args:
+        text: Text to estimate
+
+    Returns:
+        Estimated number of tokens
+    """
+    return len(text)
+
+
+def plan_batches(items, max_batch_size, token_budget, base_tokens, reference_tokens):
+    """
+    Group products into batches whose detected keywords overlap
+
+    Products are ordered by their keyword sets so that rows sharing references
+    end up next to each other, then packed greedily while the prompt (skill body,
+    union of references and all product messages) stays within the token budget.
+
+    Args:
+        items: List of dicts with 'product_message' and 'detected_keywords'
+        max_batch_size: Maximum number of products per batch
+        token_budget: Maximum estimated prompt tokens per request
+        base_tokens: Estimated tokens of the skill body (sent once per request)
+        reference_tokens: Callable(keyword) -> estimated tokens of its reference
+
+    Returns:
+        List of batches (lists of items); a batch may hold a single item
+    """
+    ordered = sorted(items, key=lambda item: sorted(item['detected_keywords']))
+
+    batches = []
+    current = []
+    current_keywords = set()
+    current_tokens = base_tokens
+
+    for item in ordered:
+        new_keywords = set(item['detected_keywords']) - current_keywords
+        added_tokens = (
+            estimate_tokens(item['product_message'])
+            + sum(reference_tokens(keyword) for keyword in new_keywords)
+        )
+
+        if current and (
+            len(current) >= max_batch_size
+            or current_tokens + added_tokens > token_budget
+        ):
+            batches.append(current)
+            current = []
+            current_keywords = set()
+            current_tokens = base_tokens
+            new_keywords = set(item['detected_keywords'])
+            added_tokens = (
+                estimate_tokens(item['product_message'])
+                + sum(reference_tokens(keyword) for keyword in new_keywords)
+            )
+
+        current.append(item)
+        current_keywords |= new_keywords
+        current_tokens += added_tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+def build_batch_message(product_messages, structured=False):
+    """
+    Build a user message containing several products
+
+    Args:
+        product_messages: List of product messages (product ids are 1-based positions)
+        structured: Whether the answer is structured JSON (product ids go in product_id)
+
+    Returns:
+        String to send as the user message
+    """
+    parts = [f"以下の{len(product_messages)}件の商品をそれぞれチェックしてください。"]
+    if structured:
+        parts.append("各商品の product_id には、対応する「" + PRODUCT_HEADING.format(product_id="番号") + "」の番号を入れてください。")
+    else:
+        parts.extend([
+            "各商品の回答は、必ず対応する「" + PRODUCT_HEADING.format(product_id="番号") + "」の見出し行から始めてください。",
+            "見出しの後は通常どおりの出力形式で回答してください。"
+        ])
+
+    for product_id, message in enumerate(product_messages, start=1):
+        parts.append("")
+        parts.append(PRODUCT_HEADING.format(product_id=product_id))
+        parts.append(message)
+
+    return "\n".join(parts)
+
+
+def split_batch_response(result_text, product_count):
+    """
+    Split a batched LLM answer into per-product sections
+
+    Args:
+        result_text: LLM response to a message built by build_batch_message
+        product_count: Number of products in the batch
+
+    Returns:
+        Dictionary mapping 1-based product ids to their answer text
+        (products without a section are missing from the dictionary)
+    """
+    matches = list(PRODUCT_HEADING_PATTERN.finditer(result_text))
+    sections = {}
+
+    for i, match in enumerate(matches):
+        product_id = int(match.group(1))
+        if not 1 <= product_id <= product_count or product_id in sections:
+            continue
+
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(result_text)
+        section = result_text[match.end():end].strip()
+        if section:
+            sections[product_id] = section
+
+    return sections
@@ -0,0 +1,394 @@
+"""
+Benchmarks for Keywords Checker
+Times the keyword detection, prompt building and Excel hot paths on synthetic catalog
+sheets, loading the skills from their sources and from compiled bundles, and the full
+/api/check-excel flow against the mock LLM server
+
+Usage:
+    python benchmark.py                                  # 1k / 10k / 100k rows
+    python benchmark.py --rows 1000 10000 --e2e-rows 500 --llm-latency 0.5
+    python benchmark.py --save baseline.json             # 結果をJSONに保存
+    python benchmark.py --baseline baseline.json         # 保存した結果より遅くなった項目があれば終了コード1
+    python benchmark.py --rows 1000 --llm-rate-limit-rate 0.1   # 429が混ざる場合の一括チェック
+"""
+
+import io
+import os
+import csv
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+import openpyxl
+
+from mock_llm_server import MockLLMServer, judge_product, render_text
+
+BACKEND_DIR = Path(__file__).parent
+SAMPLE_CSV = BACKEND_DIR.parent / "examples" / "sample.csv"
+MASTER_CSV = BACKEND_DIR.parent / ".github" / "skills" / "商品コピーチェック" / "master.csv"
+SKILL_NAME = '商品コピーチェック'
+
+# sample.csv の列とチェックシートの列の対応
+SAMPLE_COLUMNS = {
+    'カタログ商品名': '*商品名',
+    'キャッチコピー': '*変更前_キャッチコピーBtoC',
+    '説明': '*変更前_商品の特徴BtoC',
+    '管理カテゴリー大': '管理カテゴリー大',
+    '管理カテゴリー中': '管理カテゴリー中'
+}
+SHEET_COLUMNS = list(SAMPLE_COLUMNS.values()) + ['*変更前_商品の特徴BtoB']
+
+# 色・サイズ違いの商品（同じコピーを共有する）
+VARIANTS = ['', ' ホワイト', ' ブラック', ' Sサイズ', ' Lサイズ', ' 10個入', ' 詰替用']
+# キーワードを埋め込む文の型
+KEYWORD_SENTENCES = ['{}にも配慮した設計です', '毎日の{}対策に', '{}が気になる方へ']
+
+
+def load_keywords():
+    """Load the check keywords of master.csv"""
+    with open(MASTER_CSV, encoding='utf-8', newline='') as f:
+        return [row['チェック用キーワード'] for row in csv.DictReader(f, delimiter='\t') if row['チェック用キーワード']]
+
+
+def load_templates():
+    """Load the example products of sample.csv as sheet rows"""
+    with open(SAMPLE_CSV, encoding='utf-8', newline='') as f:
+        return [
+            {column: row[source] for source, column in SAMPLE_COLUMNS.items()}
+            for row in csv.DictReader(f)
+        ]
+
+
+def generate_rows(count, keywords, templates, seed=0):
+    """
+    Generate synthetic catalog rows
+
+    Products are drawn from the templates with 1-4 variants sharing the same copy
+    (like colour/size variants of a catalog); about half of them get master.csv
+    keywords mixed into their B2B feature text
+
+    Args:
+        count: Number of rows
+        keywords: Keywords to mix in
+        templates: Template rows (load_templates)
+        seed: Random seed (the same seed generates the same rows)
+
+    Returns:
+        List of row dictionaries keyed by SHEET_COLUMNS
+    """
+    rng = random.Random(seed)
+    rows = []
+    product_number = 0
+    while len(rows) < count:
+        product_number += 1
+        template = rng.choice(templates)
+        features = f"商品番号{product_number}。{template['*変更前_商品の特徴BtoC']}"
+        if rng.random() < 0.5:
+            for keyword in rng.sample(keywords, rng.randint(1, 3)):
+                features += '。' + rng.choice(KEYWORD_SENTENCES).format(keyword)
+
+        for variant in rng.sample(VARIANTS, rng.randint(1, 4)):
+            row = dict(template)
+            row['*商品名'] = f"{template['*商品名']}{variant}"
+            row['*変更前_商品の特徴BtoB'] = features
+            rows.append(row)
+    return rows[:count]
+
+
+def write_sheet(rows, path):
+    """Write rows as the 「チェック対象」 sheet of an .xlsx file"""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('チェック対象')
+    sheet.append(SHEET_COLUMNS)
+    for row in rows:
+        sheet.append([row[column] for column in SHEET_COLUMNS])
+    workbook.save(path)
+
+
+def sample_answer(product_message, keywords):
+    """Answer of the mock LLM server for a product (used to time extract_conclusion)"""
+    return render_text([(1, judge_product(product_message, keywords, single=True))], batched=False)
+
+
+def measure(name, rows, func, memory=True, setup=None):
+    """
+    Time a benchmark function, then run it again under tracemalloc for its peak memory
+
+    Args:
+        name: Name of the measured path
+        rows: Number of rows the function processes
+        func: Callable running the path once
+        memory: Measure the peak memory (runs the function a second time)
+        setup: Callable run before each run of func, outside of the measurement
+
+    Returns:
+        Dictionary with name, rows, seconds, rows_per_sec and peak_mb
+    """
+    if setup:
+        setup()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if memory:
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+
+    result = {
+        'name': name,
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+        'peak_mb': round(peak_mb, 2) if peak_mb is not None else None
+    }
+    print_result(result)
+    return result
+
+
+def print_result(result):
+    peak = f"{result['peak_mb']:>9.2f} MB" if result['peak_mb'] is not None else f"{'-':>12}"
+    print(f"{result['name']:<30} {result['rows']:>8,} rows {result['seconds']:>9.3f} s "
+          f"{result['rows_per_sec'] or 0:>12,.1f} rows/s {peak}", flush=True)
+
+
+def benchmark_hot_paths(app, count, keywords, templates, work_dir, memory=True):
+    """
+    Benchmark the per-row hot paths on a synthetic sheet
+
+    Returns:
+        List of measure results
+    """
+    from excel_io import CheckSheetReader, ResultWorkbookWriter
+
+    rows = generate_rows(count, keywords, templates)
+    input_path = Path(work_dir) / f"catalog_{count}.xlsx"
+    write_sheet(rows, input_path)
+
+    messages = [app.build_product_message(row)[0] for row in rows]
+    keyword_sets = [app.skill_manager.detect_keywords(SKILL_NAME, message) for message in messages]
+    answers = [sample_answer(message, found) for message, found in zip(messages, keyword_sets)]
+    print(f"\n== {count:,} rows（キーワード検出あり {sum(1 for found in keyword_sets if found):,}行、"
+          f"キーワードの組み合わせ {len({frozenset(found) for found in keyword_sets}):,}種類）")
+
+    def build_prompts():
+        for found in keyword_sets:
+            app.skill_manager.build_dynamic_system_prompt(SKILL_NAME, found)
+
+    def read_excel():
+        for _ in CheckSheetReader(input_path).iter_rows():
+            pass
+
+    def write_excel():
+        writer = ResultWorkbookWriter(Path(work_dir) / "result.xlsx", SHEET_COLUMNS)
+        for row, answer in zip(rows, answers):
+            writer.append([row[column] for column in SHEET_COLUMNS], answer, 'OK')
+        writer.close()
+
+    return [
+        measure('build_product_message', count, lambda: [app.build_product_message(row) for row in rows], memory),
+        measure('detect_keywords', count,
+                lambda: [app.skill_manager.detect_keywords(SKILL_NAME, message) for message in messages], memory),
+        # メモ化されたプロンプトを使わないよう、毎回スキルを読み直した状態から測る
+        # （トークナイザーの初回読み込み（1回限り、約1.5秒）は含めない）
+        measure('build_dynamic_system_prompt', count, build_prompts, memory,
+                setup=lambda: (app.count_tokens(''), app.skill_manager.load_all_skills())),
+        measure('extract_conclusion', count, lambda: [app.extract_conclusion(answer) for answer in answers], memory),
+        measure('excel_read', count, read_excel, memory),
+        measure('excel_write', count, write_excel, memory)
+    ]
+
+
+def benchmark_skill_load(work_dir, repeat=20, memory=True):
+    """
+    Benchmark loading the skills from their sources and from compiled bundles
+
+    skill_bundle_open はバンドルを開いてヘッダー（オートマトンの表を含むJSON）を解釈するまで、
+    skill_load_bundle はそれを含むスキルの読み込み全体（rows は読み込み回数）
+
+    Returns:
+        List of measure results
+    """
+    from skill_manager import SkillManager
+    from skill_bundle import BUNDLE_FILENAME, SkillBundle, write_bundle
+
+    skills_dir = Path(work_dir) / "skills"
+    shutil.copytree(BACKEND_DIR / "skills", skills_dir, ignore=shutil.ignore_patterns('skill.bundle*'))
+    skill_manager = SkillManager(skills_dir, use_bundles=False)
+    skill_manager.load_all_skills()
+    bundle_paths = []
+    for skill in skill_manager.skills.values():
+        bundle_path = skill['path'] / BUNDLE_FILENAME
+        write_bundle(skill, bundle_path)
+        bundle_paths.append(bundle_path)
+    print(f"\n== スキルの読み込み（バンドル {sum(path.stat().st_size for path in bundle_paths):,} bytes）")
+
+    def load(use_bundles):
+        for _ in range(repeat):
+            SkillManager(skills_dir, use_bundles=use_bundles).load_all_skills()
+
+    def open_bundles():
+        for _ in range(repeat):
+            for bundle_path in bundle_paths:
+                SkillBundle(bundle_path)
+
+    return [
+        measure('skill_load_source', repeat, lambda: load(False), memory),
+        measure('skill_load_bundle', repeat, lambda: load(True), memory),
+        measure('skill_bundle_open', repeat, open_bundles, memory)
+    ]
+
+
+def benchmark_check_excel(app, count, keywords, templates, llm_server):
+    """
+    Run /api/check-excel end to end against the mock LLM server
+
+    Returns:
+        Measure result with the number of LLM requests added
+    """
+    rows = generate_rows(count, keywords, templates, seed=1)
+    data = io.BytesIO()
+    write_sheet(rows, data)
+
+    print(f"\n== /api/check-excel {count:,} rows（LLM応答 平均 {llm_server.latency}s、同時実行数 {app.CHECK_MAX_WORKERS}）")
+    client = app.app.test_client()
+    before = llm_server.stats()
+    start = time.perf_counter()
+    response = client.post(
+        '/api/check-excel',
+        data={'file': (io.BytesIO(data.getvalue()), 'benchmark.xlsx'), 'skill_name': SKILL_NAME}
+    )
+    seconds = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f"/api/check-excel failed: {response.status_code} {response.get_data(as_text=True)[:200]}")
+
+    result = {
+        'name': 'check_excel_e2e',
+        'rows': count,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(count / seconds, 1),
+        'peak_mb': None,
+        'llm_requests': llm_server.stats()['requests'] - before['requests']
+    }
+    outcomes = Counter(llm_server.stats()['outcomes'])
+    outcomes.subtract(before['outcomes'])
+    print_result(result)
+    print(f"{'':<30} LLMリクエスト {result['llm_requests']:,}件（1行あたり {result['llm_requests'] / count:.2f}件、"
+          f"{', '.join(f'{outcome} {number}' for outcome, number in sorted(outcomes.items()) if number)}）")
+    return result
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Compare rows/sec with a saved run
+
+    Returns:
+        List of regression messages (empty if nothing got slower than the tolerance)
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(item['name'], item['rows']): item for item in json.load(f)['results']}
+
+    regressions = []
+    print(f"\n== ベースライン {baseline_path} との比較（許容 {tolerance:.0%}）")
+    for result in results:
+        previous = baseline.get((result['name'], result['rows']))
+        if not previous or not previous['rows_per_sec'] or not result['rows_per_sec']:
+            continue
+        change = result['rows_per_sec'] / previous['rows_per_sec'] - 1
+        mark = ''
+        if change < -tolerance:
+            mark = '  ← 遅くなっています'
+            regressions.append(f"{result['name']} ({result['rows']:,} rows): {change:+.1%}")
+        print(f"{result['name']:<30} {result['rows']:>8,} rows {change:>+8.1%}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="キーワード検出・プロンプト構築・Excel入出力・一括チェックのベンチマーク")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="ホットパスを測る合成シートの行数 (Default: 1000 10000 100000)")
+    parser.add_argument('--e2e-rows', type=int, default=1000,
+                        help="/api/check-excel を通しで測る行数。0で省略 (Default: 1000)")
+    parser.add_argument('--llm-latency', type=float, default=0.2,
+                        help="モックLLMサーバーの平均応答時間（秒、50〜150%%の一様分布） (Default: 0.2)")
+    parser.add_argument('--llm-rate-limit-rate', type=float, default=0.0,
+                        help="モックLLMサーバーが429を返す割合 (Default: 0)")
+    parser.add_argument('--llm-server-error-rate', type=float, default=0.0,
+                        help="モックLLMサーバーが503を返す割合 (Default: 0)")
+    parser.add_argument('--no-memory', action='store_true', help="ピークメモリを測らない（各項目を1回だけ実行する）")
+    parser.add_argument('--save', help="結果を保存するJSONファイル")
+    parser.add_argument('--baseline', help="比較するJSONファイル（--save で保存したもの）")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="ベースラインから rows/s が何割下がったら失敗とするか (Default: 0.2)")
+    args = parser.parse_args()
+
+    # app の読み込み前に、モックLLMサーバーと結果を再利用しない設定にしておく
+    llm_server = MockLLMServer(
+        port=0,
+        latency=args.llm_latency,
+        latency_distribution='uniform',
+        latency_spread=0.5,
+        rate_limit_rate=args.llm_rate_limit_rate,
+        server_error_rate=args.llm_server_error_rate,
+        seed=0
+    ).start()
+    work_dir = tempfile.mkdtemp(prefix='benchmark_')
+    os.environ.update({
+        'LITELLM_API_BASE': llm_server.url,
+        'OPENAI_API_KEY': 'sk-benchmark',
+        # モデルの料金表をネットワークから取得しない（トークン数の計測中に取得が走るのを避ける）
+        'LITELLM_LOCAL_MODEL_COST_MAP': 'True',
+        'RESULT_CACHE_ENABLED': 'False',
+        'SKILL_RELOAD_INTERVAL': '0',
+        'JOBS_DIR': str(Path(work_dir) / "jobs")
+    })
+    sys.path.insert(0, str(BACKEND_DIR))
+    import app
+
+    # 1行ごとのログは測定結果に影響するため、警告以上だけを出力する
+    logging.getLogger().setLevel(logging.WARNING)
+    app.start_worker()
+
+    keywords = load_keywords()
+    templates = load_templates()
+    # スキルの読み込みはワーカーの起動時と同じく、行データを持つ前に測る
+    results = benchmark_skill_load(work_dir, memory=not args.no_memory)
+    for count in args.rows:
+        results.extend(benchmark_hot_paths(app, count, keywords, templates, work_dir, not args.no_memory))
+    if args.e2e_rows:
+        results.append(benchmark_check_excel(app, args.e2e_rows, keywords, templates, llm_server))
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': sys.version.split()[0],
+                'llm_latency': args.llm_latency,
+                'check_max_workers': app.CHECK_MAX_WORKERS,
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を保存しました: {args.save}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print("\n遅くなった項目:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
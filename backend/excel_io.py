@@ -0,0 +1,172 @@
+"""
+Excel I/O for Keywords Checker
+Reads the check sheet row by row and writes result workbooks incrementally,
+so memory use does not grow with the size of the sheet
+"""
+
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+
+CHECK_SHEET_NAME = 'チェック対象'
+RESULT_SHEET_NAME = 'チェック結果'
+RESULT_COLUMNS = ['チェック結果', '結論']
+SUMMARY_SHEET_NAME = '集計'
+
+
+def _to_text(value):
+    """Convert a cell value to a string like pandas' dtype=str (empty cells become None)"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _make_header(values):
+    """Name empty and duplicated header cells the same way pandas does"""
+    header = []
+    seen = {}
+    for i, value in enumerate(values):
+        name = _to_text(value) or f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        header.append(name)
+    return header
+
+
+class CheckSheetReader:
+    """Lazily reads the 「チェック対象」 sheet of an Excel file"""
+
+    def __init__(self, path):
+        """
+        Open and validate the check sheet
+
+        Args:
+            path: Path to an .xlsx/.xlsm/.xls file
+
+        Raises:
+            ValueError: If the sheet cannot be used for checking (message is shown to the user)
+        """
+        self.path = Path(path)
+        # openpyxl は .xls を読めないため、.xls のみ pandas (xlrd) で読み込む
+        self.streaming = self.path.suffix.lower() != '.xls'
+
+        rows = self._iter_raw_rows()
+        try:
+            header_values = next(rows, None)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f'Failed to read Excel file: {str(e)}')
+        finally:
+            rows.close()
+
+        if header_values is None:
+            raise ValueError('Excel file is empty')
+
+        self.header = _make_header(header_values)
+
+        data_rows = self.iter_rows()
+        try:
+            has_data = next(data_rows, None) is not None
+        finally:
+            data_rows.close()
+
+        if not has_data:
+            raise ValueError('Excel file is empty')
+
+        # 商品名列の存在チェック
+        if '*商品名' not in self.header:
+            raise ValueError('「*商品名」列が見つかりません。シート「チェック対象」に「*商品名」列が必要です。')
+
+    def _iter_raw_rows(self):
+        """Yield raw row tuples including the header row"""
+        if not self.streaming:
+            try:
+                df = pd.read_excel(self.path, sheet_name=CHECK_SHEET_NAME, header=None, dtype=object)
+            except ValueError as e:
+                # シートが存在しない場合
+                if 'Worksheet' in str(e) or CHECK_SHEET_NAME in str(e):
+                    raise ValueError('シート「チェック対象」が見つかりません。Excelファイルに「チェック対象」という名前のシートが存在することを確認してください。')
+                raise
+            for values in df.itertuples(index=False):
+                yield tuple(None if pd.isna(value) else value for value in values)
+            return
+
+        workbook = openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            if CHECK_SHEET_NAME not in workbook.sheetnames:
+                raise ValueError('シート「チェック対象」が見つかりません。Excelファイルに「チェック対象」という名前のシートが存在することを確認してください。')
+            yield from workbook[CHECK_SHEET_NAME].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    def iter_rows(self):
+        """
+        Yield data rows as lists of strings (None for empty cells)
+
+        Empty rows between data rows are kept, trailing empty rows are dropped
+        """
+        rows = self._iter_raw_rows()
+        next(rows, None)  # ヘッダー行
+
+        width = len(self.header)
+        blank_rows = 0
+        for values in rows:
+            row = [_to_text(value) for value in values[:width]]
+            row.extend([None] * (width - len(row)))
+
+            if all(value is None for value in row):
+                blank_rows += 1
+                continue
+
+            # 途中の空行はそのまま残す（行番号を元のシートと揃えるため）
+            for _ in range(blank_rows):
+                yield [None] * width
+            blank_rows = 0
+            yield row
+
+    def iter_records(self):
+        """Yield data rows as dictionaries keyed by column name"""
+        for row in self.iter_rows():
+            yield dict(zip(self.header, row))
+
+    def count_rows(self):
+        """Count the data rows with a single streaming pass"""
+        return sum(1 for _ in self.iter_rows())
+
+
+class ResultWorkbookWriter:
+    """Appends result rows to a write-only workbook on disk"""
+
+    def __init__(self, path, header):
+        """
+        Create the result workbook
+
+        Args:
+            path: Output path of the .xlsx file
+            header: Column names of the input sheet
+        """
+        self.path = Path(path)
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(RESULT_SHEET_NAME)
+        self.sheet.append(list(header) + RESULT_COLUMNS)
+
+    def append(self, row, result_text, conclusion):
+        """Append an input row followed by its result columns"""
+        self.sheet.append(list(row) + [result_text, conclusion])
+
+    def add_sheet(self, title, rows):
+        """Add a sheet after the results (e.g. the summary of the run)"""
+        sheet = self.workbook.create_sheet(title)
+        for row in rows:
+            sheet.append(row)
+
+    def close(self):
+        """Write the workbook to disk"""
+        self.workbook.save(self.path)
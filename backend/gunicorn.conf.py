@@ -0,0 +1,35 @@
+"""
+Gunicorn configuration for Keywords Checker
+
+Usage (from the backend directory):
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+
+bind = os.getenv('GUNICORN_BIND') or '0.0.0.0:5001'
+
+# LLM呼び出しは同期のlitellm・チェック処理はスレッドプールで動くため、スレッドワーカーを使う
+# 同時に処理できるリクエスト数は workers × threads
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS') or '2')
+threads = int(os.getenv('GUNICORN_THREADS') or '16')
+
+# LLMのレート制限（LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE）はワーカーごとに守るため、
+# アプリの読み込み前にワーカー数を渡して各ワーカーに制限を等分させる
+os.environ['LLM_RATE_LIMIT_PROCESSES'] = str(workers)
+
+# ワーカーの応答確認のタイムアウト（gthreadではリクエストの処理時間の上限ではない）
+timeout = 120
+graceful_timeout = 30
+# SSEの接続やフロントエンドからのポーリングで使い回すキープアライブ
+keepalive = 5
+
+# スキルはマスタープロセスで1回だけ読み込み、fork したワーカーで共有する
+preload_app = True
+
+
+def post_fork(server, worker):
+    # 接続プール・SQLiteの接続・監視スレッド・ジョブ実行スレッドはワーカーごとに開始する
+    import app
+    app.start_worker()
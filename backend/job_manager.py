@@ -0,0 +1,506 @@
+"""
+Job Manager for Keywords Checker
+Runs bulk Excel checks in the background and persists progress so jobs survive restarts
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+import metrics
+from excel_io import CheckSheetReader, ResultWorkbookWriter, SUMMARY_SHEET_NAME
+
+logger = logging.getLogger(__name__)
+
+# ジョブの状態
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+# 結果が保存されていない行（処理中の異常終了など）に書き出す結果
+MISSING_RESULT = ("エラー: この行のチェック結果が保存されていません（再度チェックしてください）", "ERROR")
+
+
+def _process_alive(pid):
+    """Whether a process with the given pid exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobManager:
+    """
+    Queues bulk Excel checks and records each finished row in SQLite
+
+    複数のワーカープロセスが同じジョブDBを共有できるよう、各プロセスのランナーは
+    ジョブを処理する前にDB上で自分のpidを記録して取得（claim）する
+    """
+
+    def __init__(self, jobs_dir, check_rows, poll_interval=2.0):
+        """
+        Initialize the JobManager
+
+        Args:
+            jobs_dir: Directory holding the job database and uploaded/result workbooks
+            check_rows: Callable(indexed_rows, skill_name, on_result, mode) checking rows
+                in the mode given at submit, calling on_result(row_index, result_text, conclusion)
+                as each row finishes and returning a dictionary of decision counts for the job summary
+            poll_interval: Seconds between looks for jobs submitted to other processes
+        """
+        self.jobs_dir = Path(jobs_dir)
+        self.check_rows = check_rows
+        self.poll_interval = poll_interval
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._connect()
+
+    def _connect(self):
+        """Open the job database and create or migrate its tables"""
+        self._conn = sqlite3.connect(str(self.jobs_dir / "jobs.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                skill_name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total_rows INTEGER NOT NULL,
+                error TEXT,
+                summary TEXT,
+                created_at REAL NOT NULL,
+                finished_at REAL
+            )
+        """)
+        # 以前のバージョンで作成されたDBにない列を追加
+        # runner_pid: 処理中のプロセス / session_*: ETA計算用の今回の処理開始時刻と開始時点の処理済み行数
+        # mode: チェックモード（NULL は check_rows の既定のモード）
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        for column, column_type in (
+            ('summary', 'TEXT'), ('runner_pid', 'INTEGER'),
+            ('session_started_at', 'REAL'), ('session_rows', 'INTEGER'), ('mode', 'TEXT')
+        ):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_rows (
+                job_id TEXT NOT NULL,
+                row_index INTEGER NOT NULL,
+                result_text TEXT NOT NULL,
+                conclusion TEXT NOT NULL,
+                PRIMARY KEY (job_id, row_index)
+            )
+        """)
+        self._conn.commit()
+
+    def reopen(self):
+        """
+        Open a new database connection
+
+        fork した子プロセスでは親プロセスの接続を使えないため、子プロセスの開始時に呼び出す
+        """
+        with self._lock:
+            self._connect()
+
+    def start(self):
+        """
+        Start the background runner
+
+        未完了のジョブ（処理していたプロセスが終了したもの）もランナーが取得して再開する
+        """
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._thread = threading.Thread(target=self._run, name="job-runner", daemon=True)
+        self._thread.start()
+
+    def submit(self, file, filename, skill_name, mode=None):
+        """
+        Save an uploaded workbook and queue it for checking
+
+        Args:
+            file: Uploaded file object with a save(path) method
+            filename: Original filename (used for the extension and display)
+            skill_name: Name of the skill to use
+            mode: Check mode passed to check_rows (None for its default)
+
+        Returns:
+            The new job id
+
+        Raises:
+            ValueError: If the workbook cannot be read as a check sheet
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = self.jobs_dir / job_id
+        job_dir.mkdir(parents=True)
+        input_path = job_dir / f"input{Path(filename).suffix.lower()}"
+        file.save(str(input_path))
+
+        try:
+            total_rows = CheckSheetReader(input_path).count_rows()
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO jobs (job_id, filename, skill_name, mode, status, total_rows, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (job_id, filename, skill_name, mode, JOB_QUEUED, total_rows, time.time())
+            )
+            self._conn.commit()
+
+        logger.info(f"📥 ジョブ登録: {job_id} ({filename}, {total_rows}行{f', モード: {mode}' if mode else ''})")
+        self._queue.put(job_id)
+        return job_id
+
+    def get_status(self, job_id):
+        """
+        Get the progress of a job
+
+        Args:
+            job_id: Job id returned by submit
+
+        Returns:
+            Dictionary with status, row counts, conclusion counts and ETA, or None if unknown
+        """
+        with self._lock:
+            job = self._conn.execute(
+                """
+                SELECT filename, skill_name, mode, status, total_rows, error, summary, created_at, finished_at,
+                       session_started_at, session_rows
+                FROM jobs WHERE job_id = ?
+                """,
+                (job_id,)
+            ).fetchone()
+            if not job:
+                return None
+
+            counts = dict(self._conn.execute(
+                "SELECT conclusion, COUNT(*) FROM job_rows WHERE job_id = ? GROUP BY conclusion",
+                (job_id,)
+            ).fetchall())
+
+        (filename, skill_name, mode, status, total_rows, error, summary, created_at, finished_at,
+         session_started_at, session_rows) = job
+        rows_done = sum(counts.values())
+
+        summary = json.loads(summary) if summary else {}
+        checked = summary.get('llm', 0) + summary.get('duplicate', 0)
+        if checked:
+            summary['dedup_ratio'] = round(summary.get('duplicate', 0) / checked, 4)
+
+        return {
+            'job_id': job_id,
+            'status': status,
+            'filename': filename,
+            'skill_name': skill_name,
+            'mode': mode,
+            'total_rows': total_rows,
+            'rows_done': rows_done,
+            'counts': counts,
+            'summary': summary,
+            'eta_seconds': (
+                self._estimate_remaining(session_started_at, session_rows, rows_done, total_rows)
+                if status == JOB_RUNNING else None
+            ),
+            'error': error,
+            'created_at': created_at,
+            'finished_at': finished_at
+        }
+
+    def get_result_path(self, job_id):
+        """Return the result workbook path of a completed job, or None"""
+        status = self.get_status(job_id)
+        if not status or status['status'] != JOB_COMPLETED:
+            return None
+        return self.jobs_dir / job_id / "result.xlsx"
+
+    def iter_row_events(self, job_id, after=0, poll_interval=0.5, page_size=500):
+        """
+        Yield the rows of a job as they finish, until the job is completed or failed
+
+        行は保存された順（rowid順）に返すため、rowid を Last-Event-ID として再接続時の続きから読める
+
+        Args:
+            job_id: Job id returned by submit
+            after: rowid of the last row already received (0 = from the first row)
+            poll_interval: Seconds between polls while no new rows are recorded
+            page_size: Maximum number of rows read per query
+
+        Yields:
+            Tuples (rowid, row_index, result_text, conclusion), and None after every
+            poll without new rows (so that callers can send keep-alives)
+        """
+        while True:
+            with self._lock:
+                # 状態を先に読むため、終了済みと判定した時点で全行が保存済みになっている
+                job = self._conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                page = self._conn.execute(
+                    """
+                    SELECT rowid, row_index, result_text, conclusion FROM job_rows
+                    WHERE job_id = ? AND rowid > ? ORDER BY rowid LIMIT ?
+                    """,
+                    (job_id, after, page_size)
+                ).fetchall()
+
+            for row in page:
+                yield row
+            if page:
+                after = page[-1][0]
+                if len(page) == page_size:
+                    continue
+
+            if not job or job[0] in (JOB_COMPLETED, JOB_FAILED):
+                return
+
+            if not page:
+                yield None
+            time.sleep(poll_interval)
+
+    @staticmethod
+    def _estimate_remaining(started_at, done_at_start, rows_done, total_rows):
+        """Estimate the remaining seconds from this session's throughput"""
+        if started_at is None or rows_done >= total_rows:
+            return None
+
+        processed = rows_done - (done_at_start or 0)
+        if processed <= 0:
+            return None
+
+        rate = processed / (time.time() - started_at)
+        return round((total_rows - rows_done) / rate, 1)
+
+    @staticmethod
+    def _claimable(status, runner_pid):
+        """Whether a job may be taken by this process"""
+        if status == JOB_QUEUED:
+            return True
+        if status != JOB_RUNNING:
+            return False
+        # 自分のpidで処理中のまま残っているジョブは、同じpidだった以前のプロセスのもの
+        # （ランナーはジョブを処理していない間だけ取得を試みる）
+        return runner_pid is None or runner_pid == os.getpid() or not _process_alive(runner_pid)
+
+    def _claim(self, job_id):
+        """
+        Mark a job as running in this process
+
+        Returns:
+            True if this process took the job, False if it is finished or another process runs it
+        """
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT status, runner_pid FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if not job or not self._claimable(*job):
+                return False
+
+            (rows_done,) = self._conn.execute(
+                "SELECT COUNT(*) FROM job_rows WHERE job_id = ?", (job_id,)
+            ).fetchone()
+
+            # 読み取った時点の状態のままの場合だけ更新する（他のプロセスと同時に取得しないため）
+            cursor = self._conn.execute(
+                """
+                UPDATE jobs SET status = ?, runner_pid = ?, session_started_at = ?, session_rows = ?
+                WHERE job_id = ? AND status = ? AND runner_pid IS ?
+                """,
+                (JOB_RUNNING, os.getpid(), time.time(), rows_done, job_id, *job)
+            )
+            self._conn.commit()
+            if not cursor.rowcount:
+                return False
+
+        if job[0] == JOB_RUNNING:
+            logger.info(f"未完了ジョブを再開します: {job_id}")
+        return True
+
+    def _claim_next(self):
+        """Take the oldest job that is queued or left unfinished, or return None"""
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (JOB_QUEUED, JOB_RUNNING)
+            ).fetchall()
+
+        for (job_id,) in candidates:
+            if self._claim(job_id):
+                return job_id
+        return None
+
+    def _run(self):
+        """
+        Process jobs one at a time
+
+        このプロセスに登録されたジョブを優先し、ないときは他のプロセスに登録されたジョブや
+        未完了のジョブを取得する
+        """
+        while True:
+            try:
+                job_id = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                job_id = self._claim_next()
+            else:
+                if not self._claim(job_id):
+                    continue
+
+            if not job_id:
+                continue
+
+            try:
+                self._process_job(job_id)
+            except Exception as e:
+                logger.error(f"ジョブ {job_id} でエラー: {e}", exc_info=True)
+                self._set_status(job_id, JOB_FAILED, error=str(e))
+
+    def _process_job(self, job_id):
+        """Check the unfinished rows of a job and write the result workbook"""
+        with self._lock:
+            filename, skill_name, mode, total_rows = self._conn.execute(
+                "SELECT filename, skill_name, mode, total_rows FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            done = {
+                row_index for (row_index,) in self._conn.execute(
+                    "SELECT row_index FROM job_rows WHERE job_id = ?", (job_id,)
+                )
+            }
+
+        job_dir = self.jobs_dir / job_id
+        input_path = next(job_dir.glob("input.*"))
+        reader = CheckSheetReader(input_path)
+
+        logger.info(f"📊 ジョブ開始: {job_id} ({filename}) 残り {total_rows - len(done)}/{total_rows}行")
+
+        completed = 0
+
+        def on_result(row_index, result_text, conclusion):
+            nonlocal completed
+            self._record_row(job_id, row_index, result_text, conclusion)
+            completed += 1
+
+            if completed % 100 == 0:
+                logger.info(f"ジョブ {job_id} 進捗: {len(done) + completed}/{total_rows} 行処理済み")
+
+        with metrics.collect_run() as run_metrics:
+            decisions = self.check_rows(
+                (
+                    (row_index, row)
+                    for row_index, row in enumerate(reader.iter_records())
+                    if row_index not in done
+                ),
+                skill_name,
+                on_result,
+                mode
+            )
+        summary = self._add_summary(job_id, decisions, run_metrics.snapshot())
+
+        # 入力シートと保存済みの結果を row_index で突き合わせ、先頭から順に書き出す
+        # （結果のない行は位置をずらさず、エラーとして書き出す）
+        writer = ResultWorkbookWriter(job_dir / "result.xlsx", reader.header)
+        results = self._iter_row_results(job_id)
+        stored = next(results, None)
+        missing = []
+        for row_index, row in enumerate(reader.iter_rows()):
+            while stored and stored[0] < row_index:
+                stored = next(results, None)
+            if stored and stored[0] == row_index:
+                writer.append(row, *stored[1:])
+            else:
+                missing.append(row_index)
+                writer.append(row, *MISSING_RESULT)
+        writer.add_sheet(SUMMARY_SHEET_NAME, metrics.summary_rows(summary.get('metrics', {})))
+        writer.close()
+
+        if missing:
+            logger.error(
+                f"ジョブ {job_id}: {len(missing)}行の結果が保存されていないためエラーとして出力 "
+                f"(行 {', '.join(str(row_index + 1) for row_index in missing[:20])}"
+                f"{' ...' if len(missing) > 20 else ''})"
+            )
+            for row_index in missing:
+                self._record_row(job_id, row_index, *MISSING_RESULT)
+
+        self._set_status(job_id, JOB_COMPLETED)
+        logger.info(f"✅ ジョブ完了: {job_id} ({total_rows}行)")
+
+    def _iter_row_results(self, job_id, page_size=1000):
+        """Yield (row_index, result_text, conclusion) of a job in row order, one page at a time"""
+        last_index = -1
+        while True:
+            with self._lock:
+                page = self._conn.execute(
+                    """
+                    SELECT row_index, result_text, conclusion FROM job_rows
+                    WHERE job_id = ? AND row_index > ? ORDER BY row_index LIMIT ?
+                    """,
+                    (job_id, last_index, page_size)
+                ).fetchall()
+
+            if not page:
+                return
+
+            yield from page
+            last_index = page[-1][0]
+
+    def _add_summary(self, job_id, decisions, run_metrics=None):
+        """
+        Add the decision counts and metrics of a run to the job summary
+        (jobs may run in several sessions)
+
+        Returns:
+            The updated summary
+        """
+        with self._lock:
+            (summary,) = self._conn.execute(
+                "SELECT summary FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            totals = json.loads(summary) if summary else {}
+            for key, count in (decisions or {}).items():
+                totals[key] = totals.get(key, 0) + count
+            if run_metrics:
+                totals['metrics'] = metrics.merge_snapshots(totals.get('metrics', {}), run_metrics)
+            self._conn.execute(
+                "UPDATE jobs SET summary = ? WHERE job_id = ?", (json.dumps(totals), job_id)
+            )
+            self._conn.commit()
+        return totals
+
+    def _record_row(self, job_id, row_index, result_text, conclusion):
+        """Persist the result of one row"""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO job_rows (job_id, row_index, result_text, conclusion)
+                VALUES (?, ?, ?, ?)
+                """,
+                (job_id, row_index, result_text, conclusion)
+            )
+            self._conn.commit()
+
+    def _set_status(self, job_id, status, error=None):
+        """Update the status of a job"""
+        finished_at = time.time() if status in (JOB_COMPLETED, JOB_FAILED) else None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                (status, error, finished_at, job_id)
+            )
+            self._conn.commit()
@@ -0,0 +1,321 @@
+"""
+Keyword Matcher for Keywords Checker
+Finds every reference keyword in a text with a single Aho-Corasick pass
+"""
+
+import unicodedata
+from collections import deque
+
+# 小書きの母音（ウィルス/ウイルス など）。ゃゅょっ は意味が変わるため畳み込まない
+_SMALL_VOWELS = str.maketrans('ぁぃぅぇぉ', 'あいうえお')
+# 半角カナの濁点・半濁点はNFKCで結合文字になるため、直前の文字と合成する
+_VOICED_MARKS = ('\u3099', '\u309a')
+
+# オートマトンの出力の種別: キーワード / キーワードの読み / キーワードの除外語
+MATCH_KEYWORD = 0
+MATCH_READING = 1
+MATCH_EXCLUSION = 2
+
+# 文字ごとの正規化結果（入力に現れる文字の種類は限られるため毎回計算しない）
+_char_cache = {}
+
+
+def is_kana(char):
+    """Whether a character is hiragana, katakana (full or half width) or the long vowel mark"""
+    return (
+        '\u3041' <= char <= '\u3096' or '\u309d' <= char <= '\u309e'
+        or '\u30a1' <= char <= '\u30fa' or '\u30fc' <= char <= '\u30fe'
+        or '\uff66' <= char <= '\uff9f'
+    )
+
+
+def is_katakana(char):
+    """Whether a character is katakana (full or half width) or the long vowel mark"""
+    return '\u30a1' <= char <= '\u30fa' or '\u30fc' <= char <= '\u30fe' or '\uff66' <= char <= '\uff9f'
+
+
+def fold_case(text):
+    """
+    Case-fold text while keeping a 1:1 character mapping
+
+    str.lower() can expand some characters (e.g. 'İ'), which would break
+    offsets, so such characters are left as they are.
+
+    Args:
+        text: Text to fold
+
+    Returns:
+        Folded text with the same length as the input
+    """
+    folded = []
+    for char in text:
+        lowered = char.lower()
+        folded.append(lowered if len(lowered) == 1 else char)
+    return ''.join(folded)
+
+
+def _normalize_char(char):
+    """NFKC, case folding, katakana to hiragana and small vowels to full size"""
+    normalized = _char_cache.get(char)
+    if normalized is None:
+        folded = []
+        for c in fold_case(unicodedata.normalize('NFKC', char)):
+            if 'ァ' <= c <= 'ヶ':
+                c = chr(ord(c) - 0x60)
+            folded.append(c.translate(_SMALL_VOWELS))
+        normalized = _char_cache[char] = ''.join(folded)
+    return normalized
+
+
+def normalize(text):
+    """
+    Normalize text for matching and keep the mapping back to the original
+
+    全角/半角・ひらがな/カタカナ・大文字/小文字・小書きの母音の違いを吸収する
+    （例:「ｱﾄﾋﾟｰ」「アトピー」「あとぴー」は同じ文字列になる）
+
+    Args:
+        text: Text to normalize
+
+    Returns:
+        Tuple: (normalized, starts, ends)
+        - normalized: Normalized text
+        - starts / ends: Offsets in the original text of each normalized character
+    """
+    chars = []
+    starts = []
+    ends = []
+
+    for position, char in enumerate(text):
+        for c in _normalize_char(char):
+            if c in _VOICED_MARKS and chars:
+                composed = unicodedata.normalize('NFC', chars[-1] + c)
+                if len(composed) == 1:
+                    chars[-1] = composed
+                    ends[-1] = position + 1
+                    continue
+            chars.append(c)
+            starts.append(position)
+            ends.append(position + 1)
+
+    return ''.join(chars), starts, ends
+
+
+def normalize_text(text):
+    """Return only the normalized text of normalize()"""
+    return normalize(text)[0]
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton built once from a list of keywords"""
+
+    def __init__(self, keywords, aliases=None, exclusions=None, longest_match=False):
+        """
+        Build the automaton
+
+        Args:
+            keywords: Iterable of keyword names (matched after normalize())
+            aliases: Optional dictionary mapping keywords to their 読み; a reading is
+                reported as the keyword only when it is a whole kana run in the text
+                (bounded by non-kana characters) and not written in katakana
+            exclusions: Optional dictionary mapping keywords to terms; an occurrence
+                of the keyword inside one of its terms is not reported (e.g. 病 in 病院)
+            longest_match: If True, an occurrence lying inside a longer occurrence
+                of another keyword is not reported (e.g. 血圧 in 高血圧)
+        """
+        self.keywords = [keyword for keyword in keywords if keyword]
+        self._order = {keyword: i for i, keyword in enumerate(self.keywords)}
+        self.longest_match = longest_match
+
+        # 状態ごとの遷移・失敗リンク・出力（(キーワード, 正規化後の長さ, 種別) のリスト）
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for keyword in self.keywords:
+            pattern = normalize_text(keyword)
+            if pattern:
+                self._add(keyword, pattern)
+            for alias in (aliases or {}).get(keyword, ()):
+                alias = normalize_text(alias)
+                if alias and alias != pattern:
+                    self._add(keyword, alias, MATCH_READING)
+
+        # 除外語も同じオートマトンに入れ、キーワードと同じ1回の走査で検出する
+        for keyword, terms in (exclusions or {}).items():
+            if keyword not in self._order:
+                continue
+            for term in terms:
+                pattern = normalize_text(term)
+                if pattern:
+                    self._add(keyword, pattern, MATCH_EXCLUSION)
+
+        self._build_failure_links()
+
+    def to_tables(self):
+        """
+        Export the built automaton so that it can be restored without rebuilding it
+
+        Returns:
+            JSON-serializable dictionary for from_tables
+        """
+        return {
+            'keywords': self.keywords,
+            'longest_match': self.longest_match,
+            'goto': self._goto,
+            'fail': self._fail,
+            # キーワードは名前の代わりに keywords の位置で持つ
+            'output': [
+                [[self._order[keyword], length, kind] for keyword, length, kind in outputs]
+                for outputs in self._output
+            ]
+        }
+
+    @classmethod
+    def from_tables(cls, tables):
+        """
+        Restore an automaton exported by to_tables
+
+        表は正規化後の文字で作られているため、normalize() を変更したら書き出し直す必要がある
+
+        Args:
+            tables: Output of to_tables
+
+        Returns:
+            KeywordMatcher equivalent to the exported one
+        """
+        matcher = cls.__new__(cls)
+        matcher.keywords = tables['keywords']
+        matcher._order = {keyword: i for i, keyword in enumerate(matcher.keywords)}
+        matcher.longest_match = tables['longest_match']
+        matcher._goto = tables['goto']
+        matcher._fail = tables['fail']
+        matcher._output = [
+            [(matcher.keywords[index], length, kind) for index, length, kind in outputs]
+            for outputs in tables['output']
+        ]
+        return matcher
+
+    def _add(self, keyword, pattern, kind=MATCH_KEYWORD):
+        """Add a normalized pattern of a keyword (its name, 読み or one of its exclusion terms) to the trie"""
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append((keyword, len(pattern), kind))
+
+    def _build_failure_links(self):
+        """Compute failure links breadth-first and merge outputs along them"""
+        queue = deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+
+                self._output[next_state] = (
+                    self._output[next_state] + self._output[self._fail[next_state]]
+                )
+
+    def _scan(self, text):
+        """
+        Normalize the text and scan it once
+
+        Yields:
+            Tuple: (keyword, start, end, kind) - offsets in the original text, kind is
+            MATCH_KEYWORD, MATCH_READING or MATCH_EXCLUSION (one of the keyword's exclusion terms)
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+
+        normalized, starts, ends = normalize(text)
+        for position, char in enumerate(normalized):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            for keyword, length, kind in output[state]:
+                yield keyword, starts[position + 1 - length], ends[position], kind
+
+    @staticmethod
+    def _is_reading_word(text, start, end):
+        """
+        Whether a reading occurrence stands as a word of its own
+
+        「けっこうな」「あんしんして」のように前後に続くかなの一部や、「イチョウ」「ケッコウ」のように
+        カタカナで書かれた別の語は、読みが一致しても対象のキーワードとはみなさない
+        """
+        if start > 0 and is_kana(text[start - 1]):
+            return False
+        if end < len(text) and is_kana(text[end]):
+            return False
+        return not all(is_katakana(char) for char in text[start:end])
+
+    def iter_matches(self, text):
+        """
+        Find every keyword occurrence, applying the exclusion and longest-match rules
+
+        Args:
+            text: Text to search
+
+        Returns:
+            List of tuples: (keyword, start, end) - offsets in the original text, end is exclusive
+        """
+        matches = []
+        excluded = {}
+        for keyword, start, end, kind in self._scan(text):
+            if kind == MATCH_EXCLUSION:
+                excluded.setdefault(keyword, []).append((start, end))
+            elif kind == MATCH_KEYWORD or self._is_reading_word(text, start, end):
+                matches.append((keyword, start, end))
+
+        if excluded:
+            matches = [
+                (keyword, start, end) for keyword, start, end in matches
+                if not any(
+                    term_start <= start and end <= term_end
+                    for term_start, term_end in excluded.get(keyword, ())
+                )
+            ]
+
+        if self.longest_match and len(matches) > 1:
+            matches = [
+                (keyword, start, end) for keyword, start, end in matches
+                if not any(
+                    other != keyword and other_start <= start and end <= other_end
+                    and other_end - other_start > end - start
+                    for other, other_start, other_end in matches
+                )
+            ]
+
+        return matches
+
+    def find_all(self, text):
+        """
+        Find all keyword occurrences grouped by keyword
+
+        Args:
+            text: Text to search
+
+        Returns:
+            Dictionary mapping keyword names to lists of (start, end) offsets,
+            ordered like the keywords passed to the constructor
+        """
+        found = {}
+        for keyword, start, end in self.iter_matches(text):
+            found.setdefault(keyword, []).append((start, end))
+
+        return {keyword: found[keyword] for keyword in sorted(found, key=self._order.__getitem__)}
@@ -0,0 +1,474 @@
+"""
+Metrics for Keywords Checker
+Process-wide counters and histograms exposed in the Prometheus text format,
+plus per-run aggregates for the summary sheet of bulk checks
+
+gunicorn の各ワーカープロセスは自分のメトリクスを共有ディレクトリにJSONで書き出し、
+スクレイプを受けたワーカーが全ワーカーの分を合算して返す
+"""
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 実行中の一括チェックの集計（スレッドプールへは contextvars.copy_context() で引き継ぐ）
+_current_run = contextvars.ContextVar('current_run', default=None)
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 12000, 16000, 24000, 32000, 64000)
+
+
+def _escape(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    """Render {name="value",...} for a label set (empty string without labels)"""
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    """Base class of a labeled metric"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def values(self):
+        """Return a copy of the current values keyed by label values"""
+        with self._lock:
+            return {
+                key: dict(value, buckets=list(value['buckets'])) if isinstance(value, dict) else value
+                for key, value in self._values.items()
+            }
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _run_key(self, key):
+        """Name of the metric in the per-run aggregates (label values appended)"""
+        return ':'.join((self.name, *key)) if key else self.name
+
+    def render(self, items=None, labelnames=None):
+        """
+        Return the Prometheus text exposition lines of the metric
+
+        Args:
+            items: (label values, value) pairs to render instead of this process's values
+            labelnames: Label names of the items (default: the metric's label names)
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        if items is None:
+            with self._lock:
+                items = list(self._values.items())
+        lines.extend(self._render_items(sorted(items), labelnames or self.labelnames))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+        run = _current_run.get()
+        if run:
+            run.count(self._run_key(key), amount)
+
+    def _render_items(self, items, labelnames):
+        return [f"{self.name}{_format_labels(labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that is set at scrape time"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _render_items(self, items, labelnames):
+        return [f"{self.name}{_format_labels(labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state['buckets'][index] += 1
+            state['count'] += 1
+            state['sum'] += value
+
+        run = _current_run.get()
+        if run:
+            run.observe(self._run_key(key), value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_items(self, items, labelnames):
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['buckets']):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labelnames, key, ('le', bound))} {cumulative}"
+                )
+            lines.append(
+                f"{self.name}_bucket{_format_labels(labelnames, key, ('le', '+Inf'))} {state['count']}"
+            )
+            lines.append(f"{self.name}_sum{_format_labels(labelnames, key)} {state['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(labelnames, key)} {state['count']}")
+        return lines
+
+
+def _process_alive(pid):
+    """Whether a process with the given pid exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Registry:
+    """
+    Collection of metrics rendered together
+
+    share() を呼ぶと、各プロセスの値を共有ディレクトリの <pid>.json に定期的に書き出し、
+    render() で全プロセスの値を合算する（カウンター・ヒストグラムは合計、ゲージは pid ラベル付きで
+    動作中のプロセスの分だけ）。終了したプロセスの値も、カウンターが減らないよう合計に残す
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._shared_dir = None
+        self._writer = None
+        self._write_lock = threading.Lock()
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=SECONDS_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def on_collect(self, callback):
+        """Register a callable run before the values are rendered or shared (e.g. to set gauges)"""
+        self._collectors.append(callback)
+        return callback
+
+    def _collect(self):
+        for callback in self._collectors:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"メトリクスの収集に失敗しました: {e}")
+
+    def snapshot(self):
+        """Return the current values of all metrics as a JSON-serializable dictionary"""
+        self._collect()
+        return {
+            metric.name: [[list(key), value] for key, value in metric.values().items()]
+            for metric in self._metrics
+        }
+
+    def clear_shared(self, directory):
+        """Remove the values written by earlier processes (call once when the server starts)"""
+        for path in Path(directory).glob("*.json"):
+            path.unlink(missing_ok=True)
+
+    def share(self, directory, interval=5.0):
+        """
+        Write this process's values to a shared directory every interval seconds
+
+        Args:
+            directory: Directory shared by the worker processes
+            interval: Seconds between writes (values of other processes are at most this old)
+        """
+        self._shared_dir = Path(directory)
+        self._shared_dir.mkdir(parents=True, exist_ok=True)
+        self.write_shared()
+
+        # fork した子プロセスには親のスレッドは引き継がれないため、動いているかで判定する
+        if self._writer and self._writer.is_alive():
+            return
+
+        def write():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_shared()
+                except Exception as e:
+                    logger.warning(f"メトリクスの書き出しに失敗しました: {e}")
+
+        self._writer = threading.Thread(target=write, name="metrics-writer", daemon=True)
+        self._writer.start()
+
+    def write_shared(self):
+        """Write this process's values to <shared directory>/<pid>.json"""
+        path = self._shared_dir / f"{os.getpid()}.json"
+        tmp_path = path.with_suffix(".tmp")
+        # 書き出しスレッドとスクレイプが同時に書かないようにする（読む側には置き換えで一度に見せる）
+        with self._write_lock:
+            tmp_path.write_text(json.dumps(self.snapshot()), encoding='utf-8')
+            tmp_path.replace(path)
+
+    def _read_shared(self):
+        """Yield (pid, snapshot) for every process that wrote its values"""
+        for path in self._shared_dir.glob("*.json"):
+            try:
+                yield int(path.stem), json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        if not self._shared_dir:
+            self._collect()
+            lines = []
+            for metric in self._metrics:
+                lines.extend(metric.render())
+            return '\n'.join(lines) + '\n'
+
+        # 自分の値は最新のものを書き出してから、全プロセスの分を合算する
+        self.write_shared()
+        merged = {metric.name: {} for metric in self._metrics}
+        for pid, snapshot in self._read_shared():
+            alive = _process_alive(pid)
+            for metric in self._metrics:
+                values = merged[metric.name]
+                for key, value in snapshot.get(metric.name, []):
+                    key = tuple(key)
+                    if isinstance(metric, Gauge):
+                        if alive:
+                            values[key + (str(pid),)] = value
+                    elif isinstance(metric, Histogram):
+                        state = values.setdefault(
+                            key, {'buckets': [0] * len(metric.buckets), 'count': 0, 'sum': 0.0}
+                        )
+                        state['buckets'] = [a + b for a, b in zip(state['buckets'], value['buckets'])]
+                        state['count'] += value['count']
+                        state['sum'] += value['sum']
+                    else:
+                        values[key] = values.get(key, 0) + value
+
+        lines = []
+        for metric in self._metrics:
+            labelnames = metric.labelnames + ('pid',) if isinstance(metric, Gauge) else None
+            lines.extend(metric.render(merged[metric.name].items(), labelnames))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    'keywords_checker_llm_request_seconds', 'Latency of LLM API calls'
+)
+PROMPT_TOKENS = REGISTRY.histogram(
+    'keywords_checker_prompt_tokens', 'Prompt tokens per LLM API call', buckets=TOKEN_BUCKETS
+)
+COMPLETION_TOKENS = REGISTRY.histogram(
+    'keywords_checker_completion_tokens', 'Completion tokens per LLM API call', buckets=TOKEN_BUCKETS
+)
+KEYWORD_DETECTION_SECONDS = REGISTRY.histogram(
+    'keywords_checker_keyword_detection_seconds', 'Time spent detecting keywords in a product text'
+)
+PROMPT_BUILD_SECONDS = REGISTRY.histogram(
+    'keywords_checker_prompt_build_seconds', 'Time spent building a system prompt'
+)
+RESULT_CACHE_LOOKUPS = REGISTRY.counter(
+    'keywords_checker_result_cache_lookups_total', 'Result cache lookups', ['result']
+)
+PROMPT_CACHE_HIT_RATIO = REGISTRY.gauge(
+    'keywords_checker_prompt_cache_hit_ratio', 'Hit ratio of the memoized system prompts'
+)
+LLM_ERRORS = REGISTRY.counter(
+    'keywords_checker_llm_errors_total', 'Failed LLM API calls', ['type']
+)
+RETRIES = REGISTRY.counter(
+    'keywords_checker_retries_total', 'LLM calls and rows retried after a failed attempt', ['reason']
+)
+LLM_CONCURRENCY_LIMIT = REGISTRY.gauge(
+    'keywords_checker_llm_concurrency_limit', 'Concurrent LLM calls currently allowed by the scheduler'
+)
+ROWS = REGISTRY.counter(
+    'keywords_checker_rows_total', 'Rows of bulk checks by conclusion', ['conclusion']
+)
+ROW_DECISIONS = REGISTRY.counter(
+    'keywords_checker_row_decisions_total', 'Rows of bulk checks by how they were decided', ['decision']
+)
+
+
+class RunMetrics:
+    """Aggregates of the metrics observed during one bulk check"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, value):
+        with self._lock:
+            state = self.histograms.setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+            state['count'] += 1
+            state['sum'] += value
+            state['max'] = max(state['max'], value)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """Return the aggregates as a JSON-serializable dictionary"""
+        with self._lock:
+            return {
+                'elapsed_seconds': time.time() - self.started,
+                'histograms': {name: dict(state) for name, state in self.histograms.items()},
+                'counters': dict(self.counters)
+            }
+
+
+@contextmanager
+def collect_run():
+    """Collect the metrics observed in the with block (and the tasks it submits) into a RunMetrics"""
+    run = RunMetrics()
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+def merge_snapshots(total, snapshot):
+    """
+    Add a RunMetrics snapshot to accumulated aggregates (jobs may run in several sessions)
+
+    Args:
+        total: Previously accumulated snapshot (or empty dictionary)
+        snapshot: Snapshot to add
+
+    Returns:
+        The merged snapshot
+    """
+    merged = {
+        'elapsed_seconds': total.get('elapsed_seconds', 0) + snapshot.get('elapsed_seconds', 0),
+        'histograms': {name: dict(state) for name, state in total.get('histograms', {}).items()},
+        'counters': dict(total.get('counters', {}))
+    }
+    for name, state in snapshot.get('histograms', {}).items():
+        current = merged['histograms'].setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+        current['count'] += state['count']
+        current['sum'] += state['sum']
+        current['max'] = max(current['max'], state['max'])
+    for name, count in snapshot.get('counters', {}).items():
+        merged['counters'][name] = merged['counters'].get(name, 0) + count
+    return merged
+
+
+# 集計シートに出力する項目（名前, 表示名, 単位の倍率）
+_SUMMARY_HISTOGRAMS = [
+    ('keywords_checker_llm_request_seconds', 'LLM呼び出し（秒）', 1),
+    ('keywords_checker_prompt_tokens', 'プロンプトトークン数', 1),
+    ('keywords_checker_completion_tokens', '出力トークン数', 1),
+    ('keywords_checker_keyword_detection_seconds', 'キーワード検出（ミリ秒）', 1000),
+    ('keywords_checker_prompt_build_seconds', 'プロンプト構築（ミリ秒）', 1000),
+]
+_SUMMARY_COUNTERS = [
+    ('keywords_checker_rows_total', '結論'),
+    ('keywords_checker_row_decisions_total', '判定方法'),
+    ('keywords_checker_result_cache_lookups_total', '結果キャッシュ'),
+    ('keywords_checker_llm_errors_total', 'LLMエラー'),
+    ('keywords_checker_retries_total', '再試行'),
+]
+
+
+def summary_rows(snapshot):
+    """
+    Build the rows of the summary sheet from a RunMetrics snapshot
+
+    Returns:
+        List of rows (lists of cell values), starting with the header
+    """
+    rows = [['項目', '件数', '合計', '平均', '最大']]
+    rows.append(['処理時間（秒）', None, round(snapshot.get('elapsed_seconds', 0), 1), None, None])
+
+    histograms = snapshot.get('histograms', {})
+    for name, label, scale in _SUMMARY_HISTOGRAMS:
+        state = histograms.get(name)
+        if not state or not state['count']:
+            continue
+        rows.append([
+            label,
+            state['count'],
+            round(state['sum'] * scale, 1),
+            round(state['sum'] * scale / state['count'], 2),
+            round(state['max'] * scale, 1)
+        ])
+
+    counters = snapshot.get('counters', {})
+    for name, label in _SUMMARY_COUNTERS:
+        for key in sorted(counters):
+            if key.startswith(name + ':'):
+                rows.append([f"{label}: {key[len(name) + 1:]}", counters[key], None, None, None])
+
+    hits = counters.get('keywords_checker_result_cache_lookups_total:hit', 0)
+    misses = counters.get('keywords_checker_result_cache_lookups_total:miss', 0)
+    if hits + misses:
+        rows.append(['結果キャッシュ ヒット率', None, None, round(hits / (hits + misses), 4), None])
+
+    return rows
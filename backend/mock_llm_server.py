@@ -0,0 +1,440 @@
+"""
+Mock LLM Server for Keywords Checker
+OpenAI-compatible stand-in for the LLM gateway that answers in the SKILL.md output format,
+with configurable latency, 429/5xx/timeout rates and token usage, for load and CI testing
+
+Usage:
+    python mock_llm_server.py --port 4000 --latency 0.8 --rate-limit-rate 0.05
+    # backend/.env: LITELLM_API_BASE=http://127.0.0.1:4000/v1
+
+    GET /stats で受け付けたリクエスト数・応答の内訳・トークン数を確認できる
+"""
+
+import re
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from batching import PRODUCT_HEADING_PATTERN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+# 動的system_promptの検出キーワード一覧（SkillManager.build_dynamic_system_prompt の形式）
+_DETECTED_KEYWORDS = re.compile(r'以下のキーワードが検出されました:\n((?:- .+\n?)+)')
+_PRODUCT_NAME = re.compile(r'^\*?商品名[:：]\s*(.*)$', re.MULTILINE)
+# ストリーミングで1チャンクに入れる文字数
+STREAM_CHUNK_CHARS = 16
+
+
+def detected_keywords(system_prompt):
+    """Return the keywords listed in a dynamic system prompt"""
+    match = _DETECTED_KEYWORDS.search(system_prompt or '')
+    if not match:
+        return []
+    return [line[2:].strip() for line in match.group(1).strip().split('\n')]
+
+
+def split_products(user_message):
+    """
+    Split a user message into products
+
+    Returns:
+        List of (product_id, product_text); product_id is None for a single-product message
+    """
+    matches = list(PRODUCT_HEADING_PATTERN.finditer(user_message))
+    if not matches:
+        return [(None, user_message)]
+
+    products = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(user_message)
+        products.append((int(match.group(1)), user_message[match.end():end].strip()))
+    return products
+
+
+def judge_product(product_text, keywords, single):
+    """
+    Decide the answer for one product
+
+    A product is NG when it contains one of the detected keywords; a single-product
+    request is NG whenever keywords were detected (the app matched them with
+    normalization, so a plain substring search could miss them)
+
+    Returns:
+        Dictionary in the structured output format (product_name, conclusion, keywords, issues, comments)
+    """
+    name_match = _PRODUCT_NAME.search(product_text)
+    found = keywords if single else [keyword for keyword in keywords if keyword in product_text]
+    product = {
+        'product_name': name_match.group(1).strip() if name_match else '',
+        'conclusion': 'NG' if found else 'OK',
+        'keywords': found,
+        'issues': [],
+        'comments': []
+    }
+    if found:
+        product['issues'] = [
+            {'original_text': keyword, 'reason': f"「{keyword}」はチェック用キーワードに該当（モック応答）", 'fix': f"「{keyword}」を削除"}
+            for keyword in found
+        ]
+    else:
+        product['comments'] = [
+            {'original_text': '全体', 'reason': 'チェック用キーワードに該当なし（モック応答）', 'fix': 'なし'}
+        ]
+    return product
+
+
+def render_text(products, batched):
+    """Render products in the SKILL.md output format (with 商品ID headings for batches)"""
+    lines = []
+    for product_id, product in products:
+        if batched:
+            lines.append(f"### 商品ID: {product_id}")
+        lines.extend([
+            f"- {product['product_name']}",
+            "  - 結論",
+            f"    - {product['conclusion']}",
+            "  - 根拠(対象キーワード)"
+        ])
+        lines.extend(f"    - {keyword}" for keyword in product['keywords'] or ['なし'])
+        if product['issues']:
+            lines.append("  - 問題点・改善点")
+            for number, issue in enumerate(product['issues'], start=1):
+                lines.extend([
+                    f"    - 問題{number}",
+                    f"      - 問題となる原文: {issue['original_text']}",
+                    f"      - 理由: {issue['reason']}",
+                    f"      - 修正案: {issue['fix']}"
+                ])
+        else:
+            lines.append("  - コメント・懸念点")
+            for number, comment in enumerate(product['comments'], start=1):
+                lines.extend([
+                    f"    - 項目{number}",
+                    f"      - 内容: {comment['original_text']}",
+                    f"      - 理由: {comment['reason']}",
+                    f"      - 修正案: {comment['fix']}"
+                ])
+    return '\n'.join(lines)
+
+
+def build_answer(messages, structured=False):
+    """
+    Build the answer to a chat completion request
+
+    Args:
+        messages: Chat messages of the request
+        structured: Answer with the JSON of the structured output schema
+
+    Returns:
+        Answer content
+    """
+    system_prompt = next((message['content'] for message in messages if message['role'] == 'system'), '')
+    user_message = messages[-1]['content'] if messages else ''
+    keywords = detected_keywords(system_prompt)
+
+    split = split_products(user_message)
+    batched = split[0][0] is not None
+    products = [
+        (product_id or 1, judge_product(text, keywords, single=not batched))
+        for product_id, text in split
+    ]
+
+    if structured:
+        return json.dumps({
+            'products': [dict(product, product_id=product_id) for product_id, product in products]
+        }, ensure_ascii=False)
+    return render_text(products, batched)
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """OpenAI-compatible /chat/completions server with simulated latency and failures"""
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=4000, latency=0.5, latency_distribution='lognormal',
+                 latency_spread=0.5, token_latency=0.0, rate_limit_rate=0.0, server_error_rate=0.0,
+                 timeout_rate=0.0, timeout_seconds=130.0, retry_after=1.0, seed=None):
+        """
+        Initialize the MockLLMServer
+
+        Args:
+            host: Address to listen on
+            port: Port to listen on (0 = any free port)
+            latency: Mean (median for lognormal) seconds before the answer starts
+            latency_distribution: fixed / uniform (±spread) / normal (sd = spread × latency) /
+                lognormal (sigma = spread)
+            latency_spread: Width of the latency distribution
+            token_latency: Additional seconds per completion token (generation time)
+            rate_limit_rate: Share of requests answered with 429 Too Many Requests
+            server_error_rate: Share of requests answered with 503 Service Unavailable
+            timeout_rate: Share of requests that get no answer for timeout_seconds
+            timeout_seconds: How long a timed-out request hangs before the connection is closed
+            retry_after: Retry-After seconds sent with 429 answers
+            seed: Random seed (the same seed gives the same sequence of latencies and failures)
+        """
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_distribution must be one of: {', '.join(LATENCY_DISTRIBUTIONS)}")
+        if rate_limit_rate + server_error_rate + timeout_rate > 1:
+            raise ValueError("The sum of the error rates must not exceed 1")
+
+        super().__init__((host, port), MockLLMHandler)
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.latency_spread = latency_spread
+        self.token_latency = token_latency
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.retry_after = retry_after
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._outcomes = Counter()
+        self._tokens = Counter()
+        self._latency_total = 0.0
+
+    @property
+    def url(self):
+        """Base URL to use as LITELLM_API_BASE"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def draw(self):
+        """
+        Draw the outcome and latency of a request
+
+        Returns:
+            Tuple (outcome, latency); outcome is 'ok', 'rate_limit', 'server_error' or 'timeout'
+        """
+        with self._lock:
+            value = self._random.random()
+            if value < self.rate_limit_rate:
+                outcome = 'rate_limit'
+            elif value < self.rate_limit_rate + self.server_error_rate:
+                outcome = 'server_error'
+            elif value < self.rate_limit_rate + self.server_error_rate + self.timeout_rate:
+                outcome = 'timeout'
+            else:
+                outcome = 'ok'
+
+            if self.latency_distribution == 'fixed':
+                latency = self.latency
+            elif self.latency_distribution == 'uniform':
+                latency = self._random.uniform(self.latency * (1 - self.latency_spread), self.latency * (1 + self.latency_spread))
+            elif self.latency_distribution == 'normal':
+                latency = self._random.gauss(self.latency, self.latency * self.latency_spread)
+            else:
+                latency = self._random.lognormvariate(math.log(self.latency), self.latency_spread) if self.latency > 0 else 0.0
+        return outcome, max(0.0, latency)
+
+    def record(self, outcome, latency=0.0, prompt_tokens=0, completion_tokens=0):
+        """Count a finished request"""
+        with self._lock:
+            self._outcomes[outcome] += 1
+            self._latency_total += latency
+            self._tokens['prompt'] += prompt_tokens
+            self._tokens['completion'] += completion_tokens
+
+    def stats(self):
+        """Return the number of requests by outcome and the tokens answered"""
+        with self._lock:
+            requests = sum(self._outcomes.values())
+            return {
+                'requests': requests,
+                'outcomes': dict(self._outcomes),
+                'prompt_tokens': self._tokens['prompt'],
+                'completion_tokens': self._tokens['completion'],
+                'mean_latency_seconds': round(self._latency_total / requests, 4) if requests else 0.0
+            }
+
+    def start(self):
+        """Serve in a background thread (e.g. from a test or a benchmark)"""
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop a server started with start()"""
+        self.shutdown()
+        self.server_close()
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """Request handler of MockLLMServer"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0].rstrip('/')
+        if path in ('', '/health'):
+            self.send_json(200, {'status': 'healthy'})
+        elif path.endswith('/models'):
+            self.send_json(200, {'object': 'list', 'data': [{'id': 'mock', 'object': 'model', 'owned_by': 'mock'}]})
+        elif path == '/stats':
+            self.send_json(200, self.server.stats())
+        else:
+            self.send_json(404, {'error': {'message': f"Not found: {self.path}", 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        except json.JSONDecodeError:
+            self.send_json(400, {'error': {'message': 'Invalid JSON body', 'type': 'invalid_request_error'}})
+            return
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_json(404, {'error': {'message': f"Not found: {self.path}", 'type': 'invalid_request_error'}})
+            return
+
+        server = self.server
+        outcome, latency = server.draw()
+
+        if outcome == 'timeout':
+            # 応答せずに待たせ、クライアントのタイムアウトを発生させる
+            time.sleep(server.timeout_seconds)
+            server.record(outcome, server.timeout_seconds)
+            self.close_connection = True
+            return
+
+        time.sleep(latency)
+        if outcome == 'rate_limit':
+            server.record(outcome, latency)
+            self.send_json(429, {'error': {'message': 'Rate limit exceeded (mock)', 'type': 'rate_limit_error'}},
+                           headers={'Retry-After': f"{server.retry_after:g}"})
+            return
+        if outcome == 'server_error':
+            server.record(outcome, latency)
+            self.send_json(503, {'error': {'message': 'Service unavailable (mock)', 'type': 'server_error'}})
+            return
+
+        messages = body.get('messages') or []
+        response_format = body.get('response_format') or {}
+        content = build_answer(messages, structured=response_format.get('type') == 'json_schema')
+        usage = {
+            'prompt_tokens': sum(estimate_tokens(str(message.get('content') or '')) for message in messages),
+            'completion_tokens': estimate_tokens(content)
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        generation_seconds = server.token_latency * usage['completion_tokens']
+
+        if body.get('stream'):
+            include_usage = bool((body.get('stream_options') or {}).get('include_usage'))
+            self.send_stream(body.get('model', 'mock'), content, usage if include_usage else None, generation_seconds)
+        else:
+            time.sleep(generation_seconds)
+            self.send_json(200, {
+                'id': f"chatcmpl-mock-{time.time_ns()}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'mock'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop'
+                }],
+                'usage': usage
+            })
+        server.record(outcome, latency + generation_seconds, usage['prompt_tokens'], usage['completion_tokens'])
+
+    def send_json(self, status, data, headers=None):
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_stream(self, model, content, usage, generation_seconds):
+        """Send the answer as chat.completion.chunk server-sent events"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        chunk_id = f"chatcmpl-mock-{time.time_ns()}"
+        pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+
+        def send_chunk(choices, chunk_usage=None):
+            chunk = {'id': chunk_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': model, 'choices': choices}
+            if chunk_usage:
+                chunk['usage'] = chunk_usage
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        for piece in pieces:
+            send_chunk([{'index': 0, 'delta': {'role': 'assistant', 'content': piece}, 'finish_reason': None}])
+            time.sleep(generation_seconds / len(pieces))
+        send_chunk([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+        if usage:
+            send_chunk([], usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="負荷試験・CI用のOpenAI互換モックLLMサーバー")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4000)
+    parser.add_argument('--latency', type=float, default=0.5,
+                        help="応答までの平均秒数（lognormal では中央値） (Default: 0.5)")
+    parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal',
+                        help="応答時間の分布 (Default: lognormal)")
+    parser.add_argument('--latency-spread', type=float, default=0.5,
+                        help="分布の広がり: uniform は ±割合、normal は標準偏差の割合、lognormal は sigma (Default: 0.5)")
+    parser.add_argument('--token-latency', type=float, default=0.0,
+                        help="出力1トークンあたりの生成時間（秒） (Default: 0)")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="429 を返す割合 (Default: 0)")
+    parser.add_argument('--server-error-rate', type=float, default=0.0, help="503 を返す割合 (Default: 0)")
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help="応答しない割合 (Default: 0)")
+    parser.add_argument('--timeout-seconds', type=float, default=130.0,
+                        help="応答しないリクエストを待たせる秒数（LLM_TIMEOUT_SECONDS より長くする） (Default: 130)")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="429 の Retry-After（秒） (Default: 1)")
+    parser.add_argument('--seed', type=int, help="乱数のシード（同じシードで同じ応答時間・エラーの並びになる）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    server = MockLLMServer(
+        args.host, args.port,
+        latency=args.latency,
+        latency_distribution=args.latency_distribution,
+        latency_spread=args.latency_spread,
+        token_latency=args.token_latency,
+        rate_limit_rate=args.rate_limit_rate,
+        server_error_rate=args.server_error_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    logger.info(f"モックLLMサーバーを起動しました: LITELLM_API_BASE={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"停止しました: {json.dumps(server.stats(), ensure_ascii=False)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Pre-screen for Keywords Checker
+Decides clearly safe rows locally so only ambiguous rows are sent to the LLM
+"""
+
+import re
+
+from keyword_matcher import normalize, normalize_text
+
+# 事前判定でOKとした理由の種別
+REASON_NO_KEYWORDS = 'no_keywords'
+REASON_EXEMPT_TERM = 'exempt_term'
+REASON_CATEGORY = 'category'
+
+# OKの場合/NGの場合 の記載を薬事区分ごとに分割する区切り文字
+_CLASS_SEPARATOR = re.compile(r'[・、,\n]')
+_PARENTHESIS = re.compile(r'（[^）]*）|\([^)]*\)')
+# 「## 似ているキーワード」の「病院は別のキーワードです。」や「- 病院」の行から語を取り出す
+_SIMILAR_KEYWORD = re.compile(r'^(?:[-・]\s*)?([^\s、。]+?)(?:は別のキーワード.*)?$')
+
+
+def parse_reference_metadata(content):
+    """
+    Parse the metadata of a reference file generated from master.csv
+
+    Args:
+        content: Markdown content of references/<keyword>.md
+
+    Returns:
+        Dictionary with 分類, 読み, 判断, OKの場合, NGの場合 and 似ているキーワード
+        (OK/NG are sets of 薬事区分; conditional entries marked with ※ are left out of OK;
+        似ているキーワード lists the terms the keyword must not be detected in)
+    """
+    classification = ''
+    reading = ''
+    sections = {}
+    current = None
+
+    for line in content.split('\n'):
+        if line.startswith('## '):
+            current = line[3:].strip()
+            sections[current] = []
+        elif current:
+            sections[current].append(line)
+        elif line.startswith('- 分類:'):
+            classification = line[len('- 分類:'):].strip()
+        elif line.startswith('- 読み:'):
+            reading = line[len('- 読み:'):].strip()
+
+    def section(name):
+        return '\n'.join(sections.get(name, [])).strip()
+
+    ok_classes = set()
+    for entry in _CLASS_SEPARATOR.split(section('OKの場合')):
+        entry = entry.strip()
+        # 「※条件付」「（パッケージ表現の範囲内）」などの条件付きOKは事前判定に使わない
+        if entry and '※' not in entry and not _PARENTHESIS.search(entry):
+            ok_classes.add(entry)
+
+    ng_classes = set()
+    for entry in _CLASS_SEPARATOR.split(section('NGの場合')):
+        entry = _PARENTHESIS.sub('', entry).replace('※', '').strip()
+        if entry:
+            ng_classes.add(entry)
+
+    similar = []
+    for line in sections.get('似ているキーワード', []):
+        match = _SIMILAR_KEYWORD.match(line.strip())
+        if match:
+            similar.append(match.group(1))
+
+    return {
+        '分類': classification,
+        '読み': reading,
+        '判断': section('判断'),
+        'OKの場合': ok_classes,
+        'NGの場合': ng_classes,
+        '似ているキーワード': similar
+    }
+
+
+class PreScreener:
+    """Rule-based screen marking rows that cannot violate as OK without the LLM"""
+
+    def __init__(self, rules, keyword_metadata):
+        """
+        Initialize the PreScreener
+
+        Args:
+            rules: Dictionary loaded from the skill's prescreen.yaml (empty = disabled)
+            keyword_metadata: Dictionary mapping keywords to parse_reference_metadata output
+        """
+        self.enabled = bool(rules)
+        self.keyword_metadata = keyword_metadata
+
+        patterns = rules.get('risk_patterns') or []
+        self.risk_pattern = re.compile(
+            '|'.join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE
+        ) if patterns else None
+
+        self.exempt_terms = {
+            keyword: [normalize_text(term) for term in terms if term]
+            for keyword, terms in (rules.get('exempt_terms') or {}).items()
+        }
+
+        self.category_column = rules.get('category_column')
+        self.category_map = rules.get('category_map') or {}
+        self.category_judgements = set(rules.get('category_judgements') or [])
+
+    def screen(self, text, keyword_matches, row):
+        """
+        Decide whether a row is clearly safe
+
+        Args:
+            text: Product message that is checked
+            keyword_matches: Dictionary mapping detected keywords to (start, end) offsets
+            row: Row data (used for the 薬事区分 column)
+
+        Returns:
+            Tuple (reason_code, reason) when the row is safe, or None if the LLM has to check it
+        """
+        if not self.enabled:
+            return None
+
+        # キーワードがなくても違反になりうる表現（最上級・効能効果・二重価格など）
+        if self.risk_pattern and self.risk_pattern.search(text):
+            return None
+
+        if not keyword_matches:
+            return REASON_NO_KEYWORDS, "チェック用キーワード・注意表現に該当なし"
+
+        normalized = normalize(text)
+        product_class = self._product_class(row)
+
+        exempt = []
+        by_class = []
+        for keyword, spans in keyword_matches.items():
+            if self._all_exempt(keyword, spans, normalized):
+                exempt.append(keyword)
+            elif self._allowed_for_class(keyword, product_class):
+                by_class.append(keyword)
+            else:
+                return None
+
+        if by_class:
+            keywords = '、'.join(f"「{keyword}」" for keyword in by_class)
+            reason = f"{keywords}は{product_class}では使用可（判断: 薬事区分を確認）"
+            if exempt:
+                reason += "、" + '、'.join(f"「{keyword}」" for keyword in exempt) + "は別の語の一部"
+            return REASON_CATEGORY, reason
+
+        keywords = '、'.join(f"「{keyword}」" for keyword in exempt)
+        return REASON_EXEMPT_TERM, f"{keywords}は別の語の一部として使われており対象外"
+
+    def _all_exempt(self, keyword, spans, normalized):
+        """Whether every occurrence of a keyword is part of one of its exempt terms"""
+        terms = self.exempt_terms.get(keyword)
+        if not terms:
+            return False
+
+        # 正規化後のテキストで探し、元のテキストの位置に戻して比較する
+        text, starts, ends = normalized
+        covered = []
+        for term in terms:
+            start = text.find(term)
+            while start != -1:
+                covered.append((starts[start], ends[start + len(term) - 1]))
+                start = text.find(term, start + 1)
+
+        return all(
+            any(term_start <= start and end <= term_end for term_start, term_end in covered)
+            for start, end in spans
+        )
+
+    def _product_class(self, row):
+        """Return the 薬事区分 of a row, or None if unknown"""
+        if not self.category_column or row is None:
+            return None
+
+        try:
+            value = row[self.category_column]
+        except (KeyError, IndexError):
+            return None
+
+        if not isinstance(value, str) or not value.strip():
+            return None
+
+        value = value.strip()
+        return self.category_map.get(value, value)
+
+    def _allowed_for_class(self, keyword, product_class):
+        """Whether the master allows a keyword unconditionally for the product's 薬事区分"""
+        if not product_class:
+            return False
+
+        metadata = self.keyword_metadata.get(keyword)
+        if not metadata or metadata['判断'] not in self.category_judgements:
+            return False
+
+        return product_class in metadata['OKの場合'] and product_class not in metadata['NGの場合']
@@ -0,0 +1,293 @@
+"""
+Rate limiting for Keywords Checker
+Client-side scheduler for LLM requests: token buckets for requests and tokens per
+minute, AIMD concurrency adjustment on 429/5xx/timeouts and jittered backoff
+"""
+
+import time
+import random
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 再試行する失敗の種類（ゲートウェイの過負荷・一時的な障害）
+REASON_RATE_LIMIT = 'rate_limit'
+REASON_SERVER_ERROR = 'server_error'
+REASON_TIMEOUT = 'timeout'
+REASON_CONNECTION = 'connection'
+
+
+def retry_reason(error):
+    """
+    Classify an LLM call failure
+
+    Args:
+        error: Exception raised by the LLM client
+
+    Returns:
+        One of the REASON_* codes if the call should be retried, otherwise None
+    """
+    status = getattr(error, 'status_code', None)
+    if status == 429:
+        return REASON_RATE_LIMIT
+    if isinstance(status, int) and status >= 500:
+        return REASON_SERVER_ERROR
+
+    name = type(error).__name__
+    if isinstance(error, TimeoutError) or 'Timeout' in name:
+        return REASON_TIMEOUT
+    if isinstance(error, ConnectionError) or 'APIConnectionError' in name:
+        return REASON_CONNECTION
+    return None
+
+
+def retry_after_seconds(error):
+    """Return the Retry-After of a 429 response in seconds, or None"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        value = headers.get('retry-after')
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate"""
+
+    def __init__(self, per_minute):
+        """
+        Args:
+            per_minute: Tokens added per minute (also the bucket capacity)
+        """
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1):
+        """
+        Wait until the bucket holds tokens and take them
+
+        1回の要求が容量を超える場合も、バケットが満杯になれば通す（残高はマイナスになる）
+        """
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def consume(self, amount):
+        """Take tokens without waiting (the balance may go negative)"""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+
+
+class AdaptiveConcurrency:
+    """Concurrency limit adjusted by AIMD (additive increase, multiplicative decrease)"""
+
+    def __init__(self, max_limit, min_limit=1, decrease_factor=0.5, cooldown=5.0):
+        """
+        Args:
+            max_limit: Upper bound of concurrent requests
+            min_limit: Lower bound of concurrent requests
+            decrease_factor: Factor applied to the limit on overload
+            cooldown: Seconds during which further overload signals do not decrease again
+        """
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Wait for a free slot"""
+        with self._condition:
+            while self.in_flight >= max(self.min_limit, int(self.limit)):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        """Additive increase: about +1 after a full window of successful requests"""
+        with self._condition:
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+            self._condition.notify_all()
+
+    def on_overload(self):
+        """Multiplicative decrease (at most once per cooldown, as in-flight requests fail together)"""
+        with self._condition:
+            now = time.monotonic()
+            if now - self._decreased_at < self.cooldown:
+                return
+            self._decreased_at = now
+            previous = self.limit
+            self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+            logger.warning(f"LLMゲートウェイの過負荷を検知: 同時実行数 {previous:.1f} → {self.limit:.1f}")
+
+
+class ScheduledStream:
+    """
+    Stream of an LLM call that keeps its concurrency slot until the stream is read or closed
+
+    各チャンクの使用量（最後のチャンクに含まれる）を記録し、終了時に on_close(used) を1回だけ呼び出す
+    """
+
+    def __init__(self, chunks, used_tokens, on_close):
+        """
+        Args:
+            chunks: Iterable of response chunks
+            used_tokens: Optional callable(chunk) -> tokens used by the call, or None for chunks without usage
+            on_close: Callable(used) called once when the stream ends (used is None if no usage was received)
+        """
+        self._chunks = chunks
+        self._used_tokens = used_tokens
+        self._on_close = on_close
+        self._used = None
+        self._closed = False
+
+    def __iter__(self):
+        try:
+            for chunk in self._chunks:
+                if self._used_tokens:
+                    used = self._used_tokens(chunk)
+                    if used is not None:
+                        self._used = used
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        close = getattr(self._chunks, 'close', None)
+        if close:
+            close()
+        self._on_close(self._used)
+
+    def __del__(self):
+        # 読まれずに破棄されたストリームの枠も解放する
+        self.close()
+
+
+class LLMScheduler:
+    """Runs LLM calls within rate limits and retries transient failures with backoff"""
+
+    def __init__(self, max_concurrency, requests_per_minute=0, tokens_per_minute=0,
+                 max_attempts=4, backoff_base=1.0, backoff_max=60.0, on_retry=None):
+        """
+        Args:
+            max_concurrency: Upper bound of concurrent LLM calls
+            requests_per_minute: Request rate limit (0 = unlimited)
+            tokens_per_minute: Token rate limit (0 = unlimited)
+            max_attempts: Attempts per call including the first one
+            backoff_base: Base delay of the exponential backoff in seconds
+            backoff_max: Maximum delay between attempts in seconds
+            on_retry: Optional callable(reason) called before each retry
+        """
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_retry = on_retry
+
+    def backoff(self, attempt, error):
+        """Delay before the next attempt: Retry-After if given, otherwise full jitter"""
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, request, prompt_tokens=0, used_tokens=None, stream=False):
+        """
+        Run an LLM call
+
+        Args:
+            request: Callable performing the call
+            prompt_tokens: Tokens reserved from the token bucket before the call
+            used_tokens: Optional callable(response) -> tokens actually used; the
+                difference to prompt_tokens (e.g. the completion) is charged afterwards.
+                For streams it is called with each chunk and returns None for chunks without usage
+            stream: request returns an iterable of chunks; the concurrency slot is held
+                and the usage charged until the stream has been read or closed
+
+        Returns:
+            The return value of request (wrapped in a ScheduledStream when stream is True)
+
+        Raises:
+            The last error if it is not retryable or all attempts failed
+        """
+        for attempt in range(self.max_attempts):
+            if self.requests:
+                self.requests.acquire()
+            if self.tokens and prompt_tokens:
+                self.tokens.acquire(prompt_tokens)
+
+            self.concurrency.acquire()
+            try:
+                response = request()
+            except Exception as e:
+                self.concurrency.release()
+                reason = retry_reason(e)
+                if reason in (REASON_RATE_LIMIT, REASON_SERVER_ERROR, REASON_TIMEOUT):
+                    self.concurrency.on_overload()
+                if reason is None or attempt + 1 >= self.max_attempts:
+                    raise
+                delay = self.backoff(attempt, e)
+                logger.warning(
+                    f"LLM呼び出しを再試行 ({attempt + 2}/{self.max_attempts}, {reason}): "
+                    f"{delay:.1f}秒後 - {type(e).__name__}"
+                )
+                if self.on_retry:
+                    self.on_retry(reason)
+            else:
+                self.concurrency.on_success()
+                if stream:
+                    # 本文を受信し終えるまで枠を使い続け、受信後に実際の使用量を差し引く
+                    return ScheduledStream(
+                        response, used_tokens,
+                        lambda used: self._finish(prompt_tokens, used)
+                    )
+                used = None
+                try:
+                    used = used_tokens(response) if used_tokens else None
+                finally:
+                    self._finish(prompt_tokens, used)
+                return response
+
+            time.sleep(delay)
+
+    def _finish(self, prompt_tokens, used):
+        """Release the slot of a finished call and charge the tokens used beyond the prompt"""
+        self.concurrency.release()
+        if self.tokens and used is not None:
+            self.tokens.consume(max(0, used - prompt_tokens))
+
+    def stats(self):
+        """Current concurrency state"""
+        return {
+            'concurrency_limit': round(self.concurrency.limit, 2),
+            'in_flight': self.concurrency.in_flight
+        }
@@ -0,0 +1,299 @@
+"""
+Result Cache for Keywords Checker
+Persists LLM check results on disk so unchanged products are not re-checked
+"""
+
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# ヒット時の最終アクセス時刻はメモリに溜め、この件数か秒数ごとにまとめて書き込む
+ACCESS_FLUSH_SIZE = 256
+ACCESS_FLUSH_SECONDS = 5.0
+# 上限を超えたら、上限のこの割合の件数をまとめて削除する
+# （他のプロセスの書き込みを反映するため、この件数を登録するごとにも件数を数え直す）
+EVICTION_BATCH_RATIO = 0.01
+
+
+def hash_text(text):
+    """Return the SHA-256 hex digest of a string"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed cache of LLM check results with TTL and size eviction"""
+
+    def __init__(self, db_path, ttl_seconds=30 * 24 * 3600, max_entries=100000):
+        """
+        Initialize the ResultCache
+
+        Args:
+            db_path: Path to the SQLite database file
+            ttl_seconds: Entries older than this are treated as expired (0 = no TTL)
+            max_entries: Maximum number of entries kept (least recently used are evicted)
+        """
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                cache_key TEXT PRIMARY KEY,
+                skill_name TEXT NOT NULL,
+                result_text TEXT NOT NULL,
+                conclusion TEXT NOT NULL,
+                usage TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_results_accessed_at ON results (accessed_at)"
+        )
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS skill_fingerprints (
+                skill_name TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+        # 件数はメモリで数え、上限を超えたときと一定件数を登録するごとにだけ数え直す
+        self._entries = self._count()
+        self._puts_since_count = 0
+        self._pending_access = {}
+        self._last_flush = time.monotonic()
+
+    def reopen(self):
+        """
+        Open a new database connection
+
+        fork した子プロセスでは親プロセスの接続を使えないため、子プロセスの開始時に呼び出す
+        """
+        with self._lock:
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._entries = self._count()
+            self._puts_since_count = 0
+            self._pending_access = {}
+
+    def _count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _flush_access(self):
+        """Write the buffered last-access times (caller holds the lock and commits)"""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE results SET accessed_at = ? WHERE cache_key = ?",
+                [(accessed_at, cache_key) for cache_key, accessed_at in self._pending_access.items()]
+            )
+            self._pending_access = {}
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Write the buffered last-access times to the database"""
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(system_prompt, user_message, model):
+        """
+        Build the cache key for a check
+
+        Args:
+            system_prompt: System prompt sent to the LLM
+            user_message: Product message sent to the LLM
+            model: LLM model name
+
+        Returns:
+            Hex digest identifying the (prompt, product, model) combination
+        """
+        return hash_text("\0".join([hash_text(system_prompt), user_message, model]))
+
+    def get(self, cache_key):
+        """
+        Look up a cached result
+
+        Args:
+            cache_key: Key built by make_key
+
+        Returns:
+            Dictionary with result_text, conclusion and usage, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result_text, conclusion, usage, created_at FROM results WHERE cache_key = ?",
+                (cache_key,)
+            ).fetchone()
+
+            if row and self.ttl_seconds and now - row[3] > self.ttl_seconds:
+                # 期限切れのエントリは削除してミス扱い
+                self._conn.execute("DELETE FROM results WHERE cache_key = ?", (cache_key,))
+                self._conn.commit()
+                self._pending_access.pop(cache_key, None)
+                self._entries -= 1
+                self.evictions += 1
+                row = None
+
+            if not row:
+                self.misses += 1
+                return None
+
+            # ヒットのたびに書き込まず、最終アクセス時刻はまとめて書き込む
+            self._pending_access[cache_key] = now
+            if (len(self._pending_access) >= ACCESS_FLUSH_SIZE
+                    or time.monotonic() - self._last_flush >= ACCESS_FLUSH_SECONDS):
+                self._flush_access()
+                self._conn.commit()
+            self.hits += 1
+
+        return {
+            'result_text': row[0],
+            'conclusion': row[1],
+            'usage': json.loads(row[2])
+        }
+
+    def put(self, cache_key, skill_name, result_text, conclusion, usage):
+        """
+        Store a result and evict the least recently used entries if over capacity
+
+        Args:
+            cache_key: Key built by make_key
+            skill_name: Skill used for the check (for invalidation)
+            result_text: LLM result text
+            conclusion: Output of extract_conclusion
+            usage: Token usage dictionary
+        """
+        now = time.time()
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM results WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO results
+                    (cache_key, skill_name, result_text, conclusion, usage, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (cache_key, skill_name, result_text, conclusion, json.dumps(usage), now, now)
+            )
+
+            if not exists:
+                self._entries += 1
+            self._puts_since_count += 1
+            if self.max_entries and (
+                self._entries > self.max_entries
+                or self._puts_since_count >= self._eviction_batch()
+            ):
+                self._evict()
+
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        Evict the least recently used entries down to a batch below max_entries
+        (caller holds the lock and commits)
+        """
+        self._flush_access()
+        self._entries = self._count()
+        self._puts_since_count = 0
+        overflow = self._entries - self.max_entries
+        if overflow <= 0:
+            return
+
+        # 1件ずつ削除すると上限に達した後は毎回数え直すことになるため、まとめて空きを作る
+        overflow += self._eviction_batch()
+        cursor = self._conn.execute(
+            """
+            DELETE FROM results WHERE cache_key IN (
+                SELECT cache_key FROM results ORDER BY accessed_at LIMIT ?
+            )
+            """,
+            (overflow,)
+        )
+        self._entries -= cursor.rowcount
+        self.evictions += cursor.rowcount
+
+    def _eviction_batch(self):
+        return max(1, int(self.max_entries * EVICTION_BATCH_RATIO))
+
+    def purge_expired(self):
+        """Delete all entries older than the TTL"""
+        if not self.ttl_seconds:
+            return 0
+
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+            self._entries -= cursor.rowcount
+            self.evictions += cursor.rowcount
+
+        return cursor.rowcount
+
+    def sync_skill_fingerprint(self, skill_name, fingerprint):
+        """
+        Drop a skill's cached results when its SKILL.md, references or rules files have changed
+
+        Args:
+            skill_name: Name of the skill
+            fingerprint: Current content hash of the skill
+
+        Returns:
+            Number of invalidated entries
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint FROM skill_fingerprints WHERE skill_name = ?", (skill_name,)
+            ).fetchone()
+
+            removed = 0
+            if row and row[0] != fingerprint:
+                cursor = self._conn.execute(
+                    "DELETE FROM results WHERE skill_name = ?", (skill_name,)
+                )
+                removed = cursor.rowcount
+                self._entries -= removed
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO skill_fingerprints (skill_name, fingerprint) VALUES (?, ?)",
+                (skill_name, fingerprint)
+            )
+            self._conn.commit()
+
+        if removed:
+            logger.info(f"スキル「{skill_name}」の変更を検知: キャッシュ {removed} 件を無効化")
+
+        return removed
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            entries = self._entries
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds
+        }
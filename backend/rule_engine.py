@@ -0,0 +1,178 @@
+"""
+Rule Engine for Keywords Checker
+Gives an instant preliminary verdict per detected keyword from the reference metadata
+(判断 / OKの場合 / NGの場合) and the row's category, without calling the LLM
+"""
+
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# キーワードごと・行ごとの判定
+VERDICT_OK = 'OK'
+VERDICT_NG = 'NG'
+# 薬事区分が不明、または条件付きで判定できないため人（またはLLM）の確認が必要
+VERDICT_REVIEW = 'REVIEW'
+
+
+def _rule(rules, key, expected_type):
+    """
+    Return a value of fast_rules.yaml if it has the expected type
+
+    型が違う値（YAMLの書き間違いなど）は警告を出して空として扱う
+    """
+    value = rules.get(key)
+    if value is None:
+        return expected_type()
+    if not isinstance(value, expected_type):
+        logger.warning(f"fast_rules の {key} は {expected_type.__name__} で指定してください（無視します）: {value!r}")
+        return expected_type()
+    return value
+
+
+def _strings(rules, key):
+    """Return a list value of fast_rules.yaml without its non-string items"""
+    values = _rule(rules, key, list)
+    strings = [value.strip() for value in values if isinstance(value, str) and value.strip()]
+    if len(strings) != len(values):
+        logger.warning(f"fast_rules の {key} の文字列でない要素を無視します: {values!r}")
+    return strings
+
+
+class RuleEngine:
+    """Offline verdicts from the reference metadata and the row's 薬事区分"""
+
+    def __init__(self, rules, keyword_metadata, risk_patterns=None):
+        """
+        Initialize the RuleEngine
+
+        Args:
+            rules: Dictionary loaded from the skill's fast_rules.yaml
+            keyword_metadata: Dictionary mapping keywords to parse_reference_metadata output
+            risk_patterns: Regular expressions of expressions that need a review even
+                without keywords (the risk_patterns of prescreen.yaml)
+        """
+        self.keyword_metadata = keyword_metadata
+
+        if not isinstance(rules, dict):
+            logger.warning(f"fast_rules はマッピングで指定してください（無視します）: {rules!r}")
+            rules = {}
+
+        self.category_columns = _strings(rules, 'category_columns')
+        self.category_map = {}
+        for category, product_class in _rule(rules, 'category_map', dict).items():
+            if not isinstance(product_class, str) or not product_class.strip():
+                logger.warning(f"fast_rules の category_map の {category!r} を無視します: {product_class!r}")
+                continue
+            self.category_map[str(category).strip()] = product_class.strip()
+        self.product_classes = set(_strings(rules, 'product_classes'))
+        self.ng_judgements = set(_strings(rules, 'ng_judgements'))
+        self.ok_judgements = set(_strings(rules, 'ok_judgements'))
+
+        self.risk_pattern = re.compile(
+            '|'.join(f"(?:{pattern})" for pattern in risk_patterns), re.IGNORECASE
+        ) if risk_patterns else None
+
+    def product_class(self, row):
+        """
+        Return the 薬事区分 of a row from its category columns
+
+        The columns are tried in order (e.g. 管理カテゴリー中 before 管理カテゴリー大); a value
+        is used when category_map maps it or when it already is a 薬事区分
+
+        Args:
+            row: Row data (dict or pandas Series); anything else (None, or a string
+                or list sent as the categories of /api/check) has no category
+
+        Returns:
+            Tuple (薬事区分, column), or (None, None) if unknown
+        """
+        get = getattr(row, 'get', None)
+        if not callable(get):
+            return None, None
+
+        for column in self.category_columns:
+            try:
+                value = get(column)
+            except (TypeError, ValueError):
+                continue
+            if not isinstance(value, str) or not value.strip():
+                continue
+
+            value = value.strip()
+            if value in self.category_map:
+                return self.category_map[value], column
+            if value in self.product_classes:
+                return value, column
+
+        return None, None
+
+    def judge_keyword(self, keyword, product_class):
+        """
+        Judge one detected keyword
+
+        Args:
+            keyword: Detected keyword (reference name)
+            product_class: 薬事区分 of the product, or None
+
+        Returns:
+            Tuple (verdict, reason)
+        """
+        metadata = self.keyword_metadata.get(keyword)
+        if not metadata:
+            return VERDICT_REVIEW, "referenceに判定情報がありません"
+
+        judgement = metadata['判断']
+        if judgement in self.ng_judgements:
+            return VERDICT_NG, f"判断: {judgement}"
+
+        if not product_class:
+            return VERDICT_REVIEW, f"薬事区分が不明（判断: {judgement or 'なし'}）"
+
+        if product_class in metadata['NGの場合']:
+            return VERDICT_NG, f"{product_class}はNGの場合に該当"
+
+        if product_class in metadata['OKの場合'] and judgement in self.ok_judgements:
+            return VERDICT_OK, f"{product_class}はOKの場合に該当"
+
+        return VERDICT_REVIEW, f"{product_class}では条件により異なる（判断: {judgement or 'なし'}）"
+
+    def evaluate(self, text, keywords, row):
+        """
+        Judge a product from its detected keywords
+
+        The product is NG if any keyword is NG, REVIEW if any keyword (or an
+        expression matching risk_patterns) needs a review, and OK otherwise
+
+        Args:
+            text: Product message that is checked
+            keywords: Detected keywords
+            row: Row data (used for the category columns)
+
+        Returns:
+            Dictionary with conclusion, product_class, category_column,
+            verdicts (list of {keyword, verdict, reason}) and risk_expression
+        """
+        product_class, category_column = self.product_class(row)
+        verdicts = []
+        for keyword in sorted(keywords):
+            verdict, reason = self.judge_keyword(keyword, product_class)
+            verdicts.append({'keyword': keyword, 'verdict': verdict, 'reason': reason})
+
+        match = self.risk_pattern.search(text) if self.risk_pattern else None
+
+        if any(item['verdict'] == VERDICT_NG for item in verdicts):
+            conclusion = VERDICT_NG
+        elif match or any(item['verdict'] == VERDICT_REVIEW for item in verdicts):
+            conclusion = VERDICT_REVIEW
+        else:
+            conclusion = VERDICT_OK
+
+        return {
+            'conclusion': conclusion,
+            'product_class': product_class,
+            'category_column': category_column,
+            'verdicts': verdicts,
+            'risk_expression': match.group(0) if match else None
+        }
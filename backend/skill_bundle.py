@@ -0,0 +1,237 @@
+"""
+Compiled skill bundles for Keywords Checker
+Packs a skill (SKILL.md, references, keyword automaton and pre-screen data) into a single
+versioned file that workers memory-map read-only and decode lazily
+
+Only the body (SKILL.md and the references) is decoded lazily. The header, including the
+automaton tables, is JSON that is parsed in full when the bundle is opened, since the
+matcher searches Python dicts and needs the tables as objects anyway. For the bundled
+skill this is a ~95 KB header parsed in about 3 ms, roughly an eighth of loading the skill
+from its bundle (see skill_bundle_open / skill_load_bundle in benchmark.py).
+
+Usage:
+    python skill_bundle.py [skills_dir]
+"""
+
+import sys
+import json
+import mmap
+import struct
+import logging
+from pathlib import Path
+from collections.abc import Mapping
+
+from keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FILENAME = "skill.bundle"
+
+# ファイル形式: MAGIC | FORMAT_VERSION (uint32) | ヘッダー長 (uint32) | ヘッダー (JSON) | 本文 (UTF-8)
+MAGIC = b"KWCSKILL"
+# 2: keyword_metadata に「読み」を追加 / 3: keyword_rules を追加 / 4: fast_rules を追加
+# 5: キーワード一覧の代わりに構築済みのオートマトン（読み・除外語を含む）を格納
+FORMAT_VERSION = 5
+_PREAMBLE = struct.Struct("<8sII")
+
+
+class LazyMapping(Mapping):
+    """Read-only mapping whose values are produced on first access and then kept"""
+
+    def __init__(self, keys, loader):
+        """
+        Args:
+            keys: Keys of the mapping
+            loader: Callable(key) -> value
+        """
+        self._keys = list(keys)
+        self._key_set = set(self._keys)
+        self._loader = loader
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key not in self._key_set:
+            raise KeyError(key)
+        value = self._values.get(key)
+        if value is None:
+            value = self._values[key] = self._loader(key)
+        return value
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._key_set
+
+
+def source_files(skill_dir):
+    """Return the source files a skill is compiled from"""
+    skill_dir = Path(skill_dir)
+    files = [
+        skill_dir / "SKILL.md", skill_dir / "prescreen.yaml", skill_dir / "keyword_rules.yaml",
+        skill_dir / "fast_rules.yaml", skill_dir / "references"
+    ]
+    files.extend((skill_dir / "references").glob("*.md"))
+    return [path for path in files if path.exists()]
+
+
+def is_bundle_current(bundle_path, skill_dir):
+    """
+    Whether a bundle is newer than every source file of its skill
+
+    references ディレクトリ自体の更新時刻も見るため、ファイルの削除も検知できる
+    """
+    bundle_path = Path(bundle_path)
+    if not bundle_path.exists():
+        return False
+
+    bundle_mtime = bundle_path.stat().st_mtime
+    return all(path.stat().st_mtime <= bundle_mtime for path in source_files(skill_dir))
+
+
+def write_bundle(skill, bundle_path):
+    """
+    Compile a loaded skill into a bundle file
+
+    Args:
+        skill: Skill data loaded from the sources by SkillManager
+        bundle_path: Output path of the bundle
+    """
+    body = bytearray()
+
+    def append(text):
+        data = text.encode('utf-8')
+        offset = len(body)
+        body.extend(data)
+        return [offset, len(data)]
+
+    content = append(skill['content'])
+    references = {
+        ref_name: append(ref_content)
+        for ref_name, ref_content in skill['references'].items()
+    }
+
+    header = {
+        'format_version': FORMAT_VERSION,
+        'name': skill['name'],
+        'description': skill['description'],
+        'fingerprint': skill['fingerprint'],
+        'content': content,
+        'references': references,
+        # 構築済みのキーワード検出オートマトン（読み・除外語・最長一致の設定を含む）
+        'keyword_matcher': skill['keyword_matcher'].to_tables(),
+        'keyword_metadata': {
+            keyword: {
+                key: sorted(value) if isinstance(value, set) else value
+                for key, value in metadata.items()
+            }
+            for keyword, metadata in skill['keyword_metadata'].items()
+        },
+        # JSONでリストになる集合の項目（OKの場合・NGの場合。似ているキーワードはリストのまま）
+        'keyword_metadata_sets': sorted({
+            key
+            for metadata in skill['keyword_metadata'].values()
+            for key, value in metadata.items() if isinstance(value, set)
+        }),
+        'prescreen_rules': skill['prescreen_rules'],
+        'keyword_rules': skill['keyword_rules'],
+        'fast_rules': skill['fast_rules']
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+
+    # 書き込み途中のファイルを読まれないよう、一時ファイルに書いてから置き換える
+    bundle_path = Path(bundle_path)
+    tmp_path = bundle_path.with_suffix(bundle_path.suffix + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(body)
+    tmp_path.replace(bundle_path)
+
+
+class SkillBundle:
+    """Memory-mapped, read-only view of a compiled skill"""
+
+    def __init__(self, bundle_path):
+        """
+        Open a bundle
+
+        Args:
+            bundle_path: Path to the bundle file
+
+        Raises:
+            ValueError: If the file is not a bundle of a supported format version
+        """
+        self.path = Path(bundle_path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < _PREAMBLE.size:
+            raise ValueError(f"Not a skill bundle: {self.path}")
+
+        magic, version, header_length = _PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a skill bundle: {self.path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported skill bundle version {version}: {self.path}")
+
+        header_start = _PREAMBLE.size
+        self._body_start = header_start + header_length
+        self.header = json.loads(self._mmap[header_start:self._body_start].decode('utf-8'))
+
+    def read_text(self, span):
+        """Decode the text at an [offset, length] span of the body"""
+        offset, length = span
+        start = self._body_start + offset
+        return self._mmap[start:start + length].decode('utf-8')
+
+    @property
+    def content(self):
+        """SKILL.md body without the frontmatter"""
+        return self.read_text(self.header['content'])
+
+    def references(self):
+        """Reference contents keyed by keyword, decoded on first access"""
+        spans = self.header['references']
+        return LazyMapping(spans.keys(), lambda ref_name: self.read_text(spans[ref_name]))
+
+    def keyword_matcher(self):
+        """Keyword automaton restored from its tables (no rebuilding at load time)"""
+        return KeywordMatcher.from_tables(self.header['keyword_matcher'])
+
+    def keyword_metadata(self):
+        """Reference metadata as returned by parse_reference_metadata"""
+        set_keys = set(self.header['keyword_metadata_sets'])
+        return {
+            keyword: {
+                key: set(value) if key in set_keys else value
+                for key, value in metadata.items()
+            }
+            for keyword, metadata in self.header['keyword_metadata'].items()
+        }
+
+
+def main():
+    """Compile every skill under the skills directory"""
+    from skill_manager import SkillManager
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    skills_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / "skills"
+    skill_manager = SkillManager(skills_dir, use_bundles=False)
+    skill_manager.load_all_skills()
+
+    for skill in skill_manager.skills.values():
+        bundle_path = skill['path'] / BUNDLE_FILENAME
+        write_bundle(skill, bundle_path)
+        logger.info(
+            f"スキル「{skill['name']}」をコンパイルしました: {bundle_path} "
+            f"(references {len(skill['references'])}件, {bundle_path.stat().st_size:,} bytes)"
+        )
+
+
+if __name__ == '__main__':
+    main()
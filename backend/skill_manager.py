@@ -4,49 +4,315 @@ Loads skill definitions and reference files from the skills directory
 """
 
 import os
-import re
+import time
+import hashlib
 import logging
+import functools
+import threading
 import yaml
+from collections import Counter
 from pathlib import Path
+from batching import estimate_tokens
+from keyword_matcher import KeywordMatcher, normalize_text
+from prescreen import PreScreener, parse_reference_metadata
+from rule_engine import RuleEngine
+from skill_bundle import BUNDLE_FILENAME, LazyMapping, SkillBundle, is_bundle_current, source_files
 
 logger = logging.getLogger(__name__)
 
+# トークン予算を超えた場合に references から省略するセクション（優先度の低い順）
+TRIMMABLE_SECTIONS = ['ガイドライン等の出典', '表示例', '備考']
+# 文字数（estimate_tokens）はトークン数の上限にはならない（記号・絵文字・一部の漢字は1文字が
+# 複数トークンになる）ため、トークナイザーを使わずに判断するのは予算から十分離れている場合だけにする
+# 文字数が予算のこの倍数以下なら数えずに収まるとみなす（1文字はおおよそ4トークン以下）
+TOKEN_ESTIMATE_MIN_RATIO = 0.25
+# 文字数が予算のこの倍数を超える場合は数えずに収まらないとみなす（1トークンはおおよそ4文字以下）
+TOKEN_ESTIMATE_MAX_RATIO = 4
+
+# 読み（master.csv の「読み」列）で検出する最小の長さ
+# 「か」（蚊）「いし」（医師）のような短い読みは別の語に含まれやすいため使わない
+READING_MIN_LENGTH = 4
+
+# スキルのバージョン（fingerprint）に内容を含めるルールファイル
+RULES_FILES = ('prescreen.yaml', 'keyword_rules.yaml', 'fast_rules.yaml')
+
+
+def reading_aliases(keyword_metadata):
+    """
+    Build the alternative spellings of each keyword from its 読み
+    
+    同じ読みの別のキーワードがある読み（例: 血圧と高血圧の「こうけつあつ」）や、別のキーワードと
+    同じ表記になる読みは、どちらのキーワードか決められないため使わない
+    
+    Args:
+        keyword_metadata: Dictionary mapping keywords to parse_reference_metadata output
+        
+    Returns:
+        Dictionary mapping keywords to a list of readings to match as well
+    """
+    readings = {
+        keyword: normalize_text(metadata.get('読み', ''))
+        for keyword, metadata in keyword_metadata.items()
+    }
+    spellings = Counter(readings.values())
+    spellings.update(normalize_text(keyword) for keyword in keyword_metadata)
+    
+    aliases = {}
+    for keyword, reading in readings.items():
+        if (len(reading) >= READING_MIN_LENGTH and reading != normalize_text(keyword)
+                and spellings[reading] == 1):
+            aliases[keyword] = [reading]
+    return aliases
+
+
+def keyword_exclusions(keyword_rules, keyword_metadata):
+    """
+    Merge the exclusion terms of keyword_rules.yaml and of the references
+    
+    Args:
+        keyword_rules: Dictionary loaded from keyword_rules.yaml
+        keyword_metadata: Dictionary mapping keywords to parse_reference_metadata output
+        
+    Returns:
+        Dictionary mapping keywords to the terms they must not be detected in
+    """
+    exclusions = {}
+    for keyword, metadata in keyword_metadata.items():
+        if metadata.get('似ているキーワード'):
+            exclusions[keyword] = list(metadata['似ているキーワード'])
+    for keyword, terms in (keyword_rules.get('exclusions') or {}).items():
+        exclusions.setdefault(keyword, []).extend(terms or [])
+    return exclusions
+
+
+def trim_reference(content, sections):
+    """
+    Remove '## ' sections from a reference
+    
+    Args:
+        content: Markdown content of a reference
+        sections: Headings of the sections to remove
+        
+    Returns:
+        Reference content without those sections
+    """
+    lines = []
+    skipping = False
+    for line in content.split('\n'):
+        if line.startswith('## '):
+            skipping = line[3:].strip() in sections
+        if not skipping:
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def skill_signature(skill_dir):
+    """
+    Cheap change marker of a skill directory (paths, mtimes and sizes of its files)
+    
+    Args:
+        skill_dir: Path to the skill directory
+        
+    Returns:
+        Tuple that changes whenever a source file or the bundle is added, removed or modified
+    """
+    paths = source_files(skill_dir)
+    bundle_file = Path(skill_dir) / BUNDLE_FILENAME
+    if bundle_file.exists():
+        paths.append(bundle_file)
+    
+    signature = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(signature))
+
+
+class SkillVersion:
+    """
+    Loaded skill data used as a memoization key
+
+    Keys compare by skill name and fingerprint, so the data assembled into a memoized
+    value is always the version its key names
+    """
+
+    __slots__ = ('skill', '_key')
+
+    def __init__(self, skill):
+        self.skill = skill
+        self._key = (skill['name'], skill['fingerprint'])
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __eq__(self, other):
+        return isinstance(other, SkillVersion) and self._key == other._key
+
 
 class SkillManager:
     """Manages loading and retrieval of skill definitions"""
     
-    def __init__(self, skills_dir):
+    def __init__(self, skills_dir, prompt_cache_size=1024, prompt_suffix='', use_bundles=True,
+                 token_counter=None, prompt_token_budget=0):
         """
         Initialize the SkillManager
         
         Args:
             skills_dir: Path to the skills directory
+            prompt_cache_size: Maximum number of dynamic prompts memoized per keyword set
+            prompt_suffix: Text appended to every system prompt (e.g. output format instructions)
+            use_bundles: Load skills from compiled bundles (skill.bundle) when they are up to date
+            token_counter: Callable(text) -> number of tokens (used with prompt_token_budget)
+            prompt_token_budget: Maximum tokens of a dynamic system prompt; low-priority
+                reference sections are left out above it (0 = no limit)
         """
         self.skills_dir = Path(skills_dir)
         self.skills = {}
+        self.prompt_suffix = prompt_suffix
+        self.use_bundles = use_bundles
+        self.token_counter = token_counter
+        self.prompt_token_budget = prompt_token_budget if token_counter else 0
+        
+        # 再読み込みは1スレッドずつ（self.skills は丸ごと差し替えるため、読み取り側はロック不要）
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        
+        # 検出キーワードの組み合わせごとに組み立て済みのsystem_promptを保持するLRU
+        self._dynamic_prompt_cache = functools.lru_cache(maxsize=prompt_cache_size)(
+            self._assemble_dynamic_system_prompt
+        )
         
     def load_all_skills(self):
         """Load all skills from the skills directory"""
         if not self.skills_dir.exists():
             raise FileNotFoundError(f"Skills directory not found: {self.skills_dir}")
-            
+        
+        skills = {}
+        
         # Look for skill directories
         for skill_dir in self.skills_dir.iterdir():
             if skill_dir.is_dir():
-                skill_file = skill_dir / "SKILL.md"
-                if skill_file.exists():
-                    skill_data = self.load_skill_file(skill_file)
-                    if skill_data:
-                        self.skills[skill_data['name']] = skill_data
+                skill_data = self.load_skill_dir(skill_dir)
+                if skill_data:
+                    skills[skill_data['name']] = skill_data
+        
+        with self._reload_lock:
+            self.skills = skills
+            # スキルを読み直した場合、組み立て済みのプロンプトは破棄する
+            self._dynamic_prompt_cache.cache_clear()
                         
         return self.skills
     
-    def load_skill_file(self, skill_file_path):
+    def reload_changed(self):
+        """
+        Reload only the skills whose files changed since they were loaded
+        
+        The new skill data is built aside and swapped in as a whole, so concurrent
+        requests see either the old or the new version of a skill, never a mix
+        
+        Returns:
+            List of names of reloaded (or removed) skills
+        """
+        with self._reload_lock:
+            loaded = {skill['path']: skill for skill in self.skills.values()}
+            skills = dict(self.skills)
+            changed = []
+            
+            skill_dirs = [path for path in self.skills_dir.iterdir() if path.is_dir()]
+            for skill_dir in skill_dirs:
+                previous = loaded.get(skill_dir)
+                if previous and previous['signature'] == skill_signature(skill_dir):
+                    continue
+                
+                skill_data = self.load_skill_dir(skill_dir, previous)
+                if not skill_data:
+                    # 読み込みに失敗した場合は以前の内容のまま使い続ける
+                    continue
+                
+                if previous:
+                    skills.pop(previous['name'], None)
+                skills[skill_data['name']] = skill_data
+                changed.append(skill_data['name'])
+                logger.info(f"スキル「{skill_data['name']}」を再読み込みしました (fingerprint: {skill_data['fingerprint'][:12]})")
+            
+            for path, skill in loaded.items():
+                if path not in skill_dirs:
+                    skills.pop(skill['name'], None)
+                    changed.append(skill['name'])
+                    logger.info(f"スキル「{skill['name']}」が削除されました")
+            
+            if changed:
+                self.skills = skills
+                self._dynamic_prompt_cache.cache_clear()
+        
+        return changed
+    
+    def start_watching(self, interval, on_reload=None):
+        """
+        Poll the skills directory and reload changed skills in a background thread
+        
+        Args:
+            interval: Seconds between polls
+            on_reload: Callable(list of skill names) called after skills were reloaded
+        """
+        # fork した子プロセスには親のスレッドは引き継がれないため、動いているかで判定する
+        if self._watcher and self._watcher.is_alive():
+            return
+        
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    changed = self.reload_changed()
+                    if changed and on_reload:
+                        on_reload(changed)
+                except Exception as e:
+                    logger.error(f"スキルの再読み込みでエラー: {e}", exc_info=True)
+        
+        self._watcher = threading.Thread(target=watch, name="skill-watcher", daemon=True)
+        self._watcher.start()
+    
+    def load_skill_dir(self, skill_dir, previous=None):
+        """
+        Load a skill directory from its bundle, or from its source files
+        
+        Args:
+            skill_dir: Path to the skill directory
+            previous: Previously loaded data of the same skill (unchanged references are reused)
+            
+        Returns:
+            Dictionary containing skill data, or None if the directory holds no skill
+        """
+        skill_file = skill_dir / "SKILL.md"
+        bundle_file = skill_dir / BUNDLE_FILENAME
+        # 読み込み前に取得しておき、読み込み中の変更は次回のポーリングで検知する
+        signature = skill_signature(skill_dir)
+        skill_data = None
+        
+        # コンパイル済みのバンドルがソースより新しければそちらを使う
+        if self.use_bundles and is_bundle_current(bundle_file, skill_dir):
+            skill_data = self.load_skill_bundle(bundle_file)
+        elif self.use_bundles and bundle_file.exists():
+            logger.warning(f"{bundle_file} はソースより古いため使用しません（python skill_bundle.py で再コンパイルしてください）")
+        
+        if not skill_data and skill_file.exists():
+            skill_data = self.load_skill_file(skill_file, previous)
+        
+        if skill_data:
+            skill_data['signature'] = signature
+        
+        return skill_data
+    
+    def load_skill_file(self, skill_file_path, previous=None):
         """
         Load a single SKILL.md file
         
         Args:
             skill_file_path: Path to the SKILL.md file
+            previous: Previously loaded data of the same skill (unchanged references are reused)
             
         Returns:
             Dictionary containing skill data with name, description, content, and references
@@ -70,15 +336,42 @@ class SkillManager:
             
             # Load references
             skill_dir = skill_file_path.parent
-            references = self.load_references(skill_dir)
-            
-            skill_data = {
-                'name': frontmatter.get('name', skill_dir.name),
-                'description': frontmatter.get('description', ''),
-                'content': markdown_content,
-                'references': references,
-                'path': skill_dir
-            }
+            references, reference_mtimes = self.load_references(skill_dir, previous)
+            prescreen_rules = self.load_prescreen_rules(skill_dir)
+            keyword_rules = self.load_keyword_rules(skill_dir)
+            fast_rules = self.load_fast_rules(skill_dir)
+            
+            # SKILL.md・references・ルールファイルの内容から変更検知用のハッシュを計算
+            # （ルールファイルもキーワード検出・判定を変えるため、結果キャッシュの破棄やバンドルの判定に含める）
+            fingerprint = hashlib.sha256(content.encode('utf-8'))
+            for ref_name in sorted(references):
+                fingerprint.update(f"\0{ref_name}\0{references[ref_name]}".encode('utf-8'))
+            for rules_name in RULES_FILES:
+                rules_file = skill_dir / rules_name
+                if rules_file.exists():
+                    fingerprint.update(f"\0{rules_name}\0".encode('utf-8') + rules_file.read_bytes())
+            
+            skill_data = self.build_skill_data(
+                name=frontmatter.get('name', skill_dir.name),
+                description=frontmatter.get('description', ''),
+                content=markdown_content,
+                references=references,
+                keyword_metadata={
+                    ref_name: (
+                        previous['keyword_metadata'][ref_name]
+                        if previous and reference_mtimes[ref_name] == previous['reference_mtimes'].get(ref_name)
+                        else parse_reference_metadata(ref_content)
+                    )
+                    for ref_name, ref_content in references.items()
+                },
+                prescreen_rules=prescreen_rules,
+                keyword_rules=keyword_rules,
+                fast_rules=fast_rules,
+                fingerprint=fingerprint.hexdigest(),
+                path=skill_dir,
+                source='files'
+            )
+            skill_data['reference_mtimes'] = reference_mtimes
             
             return skill_data
             
@@ -86,33 +379,188 @@ class SkillManager:
             logger.error(f"Error loading skill file {skill_file_path}: {e}", exc_info=True)
             return None
     
-    def load_references(self, skill_dir):
+    def load_skill_bundle(self, bundle_path):
+        """
+        Load a skill from a compiled bundle
+        
+        The bundle stays memory-mapped; reference bodies are decoded on first use
+        
+        Args:
+            bundle_path: Path to the skill.bundle file
+            
+        Returns:
+            Dictionary containing skill data (same keys as load_skill_file), or None on error
+        """
+        try:
+            bundle = SkillBundle(bundle_path)
+            header = bundle.header
+            
+            return self.build_skill_data(
+                name=header['name'],
+                description=header['description'],
+                content=bundle.content,
+                references=bundle.references(),
+                keyword_metadata=bundle.keyword_metadata(),
+                prescreen_rules=header['prescreen_rules'],
+                keyword_rules=header['keyword_rules'],
+                fast_rules=header['fast_rules'],
+                fingerprint=header['fingerprint'],
+                path=bundle.path.parent,
+                source='bundle',
+                keyword_matcher=bundle.keyword_matcher()
+            )
+            
+        except Exception as e:
+            logger.error(f"Error loading skill bundle {bundle_path}: {e}", exc_info=True)
+            return None
+    
+    def build_skill_data(self, name, description, content, references, keyword_metadata,
+                         prescreen_rules, keyword_rules, fast_rules, fingerprint, path, source,
+                         keyword_matcher=None):
+        """
+        Build the skill data dictionary shared by source and bundle loading
+        
+        Args:
+            keyword_matcher: Automaton restored from a bundle (built from the references if None)
+        
+        Returns:
+            Dictionary containing skill data with name, description, content, and references
+        """
+        skill_data = {
+            'name': name,
+            'description': description,
+            'content': content,
+            'references': references,
+            # references をプロンプトに埋め込む形式（初回使用時に整形して保持）
+            'reference_sections': LazyMapping(
+                references.keys(),
+                lambda ref_name: f"\n### {ref_name}\n\n{references[ref_name]}"
+            ),
+            # トークン予算用: TRIMMABLE_SECTIONS を0個, 1個, ... 省略した形式と文字数によるトークン数の見積もり
+            'reference_variants': LazyMapping(
+                references.keys(),
+                lambda ref_name: self._reference_variants(ref_name, references[ref_name])
+            ),
+            # 各形式のトークナイザーによるトークン数（予算の境界付近でだけ数える）
+            'reference_variant_tokens': LazyMapping(
+                references.keys(),
+                lambda ref_name: [
+                    self.token_counter(section)
+                    for section, _ in skill_data['reference_variants'][ref_name]
+                ]
+            ),
+            # キーワード検出用のAho-Corasickオートマトン（ソースからのロード時に1回だけ構築、読みでも検出、
+            # バンドルからは構築済みの表を復元）
+            # 除外語・最長一致のルールで、別の語の一部として現れたキーワードはプロンプトに含めない
+            'keyword_matcher': keyword_matcher or KeywordMatcher(
+                references.keys(),
+                aliases=reading_aliases(keyword_metadata),
+                exclusions=keyword_exclusions(keyword_rules, keyword_metadata),
+                longest_match=keyword_rules.get('longest_match', False)
+            ),
+            'keyword_metadata': keyword_metadata,
+            'prescreen_rules': prescreen_rules,
+            'keyword_rules': keyword_rules,
+            # LLMに送る前の事前判定（prescreen.yaml と references のメタデータから構築）
+            'prescreener': PreScreener(prescreen_rules, keyword_metadata),
+            'fast_rules': fast_rules,
+            # 高速モード（LLMを使わない暫定判定）のルールエンジン（fast_rules.yaml から構築）
+            'rule_engine': RuleEngine(fast_rules, keyword_metadata, prescreen_rules.get('risk_patterns')),
+            'fingerprint': fingerprint,
+            'path': path,
+            # 読み込み元（'files' / 'bundle'）と読み込み時刻
+            'source': source,
+            'loaded_at': time.time(),
+            'reference_mtimes': {}
+        }
+        return skill_data
+    
+    def load_references(self, skill_dir, previous=None):
         """
         Load all reference files from the references directory
         
         Args:
             skill_dir: Path to the skill directory
+            previous: Previously loaded data of the same skill; files whose mtime
+                has not changed are taken from it instead of being read again
             
         Returns:
-            Dictionary mapping reference names to their content
+            Tuple: (references, mtimes)
+            - references: Dictionary mapping reference names to their content
+            - mtimes: Dictionary mapping reference names to the mtime (ns) of their file
         """
         references = {}
+        mtimes = {}
         references_dir = skill_dir / "references"
         
         if not references_dir.exists():
-            return references
+            return references, mtimes
+        
+        previous_mtimes = previous['reference_mtimes'] if previous else {}
         
         for ref_file in references_dir.glob("*.md"):
+            # Use filename without extension as key
+            ref_name = ref_file.stem
             try:
-                with open(ref_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # Use filename without extension as key
-                    ref_name = ref_file.stem
-                    references[ref_name] = content
+                mtime = ref_file.stat().st_mtime_ns
+                if previous_mtimes.get(ref_name) == mtime:
+                    references[ref_name] = previous['references'][ref_name]
+                else:
+                    with open(ref_file, 'r', encoding='utf-8') as f:
+                        references[ref_name] = f.read()
+                mtimes[ref_name] = mtime
             except Exception as e:
                 logger.error(f"Error loading reference file {ref_file}: {e}", exc_info=True)
         
-        return references
+        return references, mtimes
+    
+    def load_prescreen_rules(self, skill_dir):
+        """
+        Load the pre-screen rules of a skill
+        
+        Args:
+            skill_dir: Path to the skill directory
+            
+        Returns:
+            Dictionary loaded from prescreen.yaml (empty if the skill has none)
+        """
+        return self.load_rules_file(skill_dir / "prescreen.yaml")
+    
+    def load_keyword_rules(self, skill_dir):
+        """
+        Load the keyword detection rules of a skill
+        
+        Args:
+            skill_dir: Path to the skill directory
+            
+        Returns:
+            Dictionary loaded from keyword_rules.yaml (empty if the skill has none)
+        """
+        return self.load_rules_file(skill_dir / "keyword_rules.yaml")
+    
+    def load_fast_rules(self, skill_dir):
+        """
+        Load the fast mode rules of a skill
+        
+        Args:
+            skill_dir: Path to the skill directory
+            
+        Returns:
+            Dictionary loaded from fast_rules.yaml (empty if the skill has none)
+        """
+        return self.load_rules_file(skill_dir / "fast_rules.yaml")
+    
+    def load_rules_file(self, rules_file):
+        """Load a YAML rules file, returning an empty dictionary if it is missing or invalid"""
+        if not rules_file.exists():
+            return {}
+        
+        try:
+            with open(rules_file, 'r', encoding='utf-8') as f:
+                return yaml.safe_load(f) or {}
+        except Exception as e:
+            logger.error(f"Error loading rules {rules_file}: {e}", exc_info=True)
+            return {}
     
     def build_system_prompt(self, skill_name):
         """
@@ -143,16 +591,27 @@ class SkillManager:
             
             # Add all reference content
             prompt_parts.append("\n## 各キーワードの詳細ルール\n")
-            for ref_name, ref_content in sorted(skill['references'].items()):
-                prompt_parts.append(f"\n### {ref_name}\n")
-                prompt_parts.append(ref_content)
+            for ref_name in sorted(skill['references'].keys()):
+                prompt_parts.append(skill['reference_sections'][ref_name])
+        
+        return "\n".join(prompt_parts) + self.prompt_suffix
+    
+    def _reference_variants(self, ref_name, content):
+        """
+        Render a reference section with fewer and fewer low-priority sections
         
-        return "\n".join(prompt_parts)
+        Returns:
+            List of (section_text, estimated_tokens); index i leaves out the first i TRIMMABLE_SECTIONS
+        """
+        variants = []
+        for level in range(len(TRIMMABLE_SECTIONS) + 1):
+            section = f"\n### {ref_name}\n\n{trim_reference(content, TRIMMABLE_SECTIONS[:level])}"
+            variants.append((section, estimate_tokens(section)))
+        return variants
     
     def detect_keywords(self, skill_name, text):
         """
         Detect keywords from product text that exist in references
-        Uses word boundary detection for more precise matching
         
         Args:
             skill_name: Name of the skill
@@ -161,44 +620,70 @@ class SkillManager:
         Returns:
             List of detected keyword names
         """
+        return list(self.find_keyword_matches(skill_name, text).keys())
+    
+    def find_keyword_matches(self, skill_name, text):
+        """
+        Find keywords and their positions in product text
+        Substring matching on normalized text (width, kana and case variants and
+        読み are matched) in a single pass over the text
+        
+        Args:
+            skill_name: Name of the skill
+            text: Product text to check for keywords
+            
+        Returns:
+            Dictionary mapping detected keyword names to lists of (start, end) offsets
+        """
         skill = self.skills.get(skill_name)
         if not skill or not skill['references']:
-            return []
-        
-        detected = []
-        
-        # キーワード名（ファイル名）で単語境界を考慮した検索
-        for keyword_name in skill['references'].keys():
-            # キーワードを正規表現用にエスケープ
-            escaped_keyword = re.escape(keyword_name)
-            
-            # 日本語と英語の両方に対応したパターン
-            # 英語: \bで単語境界をチェック
-            # 日本語: 前後が英数字でないことを確認
-            patterns = [
-                # 英語キーワード用（単語境界\bを使用）
-                rf'\b{escaped_keyword}\b',
-                # 日本語キーワード用（前後が英数字以外）
-                rf'(?<![a-zA-Z0-9]){escaped_keyword}(?![a-zA-Z0-9])',
-                # シンプルな部分一致（フォールバック）
-                escaped_keyword
-            ]
+            return {}
+        
+        return skill['keyword_matcher'].find_all(text)
+    
+    def prescreen(self, skill_name, text, keyword_matches, row=None):
+        """
+        Decide locally whether a product is clearly safe
+        
+        Args:
+            skill_name: Name of the skill
+            text: Product text that is checked
+            keyword_matches: Output of find_keyword_matches for the text
+            row: Row data of the product (optional, used for the 薬事区分 column)
             
-            # いずれかのパターンにマッチすれば検出
-            for pattern in patterns:
-                try:
-                    if re.search(pattern, text, re.IGNORECASE):
-                        detected.append(keyword_name)
-                        break  # このキーワードは検出済み
-                except re.error:
-                    # 正規表現エラーの場合は次のパターンを試す
-                    continue
+        Returns:
+            Tuple (reason_code, reason) when the LLM check can be skipped, otherwise None
+        """
+        skill = self.skills.get(skill_name)
+        if not skill:
+            return None
         
-        return detected
+        return skill['prescreener'].screen(text, keyword_matches, row)
+    
+    def fast_check(self, skill_name, text, detected_keywords, row=None):
+        """
+        Judge a product offline from the reference metadata and its category
+        
+        Args:
+            skill_name: Name of the skill
+            text: Product text that is checked
+            detected_keywords: Keywords detected in the text
+            row: Row data of the product (optional, used for the category columns)
+            
+        Returns:
+            Output of RuleEngine.evaluate
+        """
+        skill = self.skills.get(skill_name)
+        if not skill:
+            raise ValueError(f"Skill not found: {skill_name}")
+        
+        return skill['rule_engine'].evaluate(text, detected_keywords, row)
     
     def build_dynamic_system_prompt(self, skill_name, detected_keywords):
         """
         Build a system prompt with only detected keywords' references
+        Prompts are memoized per keyword set; keywords are always sorted so the
+        same set produces byte-identical prompts (and hits provider prefix caches)
         
         Args:
             skill_name: Name of the skill to build prompt for
@@ -211,6 +696,24 @@ class SkillManager:
         if not skill:
             raise ValueError(f"Skill not found: {skill_name}")
         
+        # 取得したスキルをそのまま渡して組み立てる（組み立て中に再読み込みされても、
+        # 新しい内容を古い fingerprint のキーで保持しない）
+        return self._dynamic_prompt_cache(SkillVersion(skill), frozenset(detected_keywords))
+    
+    def _assemble_dynamic_system_prompt(self, version, detected_keywords):
+        """
+        Assemble the dynamic system prompt from pre-rendered reference sections
+        
+        Args:
+            version: SkillVersion of the skill to build prompt for (the memoization key
+                is its name and fingerprint)
+            detected_keywords: Frozenset of detected keyword names
+            
+        Returns:
+            String containing the system prompt with only relevant references
+        """
+        skill = version.skill
+        
         # Start with the main skill content
         prompt_parts = [skill['content']]
         
@@ -226,16 +729,77 @@ class SkillManager:
             
             # Add only detected keywords' reference content
             prompt_parts.append("\n## 各キーワードの詳細ルール\n")
-            for keyword_name in sorted(detected_keywords):
-                if keyword_name in skill['references']:
-                    prompt_parts.append(f"\n### {keyword_name}\n")
-                    prompt_parts.append(skill['references'][keyword_name])
+            keywords = [
+                keyword_name for keyword_name in sorted(detected_keywords)
+                if keyword_name in skill['reference_sections']
+            ]
+            level = self._trim_level(skill, prompt_parts, keywords)
+            if level:
+                prompt_parts.extend(skill['reference_variants'][keyword_name][level][0] for keyword_name in keywords)
+            else:
+                prompt_parts.extend(skill['reference_sections'][keyword_name] for keyword_name in keywords)
         else:
             # キーワードが検出されなかった場合の注記
             prompt_parts.append("\n\n## 注意\n")
             prompt_parts.append("商品テキストから該当するキーワードが検出されませんでしたが、一般的な薬機法・景表法の観点からチェックしてください。")
         
-        return "\n".join(prompt_parts)
+        return "\n".join(prompt_parts) + self.prompt_suffix
+    
+    def _trim_level(self, skill, prompt_parts, keywords):
+        """
+        Decide how many TRIMMABLE_SECTIONS to leave out to stay within the token budget
+        
+        Args:
+            skill: Skill data
+            prompt_parts: Parts of the prompt before the references
+            keywords: Keywords whose references are added
+            
+        Returns:
+            Number of leading TRIMMABLE_SECTIONS to leave out (0 = full references)
+        """
+        if not self.prompt_token_budget:
+            return 0
+        
+        fixed_text = "\n".join(prompt_parts) + self.prompt_suffix
+        fixed_estimate = estimate_tokens(fixed_text)
+        fixed_tokens = None
+        for level in range(len(TRIMMABLE_SECTIONS) + 1):
+            tokens = fixed_estimate + sum(skill['reference_variants'][keyword][level][1] for keyword in keywords)
+            if tokens <= self.prompt_token_budget * TOKEN_ESTIMATE_MIN_RATIO:
+                break
+            if tokens > self.prompt_token_budget * TOKEN_ESTIMATE_MAX_RATIO:
+                continue
+            
+            # 文字数では判断できない予算の境界付近は、文字数が予算内でもモデルのトークナイザーで数える
+            if fixed_tokens is None:
+                fixed_tokens = self.token_counter(fixed_text)
+            tokens = fixed_tokens + sum(skill['reference_variant_tokens'][keyword][level] for keyword in keywords)
+            if tokens <= self.prompt_token_budget:
+                break
+        else:
+            logger.warning(
+                f"system_promptがトークン予算を超えています: {tokens} > {self.prompt_token_budget} tokens"
+                f"（キーワード {len(keywords)}件、references の省略可能なセクションはすべて省略済み）"
+            )
+        
+        if level:
+            logger.info(
+                f"system_promptをトークン予算 {self.prompt_token_budget} tokens に収めるため、references の"
+                f"「{'」「'.join(TRIMMABLE_SECTIONS[:level])}」を省略しました（キーワード {len(keywords)}件、{tokens} tokens）"
+            )
+        return level
+    
+    def prompt_cache_stats(self):
+        """Return hit/miss statistics of the dynamic prompt cache"""
+        info = self._dynamic_prompt_cache.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'hit_rate': round(info.hits / lookups, 4) if lookups else 0.0,
+            'entries': info.currsize,
+            'max_entries': info.maxsize
+        }
     
     def get_skill_by_name(self, skill_name):
         """Get a skill by name"""
@@ -246,7 +810,10 @@ class SkillManager:
         return [
             {
                 'name': skill['name'],
-                'description': skill['description']
+                'description': skill['description'],
+                'fingerprint': skill['fingerprint'],
+                'source': skill['source'],
+                'loaded_at': skill['loaded_at']
             }
             for skill in self.skills.values()
         ]
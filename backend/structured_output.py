@@ -0,0 +1,159 @@
+"""
+Structured output for Keywords Checker
+JSON schema of the check result (same items as the SKILL.md output format),
+parsing of the LLM answer and rendering back to the usual report layout
+"""
+
+import json
+
+# 問題点・コメントの各項目
+_FINDING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "original_text": {"type": "string", "description": "問題となる原文、またはコメント対象の表現"},
+        "reason": {"type": "string", "description": "理由"},
+        "fix": {"type": "string", "description": "修正案（なければ「なし」）"}
+    },
+    "required": ["original_text", "reason", "fix"],
+    "additionalProperties": False
+}
+
+RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "products": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "product_id": {
+                        "type": "integer",
+                        "description": "商品ID（見出しに番号がない場合は1から順に採番）"
+                    },
+                    "product_name": {"type": "string", "description": "商品名"},
+                    "conclusion": {"type": "string", "enum": ["OK", "NG"]},
+                    "keywords": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "根拠となったチェック用キーワード"
+                    },
+                    "issues": {
+                        "type": "array",
+                        "items": _FINDING_SCHEMA,
+                        "description": "問題点・改善点（結論がNGの場合）"
+                    },
+                    "comments": {
+                        "type": "array",
+                        "items": _FINDING_SCHEMA,
+                        "description": "コメント・懸念点（結論がOKの場合）"
+                    }
+                },
+                "required": ["product_id", "product_name", "conclusion", "keywords", "issues", "comments"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["products"],
+    "additionalProperties": False
+}
+
+# LiteLLM (OpenAI互換) の response_format
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "check_result",
+        "strict": True,
+        "schema": RESULT_SCHEMA
+    }
+}
+
+# system_prompt の末尾に追加する出力形式の指示
+OUTPUT_INSTRUCTION = """
+
+## 出力形式（JSON）
+上記のoutputの内容を、指定されたJSONスキーマで回答してください。
+- products: 商品ごとの結果（商品が1件の場合も配列）
+- conclusion: OK または NG
+- keywords: 根拠となったチェック用キーワード
+- issues: 結論がNGの場合の問題点（original_text: 問題となる原文、reason: 理由、fix: 修正案）
+- comments: 結論がOKの場合のコメント・懸念点（original_text: 内容、reason: 理由、fix: 修正案）
+JSON以外の内容は出力しないでください。"""
+
+
+def parse_result(result_text):
+    """
+    Parse a structured LLM answer
+
+    Args:
+        result_text: JSON text returned by the LLM
+
+    Returns:
+        List of product result dictionaries
+
+    Raises:
+        ValueError: If the answer is not valid JSON of the expected shape
+    """
+    data = json.loads(result_text)
+    products = data.get('products') if isinstance(data, dict) else None
+    if not isinstance(products, list):
+        raise ValueError("Structured result has no 'products' list")
+
+    return [product for product in products if isinstance(product, dict)]
+
+
+def product_conclusion(product):
+    """Return "OK", "NG" or "UNKNOWN" for one product result"""
+    conclusion = product.get('conclusion')
+    return conclusion if conclusion in ('OK', 'NG') else "UNKNOWN"
+
+
+def overall_conclusion(products):
+    """Return "NG" if any product is NG, "OK" if all are OK, otherwise "UNKNOWN\""""
+    conclusions = [product_conclusion(product) for product in products]
+    if "NG" in conclusions:
+        return "NG"
+    if conclusions and all(conclusion == "OK" for conclusion in conclusions):
+        return "OK"
+    return "UNKNOWN"
+
+
+def render_product(product):
+    """
+    Render one product result in the report layout of SKILL.md
+
+    Args:
+        product: Product result dictionary
+
+    Returns:
+        Markdown list text
+    """
+    lines = [
+        f"- {product.get('product_name') or '商品名'}",
+        "  - 結論",
+        f"    - {product_conclusion(product)}",
+        "  - 根拠(対象キーワード)"
+    ]
+    lines.extend(f"    - {keyword}" for keyword in product.get('keywords') or ['なし'])
+
+    for heading, label, key in (
+        ("問題点・改善点", "問題", 'issues'),
+        ("コメント・懸念点", "項目", 'comments')
+    ):
+        findings = product.get(key) or []
+        if not findings:
+            continue
+        lines.append(f"  - {heading}")
+        for number, finding in enumerate(findings, start=1):
+            lines.extend([
+                f"    - {label}{number}",
+                f"      - 原文: {finding.get('original_text', '')}",
+                f"      - 理由: {finding.get('reason', '')}",
+                f"      - 修正案: {finding.get('fix', '')}"
+            ])
+
+    return "\n".join(lines)
+
+
+def render_result(products):
+    """Render all product results of an answer"""
+    return "\n".join(render_product(product) for product in products)
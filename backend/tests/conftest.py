@@ -0,0 +1,74 @@
+"""
+Shared fixtures for the backend tests
+
+app.py reads its configuration from the environment at import time, so the
+environment is pointed at a temporary directory and a local mock LLM server
+before the app is imported
+"""
+
+import os
+import importlib
+
+import openpyxl
+import pytest
+
+from mock_llm_server import MockLLMServer
+
+
+@pytest.fixture(scope='session')
+def llm_server():
+    """Mock OpenAI-compatible LLM server shared by all tests"""
+    server = MockLLMServer(port=0, latency=0.0, seed=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope='session')
+def app_module(llm_server, tmp_path_factory):
+    """The app module, configured against the mock LLM server"""
+    data_dir = tmp_path_factory.mktemp('app')
+    os.environ.update({
+        'LITELLM_API_BASE': llm_server.url,
+        'OPENAI_API_KEY': 'sk-test',
+        'LITELLM_LOCAL_MODEL_COST_MAP': 'True',
+        'LLM_TIMEOUT_SECONDS': '10',
+        'LLM_BACKOFF_BASE_SECONDS': '0.01',
+        'LLM_BACKOFF_MAX_SECONDS': '0.05',
+        'RESULT_CACHE_PATH': str(data_dir / 'results.sqlite3'),
+        'JOBS_DIR': str(data_dir / 'jobs'),
+        'METRICS_DIR': str(data_dir / 'metrics'),
+        'SKILL_RELOAD_INTERVAL': '0',
+        'FLASK_DEBUG': 'False'
+    })
+    app = importlib.import_module('app')
+    app.start_worker()
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    """Flask test client"""
+    app_module.app.config['TESTING'] = True
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def skill_name(app_module):
+    """Name of the bundled product copy skill"""
+    return app_module.skill_manager.list_skills()[0]['name']
+
+
+@pytest.fixture
+def write_sheet(tmp_path):
+    """Write rows (dicts keyed by column name) as the 「チェック対象」 sheet of an .xlsx file"""
+    def write(rows, name='input.xlsx'):
+        columns = list(dict.fromkeys(column for row in rows for column in row))
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('チェック対象')
+        sheet.append(columns)
+        for row in rows:
+            sheet.append([row.get(column) for column in columns])
+        path = tmp_path / name
+        workbook.save(path)
+        return path
+    return write
@@ -0,0 +1,134 @@
+"""Tests for packing several products into one LLM request"""
+
+import pytest
+
+from batching import build_batch_message, plan_batches, split_batch_response
+from result_cache import ResultCache
+
+
+ROWS = [
+    {'*商品名': f'スチールラック{index}', '*変更前_商品の特徴BtoB': f'スチール製の{index + 2}段ラックです。'}
+    if index % 2 else
+    {'*商品名': f'マッサージ器{index}', '*変更前_商品の特徴BtoB': f'血行を促進します。{index + 1}段階で調節できます。'}
+    for index in range(8)
+]
+
+
+def item(message, keywords):
+    return {'product_message': message, 'detected_keywords': keywords}
+
+
+def test_plan_batches_groups_overlapping_keywords():
+    items = [item('a', ['血行']), item('b', []), item('c', ['血行']), item('d', []), item('e', ['血行'])]
+
+    batches = plan_batches(items, max_batch_size=2, token_budget=1000, base_tokens=0, reference_tokens=len)
+
+    assert [[entry['product_message'] for entry in batch] for batch in batches] == [['b', 'd'], ['a', 'c'], ['e']]
+
+
+def test_plan_batches_respects_token_budget():
+    items = [item('x' * 40, []) for _ in range(5)]
+
+    batches = plan_batches(items, max_batch_size=10, token_budget=100, base_tokens=10, reference_tokens=len)
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
+def test_split_batch_response_per_product():
+    answer = "\n".join([
+        "前置き",
+        "### 商品ID: 2", "- 商品B", "  - 結論", "    - NG",
+        "## 商品ID：1", "- 商品A", "  - 結論", "    - OK",
+        "### 商品ID: 2", "- 重複した見出しは無視",
+        "### 商品ID: 9", "- 範囲外は無視",
+        "### 商品ID: 3",
+    ])
+
+    sections = split_batch_response(answer, 3)
+
+    assert sections == {
+        1: "- 商品A\n  - 結論\n    - OK",
+        2: "- 商品B\n  - 結論\n    - NG",
+    }
+
+
+def test_batch_message_round_trips_through_the_headings():
+    message = build_batch_message(['商品名: A', '商品名: B'])
+
+    assert split_batch_response(message, 2) == {1: '商品名: A', 2: '商品名: B'}
+
+
+def run(app_module, skill_name):
+    results = {}
+    decisions = app_module.check_rows(
+        enumerate(ROWS), skill_name,
+        lambda row_index, result_text, conclusion: results.__setitem__(row_index, (result_text, conclusion))
+    )
+    return decisions, results
+
+
+@pytest.fixture
+def batching(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'CHECK_BATCH_SIZE', 4)
+    monkeypatch.setattr(app_module, 'result_cache', None)
+
+
+def assert_row_results(results):
+    assert sorted(results) == list(range(len(ROWS)))
+    for row_index, (result_text, conclusion) in results.items():
+        assert result_text.startswith(f"- {ROWS[row_index]['*商品名']}\n")
+        assert conclusion == ('OK' if row_index % 2 else 'NG')
+
+
+def test_rows_are_checked_in_batches(app_module, skill_name, llm_server, batching):
+    requests = llm_server.stats()['requests']
+
+    decisions, results = run(app_module, skill_name)
+
+    assert llm_server.stats()['requests'] - requests == 2
+    assert decisions['llm'] == len(ROWS)
+    assert_row_results(results)
+
+
+def test_products_missing_from_the_answer_are_checked_alone(app_module, skill_name, llm_server, batching,
+                                                            monkeypatch):
+    split_answers = app_module.split_answers
+
+    def drop_first_product(result_text, product_count):
+        answers = split_answers(result_text, product_count)
+        answers.pop(1, None)
+        return answers
+
+    monkeypatch.setattr(app_module, 'split_answers', drop_first_product)
+    requests = llm_server.stats()['requests']
+
+    decisions, results = run(app_module, skill_name)
+
+    # 2バッチ + 各バッチの先頭の商品の単独チェック
+    assert llm_server.stats()['requests'] - requests == 4
+    assert_row_results(results)
+
+
+@pytest.mark.parametrize('failing_call', [1, 2], ids=['lookup', 'put'])
+def test_cache_key_failure_marks_only_its_row(app_module, skill_name, batching, tmp_path, monkeypatch, failing_call):
+    monkeypatch.setattr(app_module, 'result_cache', ResultCache(tmp_path / 'results.sqlite3'))
+    row_cache_key = app_module.row_cache_key
+    calls = []
+
+    def failing_row_cache_key(item, skill_name):
+        # 行3のキーは、キャッシュの参照（1回目）またはバッチ結果の保存（2回目）で失敗する
+        if item['row_index'] == 3:
+            calls.append(1)
+            if len(calls) == failing_call:
+                raise RuntimeError('prompt build failed')
+        return row_cache_key(item, skill_name)
+
+    monkeypatch.setattr(app_module, 'row_cache_key', failing_row_cache_key)
+
+    decisions, results = run(app_module, skill_name)
+
+    assert len(calls) == failing_call
+    assert results.pop(3) == ('エラー: prompt build failed', 'ERROR')
+    for row_index, (result_text, conclusion) in results.items():
+        assert conclusion == ('OK' if row_index % 2 else 'NG')
+    assert app_module.result_cache.stats()['entries'] == len(ROWS) - 1
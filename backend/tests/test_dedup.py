@@ -0,0 +1,60 @@
+"""Tests for checking identical copy once and sharing the verdict across rows"""
+
+import pytest
+
+
+COPY = '血行を促進します。'
+ROWS = [
+    {'*商品名': 'マッサージ器 ホワイト', '*変更前_商品の特徴BtoB': COPY},
+    {'*商品名': 'スチールラック', '*変更前_商品の特徴BtoB': 'スチール製の5段ラックです。'},
+    {'*商品名': 'マッサージ器 ブラック', '*変更前_商品の特徴BtoB': COPY},
+    {'*商品名': 'マッサージ器 レッド', '*変更前_商品の特徴BtoB': f'  {COPY}'},
+]
+
+
+def run(app_module, skill_name, chunk_size=None):
+    results = {}
+    decisions = app_module.check_rows(
+        enumerate(ROWS), skill_name,
+        lambda row_index, result_text, conclusion: results.__setitem__(row_index, (result_text, conclusion)),
+        chunk_size=chunk_size
+    )
+    return decisions, results
+
+
+@pytest.fixture(autouse=True)
+def no_result_cache(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'result_cache', None)
+
+
+def test_dedup_key_ignores_product_name_and_spacing(app_module):
+    key = app_module.build_dedup_key('商品名: A\n*変更前_商品の特徴BtoB: 血行を 促進')
+
+    assert key == app_module.build_dedup_key('商品名: B\n*変更前_商品の特徴BtoB:  血行を　促進')
+    assert key != app_module.build_dedup_key('商品名: A\n*変更前_商品の特徴BtoC: 血行を 促進')
+
+
+@pytest.mark.parametrize('chunk_size', [None, 2])
+def test_identical_copy_is_checked_once(app_module, skill_name, llm_server, chunk_size):
+    requests = llm_server.stats()['requests']
+
+    decisions, results = run(app_module, skill_name, chunk_size)
+
+    assert llm_server.stats()['requests'] - requests == 2
+    assert decisions == {'llm': 2, 'duplicate': 2}
+    source_text, conclusion = results[0]
+    assert conclusion == 'NG'
+    for follower in (2, 3):
+        assert results[follower] == (app_module.format_shared_result(0, source_text), 'NG')
+    assert results[1][1] == 'OK'
+
+
+def test_dedup_can_be_disabled(app_module, skill_name, llm_server, monkeypatch):
+    monkeypatch.setattr(app_module, 'CHECK_DEDUP_ENABLED', False)
+    requests = llm_server.stats()['requests']
+
+    decisions, results = run(app_module, skill_name)
+
+    assert llm_server.stats()['requests'] - requests == len(ROWS)
+    assert decisions == {'llm': len(ROWS)}
+    assert all('同じ結果を適用' not in result_text for result_text, _ in results.values())
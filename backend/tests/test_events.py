@@ -0,0 +1,107 @@
+"""Tests for the Server-Sent Events streams of single checks and job rows"""
+
+import io
+import json
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from job_manager import JobManager, JOB_COMPLETED
+
+
+def parse_events(body):
+    """Parse a text/event-stream body into (id, event, data) tuples"""
+    events = []
+    for message in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.split('\n') if not line.startswith(':'))
+        if fields:
+            events.append((fields.get('id'), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@pytest.fixture
+def manager(tmp_path, write_sheet):
+    """A job manager holding one job with 7 recorded rows"""
+    manager = JobManager(tmp_path / 'jobs', check_rows=None)
+    path = write_sheet([{'*商品名': f'商品{index}', '*変更前_商品の特徴BtoB': 'テキスト'} for index in range(7)])
+    manager.job_id = manager.submit(FileStorage(io.BytesIO(path.read_bytes())), 'input.xlsx', '商品コピーチェック')
+    # 行は完了順（row_index 順とは限らない）に保存される
+    for row_index in (3, 0, 1, 6, 2, 5, 4):
+        manager._record_row(manager.job_id, row_index, f'結果{row_index}', 'OK')
+    return manager
+
+
+def test_row_events_are_read_in_pages(manager):
+    manager._set_status(manager.job_id, JOB_COMPLETED)
+    queries = []
+    manager._conn.set_trace_callback(lambda statement: queries.append(statement) if 'FROM job_rows' in statement else None)
+
+    rows = list(manager.iter_row_events(manager.job_id, page_size=3))
+
+    assert [row_index for _, row_index, _, _ in rows] == [3, 0, 1, 6, 2, 5, 4]
+    assert [rowid for rowid, _, _, _ in rows] == sorted(rowid for rowid, _, _, _ in rows)
+    assert len(queries) == 3
+
+
+def test_row_events_resume_after_the_last_event(manager):
+    manager._set_status(manager.job_id, JOB_COMPLETED)
+    rows = list(manager.iter_row_events(manager.job_id))
+
+    resumed = list(manager.iter_row_events(manager.job_id, after=rows[2][0], page_size=2))
+
+    assert resumed == rows[3:]
+
+
+def test_running_job_yields_keep_alive_polls(manager):
+    events = manager.iter_row_events(manager.job_id, poll_interval=0, page_size=5)
+
+    assert [next(events)[1] for _ in range(7)] == [3, 0, 1, 6, 2, 5, 4]
+    assert next(events) is None
+
+    manager._record_row(manager.job_id, 7, '結果7', 'OK')
+    assert next(events)[1:] == (7, '結果7', 'OK')
+
+
+def test_job_events_endpoint_resumes_from_last_event_id(app_module, client, manager, monkeypatch):
+    monkeypatch.setattr(app_module, 'job_manager', manager)
+    manager._set_status(manager.job_id, JOB_COMPLETED)
+
+    response = client.get(f'/api/jobs/{manager.job_id}/events')
+
+    assert response.mimetype == 'text/event-stream'
+    events = parse_events(response.get_data(as_text=True))
+    assert [event for _, event, _ in events] == ['row'] * 7 + ['end']
+    assert events[0][2] == {'row_index': 3, 'conclusion': 'OK', 'result': '結果3'}
+    assert events[-1][2]['status'] == JOB_COMPLETED
+
+    response = client.get(f'/api/jobs/{manager.job_id}/events', headers={'Last-Event-ID': events[4][0]})
+
+    assert parse_events(response.get_data(as_text=True)) == events[5:]
+
+
+def test_job_events_endpoint_rejects_bad_requests(app_module, client, manager, monkeypatch):
+    monkeypatch.setattr(app_module, 'job_manager', manager)
+
+    assert client.get('/api/jobs/unknown/events').status_code == 404
+    response = client.get(f'/api/jobs/{manager.job_id}/events', headers={'Last-Event-ID': 'abc'})
+    assert response.status_code == 400
+
+
+def test_single_check_streams_the_answer(app_module, client, skill_name, monkeypatch):
+    monkeypatch.setattr(app_module, 'result_cache', None)
+
+    response = client.post('/api/check', json={
+        'skill_name': skill_name,
+        'product_info': '商品名: マッサージ器\n*変更前_商品の特徴BtoB: 血行を促進します。',
+        'stream': True
+    })
+
+    events = parse_events(response.get_data(as_text=True))
+    names = [event for _, event, _ in events]
+    assert names[0] == 'keywords' and names[-1] == 'result'
+    assert set(names[1:-1]) == {'token'}
+    answer = ''.join(data['text'] for _, event, data in events if event == 'token')
+    result = events[-1][2]
+    assert result['conclusion'] == 'NG'
+    assert result['result'] == answer.strip()
+    assert result['detected_keywords'] == events[0][2]['detected_keywords']
@@ -0,0 +1,79 @@
+"""Tests for fast mode through /api/check and background jobs"""
+
+import io
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from job_manager import JobManager, JOB_COMPLETED
+
+
+ROWS = [
+    {'*商品名': 'マッサージ器', '*変更前_商品の特徴BtoB': '血行を促進します。', '管理カテゴリー中': 'マスク'},
+    {'*商品名': '塗り薬', '*変更前_商品の特徴BtoB': '血行を良くします。', '薬事区分': '医薬品'},
+    {'*商品名': 'スチールラック', '*変更前_商品の特徴BtoB': 'スチール製の3段ラックです。'},
+    {'*商品名': 'クリーム', '*変更前_商品の特徴BtoB': '血行を促進します。'},
+]
+EXPECTED = {0: 'NG', 1: 'OK', 2: 'OK', 3: 'REVIEW'}
+PRODUCT_INFO = '商品名: マッサージ器\n*変更前_商品の特徴BtoB: 血行を促進します。'
+
+
+@pytest.fixture
+def manager(app_module, tmp_path, monkeypatch):
+    """A job manager of the app whose runner is not started"""
+    manager = JobManager(tmp_path / 'jobs', check_rows=app_module.check_rows_in_mode)
+    monkeypatch.setattr(app_module, 'job_manager', manager)
+    return manager
+
+
+def test_check_endpoint_in_fast_mode(client, skill_name, llm_server):
+    requests = llm_server.stats()['requests']
+
+    response = client.post('/api/check', json={
+        'skill_name': skill_name, 'product_info': PRODUCT_INFO, 'mode': 'fast',
+        'categories': {'管理カテゴリー中': 'マスク'}
+    })
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data['conclusion'], data['product_class'], data['mode']) == ('NG', '雑品', 'fast')
+    assert {'keyword': '血行', 'verdict': 'NG', 'reason': '雑品はNGの場合に該当'} in data['verdicts']
+    assert llm_server.stats()['requests'] == requests
+
+
+@pytest.mark.parametrize('categories', ['マスク', ['マスク']])
+def test_check_endpoint_rejects_categories_that_are_not_an_object(client, skill_name, categories):
+    response = client.post('/api/check', json={
+        'skill_name': skill_name, 'product_info': PRODUCT_INFO, 'mode': 'fast', 'categories': categories
+    })
+
+    assert response.status_code == 400
+    assert 'categories' in response.get_json()['error']
+
+
+def test_fast_job_runs_without_the_llm(manager, skill_name, write_sheet, llm_server):
+    requests = llm_server.stats()['requests']
+    with open(write_sheet(ROWS), 'rb') as file:
+        job_id = manager.submit(FileStorage(io.BytesIO(file.read())), 'input.xlsx', skill_name, 'fast')
+    assert manager._claim(job_id)
+
+    manager._process_job(job_id)
+
+    status = manager.get_status(job_id)
+    assert (status['status'], status['mode']) == (JOB_COMPLETED, 'fast')
+    assert status['summary']['fast'] == len(ROWS)
+    assert {row_index: conclusion for _, row_index, _, conclusion in manager.iter_row_events(job_id)} == EXPECTED
+    assert llm_server.stats()['requests'] == requests
+
+
+def test_jobs_endpoint_passes_the_mode(client, manager, skill_name, write_sheet):
+    with open(write_sheet(ROWS), 'rb') as file:
+        response = client.post('/api/jobs', data={'file': (file, 'input.xlsx'), 'skill_name': skill_name, 'mode': 'fast'})
+
+    assert response.status_code == 202
+    assert response.get_json()['mode'] == 'fast'
+
+    with open(write_sheet(ROWS), 'rb') as file:
+        response = client.post('/api/jobs', data={'file': (file, 'input.xlsx'), 'skill_name': skill_name, 'mode': 'slow'})
+
+    assert response.status_code == 400
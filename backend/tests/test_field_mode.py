@@ -0,0 +1,64 @@
+"""Tests for checking each column on its own with per-field cache reuse"""
+
+import pytest
+
+from result_cache import ResultCache
+
+
+ROW = {
+    '*商品名': 'マッサージ器',
+    '*変更前_商品の特徴BtoB': '血行を促進します。',
+    '*変更前_MDおすすめコメントBtoB': 'コンパクトで持ち運びやすいサイズです。',
+}
+
+
+def check(app_module, skill_name, row):
+    results = {}
+    app_module.check_rows(
+        [(0, row)], skill_name,
+        lambda row_index, result_text, conclusion: results.__setitem__(row_index, (result_text, conclusion))
+    )
+    return results[0]
+
+
+@pytest.fixture
+def field_mode(app_module, monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module, 'CHECK_FIELD_MODE', True)
+    # 列単位チェックではバッチ化しない
+    monkeypatch.setattr(app_module, 'CHECK_BATCH_SIZE', 4)
+    cache = ResultCache(tmp_path / 'results.sqlite3')
+    monkeypatch.setattr(app_module, 'result_cache', cache)
+    return cache
+
+
+def test_each_column_is_checked_and_merged(app_module, skill_name, llm_server, field_mode):
+    requests = llm_server.stats()['requests']
+
+    result_text, conclusion = check(app_module, skill_name, ROW)
+
+    assert llm_server.stats()['requests'] - requests == 2
+    assert conclusion == 'NG'
+    features, comment = result_text.split('\n\n')
+    assert features.startswith('【*変更前_商品の特徴BtoB】\n')
+    assert '    - NG' in features
+    assert comment.startswith('【*変更前_MDおすすめコメントBtoB】\n')
+    assert '    - OK' in comment
+
+
+def test_only_changed_columns_are_checked_again(app_module, skill_name, llm_server, field_mode):
+    check(app_module, skill_name, ROW)
+
+    # 商品名はLLMに送らないため、商品名だけの変更では再チェックしない
+    requests = llm_server.stats()['requests']
+    check(app_module, skill_name, dict(ROW, **{'*商品名': 'マッサージ器 ブラック'}))
+    assert llm_server.stats()['requests'] == requests
+
+    changed = dict(ROW, **{'*変更前_MDおすすめコメントBtoB': '軽量で持ち運びやすいサイズです。'})
+    result_text, conclusion = check(app_module, skill_name, changed)
+
+    assert llm_server.stats()['requests'] - requests == 1
+    assert field_mode.stats()['hits'] == 3
+    assert conclusion == 'NG'
+    assert [section.split('\n', 1)[0] for section in result_text.split('\n\n')] == [
+        '【*変更前_商品の特徴BtoB】', '【*変更前_MDおすすめコメントBtoB】'
+    ]
@@ -0,0 +1,115 @@
+"""Tests for generating the references from master.csv and syncing them into backend/skills"""
+
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+
+SCRIPT = Path(__file__).resolve().parents[2] / '.github' / 'skills' / '商品コピーチェック' / 'generate_references.py'
+
+
+@pytest.fixture(scope='module')
+def generator():
+    spec = importlib.util.spec_from_file_location('generate_references', SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def reference(keyword, judgement):
+    return f"# チェック用キーワード: {keyword}\n\n## 判断\n{judgement}\n"
+
+
+@pytest.fixture
+def trees(tmp_path):
+    source = tmp_path / 'github' / 'references'
+    backend = tmp_path / 'backend' / 'references'
+    return source, backend
+
+
+def sync(generator, references, source, backend, **kwargs):
+    contents = generator.build_references(references, source)
+    return [generator.sync_references(contents, ref_dir, **kwargs) for ref_dir in (source, backend)]
+
+
+def test_sync_writes_the_same_bytes_to_both_trees(generator, trees):
+    source, backend = trees
+    references = {'血行': reference('血行', '使用禁止'), '効果': reference('効果', '要確認')}
+
+    changes = sync(generator, references, source, backend)
+
+    assert [change['added'] for change in changes] == [['血行', '効果']] * 2
+    for name in references:
+        assert (source / f'{name}.md').read_bytes() == (backend / f'{name}.md').read_bytes()
+    assert sorted(path.name for path in backend.iterdir()) == ['効果.md', '血行.md']
+
+
+def test_hand_added_sections_reach_both_trees(generator, trees):
+    source, backend = trees
+    sync(generator, {'血行': reference('血行', '使用禁止')}, source, backend)
+    with (source / '血行.md').open('a', encoding='utf-8') as file:
+        file.write("\n## 似ているキーワード\n- 血流\n")
+    # backend 側だけの追記は残さない
+    with (backend / '血行.md').open('a', encoding='utf-8') as file:
+        file.write("\n## backendだけの追記\n- 消える\n")
+
+    changes = sync(generator, {'血行': reference('血行', 'NG')}, source, backend)
+
+    assert [change['updated'] for change in changes] == [['血行'], ['血行']]
+    text = (source / '血行.md').read_text(encoding='utf-8')
+    assert text.startswith(reference('血行', 'NG').rstrip('\n'))
+    assert text.endswith("## 似ているキーワード\n- 血流")
+    assert (backend / '血行.md').read_bytes() == (source / '血行.md').read_bytes()
+
+
+def test_sync_is_idempotent(generator, trees):
+    source, backend = trees
+    references = {'血行': reference('血行', '使用禁止')}
+    sync(generator, references, source, backend)
+    with (source / '血行.md').open('a', encoding='utf-8') as file:
+        file.write("\n## 似ているキーワード\n- 血流\n")
+    sync(generator, references, source, backend)
+    before = {path: path.read_bytes() for path in [*source.iterdir(), *backend.iterdir()]}
+
+    changes = sync(generator, references, source, backend)
+
+    assert changes == [{'added': [], 'updated': [], 'removed': [], 'unchanged': 1}] * 2
+    assert {path: path.read_bytes() for path in before} == before
+
+
+def test_removed_keywords_are_deleted(generator, trees):
+    source, backend = trees
+    sync(generator, {'血行': reference('血行', '使用禁止'), '効果': reference('効果', '要確認')}, source, backend)
+
+    changes = sync(generator, {'血行': reference('血行', '使用禁止')}, source, backend)
+
+    assert [change['removed'] for change in changes] == [['効果'], ['効果']]
+    assert not (backend / '効果.md').exists()
+
+
+def test_dry_run_changes_nothing(generator, trees):
+    source, backend = trees
+    sync(generator, {'血行': reference('血行', '使用禁止'), '効果': reference('効果', '要確認')}, source, backend)
+    before = {path: path.read_bytes() for path in [*source.iterdir(), *backend.iterdir()]}
+
+    changes = sync(generator, {'血行': reference('血行', 'NG'), '成分': reference('成分', 'OK')},
+                   source, backend, dry_run=True)
+
+    assert changes == [{'added': ['成分'], 'updated': ['血行'], 'removed': ['効果'], 'unchanged': 0}] * 2
+    assert {path: path.read_bytes() for path in [*source.iterdir(), *backend.iterdir()]} == before
+
+
+def test_dry_run_does_not_create_the_target(generator, trees):
+    source, backend = trees
+
+    sync(generator, {'血行': reference('血行', '使用禁止')}, source, backend, dry_run=True)
+
+    assert not source.exists() and not backend.exists()
+
+
+def test_bundled_references_are_in_sync(generator):
+    contents = generator.build_references(generator.read_master(generator.CSV_PATH), generator.REF_DIR)
+
+    for ref_dir in (generator.REF_DIR, generator.BACKEND_SKILL_DIR / 'references'):
+        assert {path.stem: path.read_bytes() for path in ref_dir.glob('*.md')} == contents
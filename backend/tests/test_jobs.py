@@ -0,0 +1,149 @@
+"""Tests for the background job queue and its restart/claim path"""
+
+import io
+import os
+import time
+import sys
+import subprocess
+
+import openpyxl
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from job_manager import JobManager, JOB_QUEUED, JOB_RUNNING, JOB_COMPLETED
+
+
+ROWS = [
+    {'*商品名': f'スチールラック{index}', '*変更前_商品の特徴BtoB': f'スチール製の{index + 2}段ラックです。'}
+    for index in range(6)
+]
+ROWS[2] = {'*商品名': 'マッサージ器', '*変更前_商品の特徴BtoB': '血行を促進します。'}
+
+
+def read_results(path):
+    """Return (商品名, 結論) of each row of a result workbook"""
+    sheet = openpyxl.load_workbook(path, read_only=True)['チェック結果']
+    rows = list(sheet.iter_rows(values_only=True))
+    name, conclusion = rows[0].index('*商品名'), rows[0].index('結論')
+    return [(row[name], row[conclusion]) for row in rows[1:]]
+
+
+def dead_pid():
+    """Return the pid of a process that has exited"""
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+@pytest.fixture
+def manager(app_module, tmp_path):
+    """A job manager whose runner is not started and that records the rows it checks"""
+    checked = []
+
+    def check_rows(indexed_rows, skill_name, on_result, mode):
+        def recorded():
+            for row_index, row in indexed_rows:
+                checked.append(row_index)
+                yield row_index, row
+        return app_module.check_rows_in_mode(recorded(), skill_name, on_result, mode)
+
+    manager = JobManager(tmp_path / 'jobs', check_rows=check_rows)
+    manager.checked = checked
+    return manager
+
+
+def submit(manager, path, skill_name):
+    with open(path, 'rb') as file:
+        return manager.submit(FileStorage(io.BytesIO(file.read())), 'input.xlsx', skill_name)
+
+
+def set_job(manager, job_id, status, runner_pid):
+    manager._conn.execute(
+        "UPDATE jobs SET status = ?, runner_pid = ? WHERE job_id = ?", (status, runner_pid, job_id)
+    )
+    manager._conn.commit()
+
+
+def test_job_runs_in_background(client, skill_name, write_sheet, tmp_path):
+    with open(write_sheet(ROWS), 'rb') as file:
+        response = client.post('/api/jobs', data={'file': (file, 'input.xlsx'), 'skill_name': skill_name})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    deadline = time.monotonic() + 30
+    while (status := client.get(f'/api/jobs/{job_id}').get_json())['status'] != JOB_COMPLETED:
+        assert status['status'] in (JOB_QUEUED, JOB_RUNNING)
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    assert status['rows_done'] == status['total_rows'] == len(ROWS)
+    assert status['counts'] == {'OK': 5, 'NG': 1}
+
+    response = client.get(f'/api/jobs/{job_id}/result')
+    assert response.status_code == 200
+    result_path = tmp_path / 'result.xlsx'
+    result_path.write_bytes(response.data)
+    assert read_results(result_path) == [
+        (row['*商品名'], 'NG' if index == 2 else 'OK') for index, row in enumerate(ROWS)
+    ]
+
+
+def test_unfinished_job_resumes_after_recorded_rows(manager, skill_name, write_sheet):
+    job_id = submit(manager, write_sheet(ROWS), skill_name)
+    # 前回のプロセスが2行を処理して終了した状態
+    set_job(manager, job_id, JOB_RUNNING, dead_pid())
+    manager._record_row(job_id, 0, '前回の結果', 'OK')
+    manager._record_row(job_id, 1, '前回の結果', 'OK')
+
+    assert manager._claim_next() == job_id
+    manager._process_job(job_id)
+
+    assert sorted(manager.checked) == [2, 3, 4, 5]
+    status = manager.get_status(job_id)
+    assert status['rows_done'] == len(ROWS)
+    assert status['status'] == JOB_COMPLETED
+    assert status['summary']['llm'] == 4
+
+    results = read_results(manager.get_result_path(job_id))
+    assert [name for name, _ in results] == [row['*商品名'] for row in ROWS]
+    assert [conclusion for _, conclusion in results] == ['OK', 'OK', 'NG', 'OK', 'OK', 'OK']
+
+
+def test_claim_skips_jobs_of_live_runners(manager, skill_name, write_sheet):
+    job_id = submit(manager, write_sheet(ROWS), skill_name)
+
+    set_job(manager, job_id, JOB_RUNNING, os.getppid())
+    assert not manager._claim(job_id)
+    assert manager._claim_next() is None
+
+    set_job(manager, job_id, JOB_COMPLETED, dead_pid())
+    assert not manager._claim(job_id)
+
+    set_job(manager, job_id, JOB_QUEUED, None)
+    assert manager._claim(job_id)
+    runner_pid, session_rows = manager._conn.execute(
+        "SELECT runner_pid, session_rows FROM jobs WHERE job_id = ?", (job_id,)
+    ).fetchone()
+    assert (manager.get_status(job_id)['status'], runner_pid, session_rows) == (JOB_RUNNING, os.getpid(), 0)
+
+
+def test_rows_without_results_are_written_as_errors(app_module, skill_name, write_sheet, tmp_path):
+    def check_rows(indexed_rows, skill_name, on_result, mode):
+        # 4行目の結果が保存されないまま終了した状態
+        def drop_row(row_index, result_text, conclusion):
+            if row_index != 3:
+                on_result(row_index, result_text, conclusion)
+        return app_module.check_rows(indexed_rows, skill_name, drop_row)
+
+    manager = JobManager(tmp_path / 'jobs', check_rows=check_rows)
+    job_id = submit(manager, write_sheet(ROWS), skill_name)
+    assert manager._claim(job_id)
+
+    manager._process_job(job_id)
+
+    results = read_results(manager.get_result_path(job_id))
+    assert [name for name, _ in results] == [row['*商品名'] for row in ROWS]
+    assert [conclusion for _, conclusion in results] == ['OK', 'OK', 'NG', 'ERROR', 'OK', 'OK']
+    status = manager.get_status(job_id)
+    assert status['counts'] == {'OK': 4, 'NG': 1, 'ERROR': 1}
+    assert status['rows_done'] == len(ROWS)
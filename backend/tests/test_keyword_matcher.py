@@ -0,0 +1,81 @@
+"""Tests for keyword detection (normalization, 読み, exclusions and longest match)"""
+
+from pathlib import Path
+
+import pytest
+
+from keyword_matcher import KeywordMatcher
+from skill_manager import SkillManager, reading_aliases
+
+SKILLS_DIR = Path(__file__).resolve().parent.parent / "skills"
+
+
+@pytest.fixture(scope='module')
+def detect():
+    skill_manager = SkillManager(SKILLS_DIR, use_bundles=False)
+    skill_manager.load_all_skills()
+    skill_name = next(iter(skill_manager.skills))
+    return lambda text: list(skill_manager.find_keyword_matches(skill_name, text))
+
+
+def test_normalizes_width_kana_and_small_vowels():
+    matcher = KeywordMatcher(['アトピー', 'ウイルス'])
+
+    assert list(matcher.find_all('ｱﾄﾋﾟｰ対策、あとぴー、ウィルス')) == ['アトピー', 'ウイルス']
+
+
+def test_exclusions_and_longest_match():
+    matcher = KeywordMatcher(
+        ['病', '血圧', '高血圧'], exclusions={'病': ['病院']}, longest_match=True
+    )
+
+    assert matcher.find_all('病院で測る高血圧') == {'高血圧': [(5, 8)]}
+
+
+def test_reading_matches_only_a_whole_hiragana_word():
+    matcher = KeywordMatcher(['血行'], aliases={'血行': ['けっこう']})
+
+    assert list(matcher.find_all('けっこう促進')) == ['血行']
+    assert list(matcher.find_all('（けっこう）')) == ['血行']
+    assert not matcher.find_all('けっこうな量です')
+    assert not matcher.find_all('味もけっこう')
+    assert not matcher.find_all('ケッコウ促進')
+    assert not matcher.find_all('ｹｯｺｳ促進')
+
+
+def test_shared_readings_are_not_used():
+    aliases = reading_aliases({
+        '血圧': {'読み': 'こうけつあつ'},
+        '高血圧': {'読み': 'こうけつあつ'},
+        'お腹': {'読み': 'おなか'},
+        'おなか': {'読み': 'おなか'},
+        '血行': {'読み': 'けっこう'},
+        '蚊': {'読み': 'か'}
+    })
+
+    assert aliases == {'血行': ['けっこう']}
+
+
+@pytest.mark.parametrize('text', [
+    'けっこうな量が入っています',
+    'ケッコウ',
+    'あんしんしてお使いいただけます',
+    'イチョウ並木をイメージしたデザイン',
+    'ごかんそうをお寄せください',
+    'たいさくもばっちり',
+    'たいけんしてみてください',
+    'しりょくけんさ用の表',
+    'キョウソウ用のゼッケン',
+])
+def test_ordinary_kana_copy_does_not_detect_keywords(detect, text):
+    assert detect(text) == []
+
+
+def test_kana_blood_pressure_does_not_report_blood_pressure(detect):
+    assert '血圧' not in detect('こうけつあつ')
+    assert '血圧' not in detect('高けつあつ')
+
+
+def test_reading_of_a_keyword_is_detected(detect):
+    assert '血行' in detect('けっこう促進')
+    assert '胃腸' in detect('いちょう薬')
@@ -0,0 +1,92 @@
+"""Tests for the Prometheus metrics shared across worker processes"""
+
+import json
+import os
+import multiprocessing
+
+import pytest
+
+from metrics import Registry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = Registry()
+    registry.rows = registry.counter('rows_total', 'Rows', ['conclusion'])
+    registry.seconds = registry.histogram('seconds', 'Seconds', buckets=(1, 10))
+    registry.limit = registry.gauge('limit', 'Limit')
+    registry.shared_dir = tmp_path / 'metrics'
+    return registry
+
+
+def run_worker(registry):
+    """Record values in a forked worker, share them and exit"""
+    registry.rows.inc(3, conclusion='OK')
+    registry.seconds.observe(5)
+    registry.limit.set(4)
+    registry.share(registry.shared_dir, interval=3600)
+
+
+def test_single_process_render(registry):
+    registry.rows.inc(conclusion='NG')
+    registry.limit.set(8)
+
+    text = registry.render()
+
+    assert 'rows_total{conclusion="NG"} 1' in text
+    assert 'limit 8' in text
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_render_sums_every_worker(registry):
+    registry.share(registry.shared_dir, interval=3600)
+    worker = multiprocessing.get_context('fork').Process(target=run_worker, args=(registry,))
+    worker.start()
+    worker.join()
+    registry.rows.inc(2, conclusion='OK')
+    registry.seconds.observe(0.5)
+    registry.limit.set(8)
+
+    text = registry.render()
+
+    assert 'rows_total{conclusion="OK"} 5' in text
+    assert 'seconds_count 2' in text
+    assert 'seconds_bucket{le="1"} 1' in text
+    assert 'seconds_bucket{le="10"} 2' in text
+    assert 'seconds_sum 5.5' in text
+    # 停止したワーカーのゲージは含めない
+    assert f'limit{{pid="{os.getpid()}"}} 8' in text
+    assert f'pid="{worker.pid}"' not in text
+
+
+def test_gauges_of_running_workers_are_labeled_by_pid(registry):
+    registry.share(registry.shared_dir, interval=3600)
+    other_pid = os.getppid()
+    (registry.shared_dir / f"{other_pid}.json").write_text(json.dumps({
+        'rows_total': [[['OK'], 7]],
+        'limit': [[[], 2]]
+    }))
+    registry.limit.set(8)
+
+    text = registry.render()
+
+    assert 'rows_total{conclusion="OK"} 7' in text
+    assert f'limit{{pid="{other_pid}"}} 2' in text
+    assert f'limit{{pid="{os.getpid()}"}} 8' in text
+
+
+def test_clear_shared_removes_earlier_runs(registry):
+    registry.share(registry.shared_dir, interval=3600)
+
+    registry.clear_shared(registry.shared_dir)
+
+    assert not list(registry.shared_dir.glob('*.json'))
+
+
+def test_metrics_endpoint(client):
+    response = client.get('/api/metrics')
+
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert '# TYPE keywords_checker_rows_total counter' in text
+    assert f'keywords_checker_llm_concurrency_limit{{pid="{os.getpid()}"}}' in text
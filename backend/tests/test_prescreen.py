@@ -0,0 +1,56 @@
+"""Tests for the pre-screen deciding rows without the LLM"""
+
+import pytest
+
+
+ROWS = [
+    # キーワードも注意表現も含まない → 事前判定でOK
+    {'*商品名': 'スチールラック', '*変更前_商品の特徴BtoB': 'スチール製の5段ラックです。棚板の高さを変えられます。'},
+    # 注意表現（効果）を含む → LLM
+    {'*商品名': '保湿クリーム', '*変更前_商品の特徴BtoB': '保湿効果のあるクリームです。'},
+    # チェック用キーワード（血行）を含む → LLM
+    {'*商品名': 'マッサージ器', '*変更前_商品の特徴BtoB': '血行を促進します。'},
+    # 商品名のみ → LLMに送らない
+    {'*商品名': 'ボールペン'},
+]
+
+
+def run(app_module, skill_name):
+    results = {}
+    decisions = app_module.check_rows(
+        enumerate(ROWS), skill_name,
+        lambda row_index, result_text, conclusion: results.__setitem__(row_index, (result_text, conclusion))
+    )
+    return decisions, results
+
+
+def test_prescreen_is_disabled_by_default(app_module, skill_name):
+    assert not app_module.PRESCREEN_ENABLED
+
+    decisions, results = run(app_module, skill_name)
+
+    assert decisions.get('llm') == 3
+    assert all('事前判定' not in result_text for result_text, _ in results.values())
+
+
+def test_prescreen_auto_ok_rows(app_module, skill_name, monkeypatch):
+    monkeypatch.setattr(app_module, 'PRESCREEN_ENABLED', True)
+
+    decisions, results = run(app_module, skill_name)
+
+    auto_ok = [
+        row_index for row_index, (result_text, conclusion) in results.items()
+        if '事前判定' in result_text
+    ]
+    assert auto_ok == [0]
+    assert results[0][1] == 'OK'
+    assert decisions.get('no_keywords') == 1
+    assert decisions.get('llm') == 2
+    assert results[3][1] == 'NO_DATA'
+
+
+@pytest.mark.parametrize('copy', ['保湿効果のあるクリームです。', '血行を促進します。'])
+def test_prescreen_sends_risky_rows_to_llm(app_module, skill_name, copy):
+    keyword_matches = app_module.find_keywords(skill_name, copy)
+
+    assert app_module.skill_manager.prescreen(skill_name, copy, keyword_matches, {}) is None
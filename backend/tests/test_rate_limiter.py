@@ -0,0 +1,238 @@
+"""Tests for the client-side LLM request scheduler"""
+
+import threading
+import types
+
+import pytest
+
+import rate_limiter
+from rate_limiter import (
+    AdaptiveConcurrency, LLMScheduler, TokenBucket, retry_after_seconds, retry_reason,
+    REASON_CONNECTION, REASON_RATE_LIMIT, REASON_SERVER_ERROR, REASON_TIMEOUT
+)
+
+
+class FakeClock:
+    """Replaces time.monotonic and time.sleep of rate_limiter; sleeping advances the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, 'sleep', clock.sleep)
+    return clock
+
+
+class APIError(Exception):
+    def __init__(self, status_code=None, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(headers=headers or {})
+
+
+class APITimeoutError(Exception):
+    pass
+
+
+def test_bucket_waits_for_refill(clock):
+    bucket = TokenBucket(60)
+
+    for _ in range(60):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire(2)
+    assert clock.sleeps == [pytest.approx(2.0)]
+
+
+def test_bucket_consume_goes_negative(clock):
+    bucket = TokenBucket(600)
+    bucket.acquire(600)
+
+    bucket.consume(300)
+    bucket.acquire(100)
+
+    # 残高 -300 から 100 になるまで 400 トークン分（1秒あたり10）待つ
+    assert sum(clock.sleeps) == pytest.approx(40.0)
+
+
+def test_bucket_lets_oversized_requests_through_when_full(clock):
+    bucket = TokenBucket(60)
+
+    bucket.acquire(1000)
+
+    assert clock.sleeps == []
+
+
+def test_overload_halves_the_limit_once_per_cooldown(clock):
+    concurrency = AdaptiveConcurrency(8, cooldown=5.0)
+
+    concurrency.on_overload()
+    concurrency.on_overload()
+    assert concurrency.limit == 4
+
+    clock.now += 5.0
+    concurrency.on_overload()
+    assert concurrency.limit == 2
+
+    for _ in range(3):
+        clock.now += 5.0
+        concurrency.on_overload()
+    assert concurrency.limit == 1
+
+
+def test_successes_recover_the_limit(clock):
+    concurrency = AdaptiveConcurrency(8)
+    concurrency.on_overload()
+
+    concurrency.on_success()
+    assert concurrency.limit == pytest.approx(4.25)
+
+    for _ in range(100):
+        concurrency.on_success()
+    assert concurrency.limit == 8
+
+
+def test_acquire_blocks_at_the_limit():
+    concurrency = AdaptiveConcurrency(1)
+    concurrency.acquire()
+    acquired = threading.Event()
+
+    thread = threading.Thread(target=lambda: (concurrency.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.1)
+
+    concurrency.release()
+    assert acquired.wait(5)
+    thread.join()
+
+
+@pytest.mark.parametrize('error, reason', [
+    (APIError(429), REASON_RATE_LIMIT),
+    (APIError(500), REASON_SERVER_ERROR),
+    (APIError(503), REASON_SERVER_ERROR),
+    (TimeoutError(), REASON_TIMEOUT),
+    (APITimeoutError(), REASON_TIMEOUT),
+    (ConnectionError(), REASON_CONNECTION),
+    (APIError(400), None),
+    (ValueError('bad request'), None),
+])
+def test_retry_reason(error, reason):
+    assert retry_reason(error) == reason
+
+
+def test_retry_after_header():
+    assert retry_after_seconds(APIError(429, {'retry-after': '7'})) == 7.0
+    assert retry_after_seconds(APIError(429, {'retry-after': 'soon'})) is None
+    assert retry_after_seconds(APIError(429)) is None
+
+
+def test_call_honours_retry_after(clock):
+    retries = []
+    scheduler = LLMScheduler(4, backoff_max=60.0, on_retry=retries.append)
+    responses = iter([APIError(429, {'retry-after': '7'}), APIError(503, {'retry-after': '120'}), 'answer'])
+
+    def request():
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert scheduler.call(request) == 'answer'
+    # Retry-After に従い、backoff_max を上限とする
+    assert clock.sleeps == [7.0, 60.0]
+    assert retries == [REASON_RATE_LIMIT, REASON_SERVER_ERROR]
+    assert scheduler.concurrency.in_flight == 0
+
+
+def test_call_gives_up_after_max_attempts(clock):
+    scheduler = LLMScheduler(4, max_attempts=3, backoff_base=1.0)
+    calls = []
+
+    def request():
+        calls.append(1)
+        raise APIError(429)
+
+    with pytest.raises(APIError):
+        scheduler.call(request)
+    assert len(calls) == 3
+    assert len(clock.sleeps) == 2
+    assert scheduler.concurrency.limit == 2
+    assert scheduler.concurrency.in_flight == 0
+
+
+def test_call_does_not_retry_other_errors(clock):
+    scheduler = LLMScheduler(4)
+    calls = []
+
+    def request():
+        calls.append(1)
+        raise ValueError('bad request')
+
+    with pytest.raises(ValueError):
+        scheduler.call(request)
+    assert len(calls) == 1
+    assert scheduler.concurrency.limit == 4
+
+
+def test_call_charges_the_completion_tokens(clock):
+    scheduler = LLMScheduler(4, tokens_per_minute=6000)
+
+    scheduler.call(lambda: 'answer', prompt_tokens=1000, used_tokens=lambda response: 1500)
+
+    assert scheduler.tokens._tokens == pytest.approx(6000 - 1500)
+
+
+def chunks(usage):
+    yield types.SimpleNamespace(text='a', usage=None)
+    yield types.SimpleNamespace(text='b', usage=None)
+    yield types.SimpleNamespace(text='', usage=usage)
+
+
+def stream_usage(chunk):
+    return chunk.usage
+
+
+def test_stream_holds_the_slot_until_read(clock):
+    scheduler = LLMScheduler(4, tokens_per_minute=6000)
+
+    stream = scheduler.call(lambda: chunks(1500), prompt_tokens=1000, used_tokens=stream_usage, stream=True)
+    assert scheduler.concurrency.in_flight == 1
+    assert scheduler.tokens._tokens == pytest.approx(5000)
+
+    assert [chunk.text for chunk in stream] == ['a', 'b', '']
+    assert scheduler.concurrency.in_flight == 0
+    assert scheduler.tokens._tokens == pytest.approx(6000 - 1500)
+
+
+def test_stream_closed_early_releases_the_slot(clock):
+    scheduler = LLMScheduler(4, tokens_per_minute=6000)
+
+    stream = scheduler.call(lambda: chunks(1500), prompt_tokens=1000, used_tokens=stream_usage, stream=True)
+    for chunk in stream:
+        break
+    stream.close()
+
+    assert scheduler.concurrency.in_flight == 0
+    # 使用量を受信していないため、確保したプロンプト分だけが残る
+    assert scheduler.tokens._tokens == pytest.approx(5000)
+
+
+def test_rate_limits_are_split_across_processes(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'LLM_RATE_LIMIT_PROCESSES', 3)
+
+    assert app_module.per_process_limit(600) == 200
+    assert app_module.per_process_limit(2) == 1
+    assert app_module.per_process_limit(0) == 0
@@ -0,0 +1,91 @@
+"""Tests for checking rows again after a transient LLM error"""
+
+import threading
+
+import pytest
+
+from excel_io import CheckSheetReader, ResultWorkbookWriter
+
+
+CHUNK_SIZE = 4
+ROWS = [
+    {'*商品名': f'スチールラック{index}', '*変更前_商品の特徴BtoB': f'スチール製の{index + 2}段ラックです。'}
+    for index in range(16)
+]
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+@pytest.fixture
+def rate_limited_once(app_module, monkeypatch):
+    """Make the first LLM call for row 1 fail with a 429 (as when the scheduler's attempts run out)"""
+    monkeypatch.setattr(app_module, 'result_cache', None)
+    monkeypatch.setattr(app_module, 'CHECK_REQUEUE_PASSES', 1)
+    call_llm = app_module.call_llm
+    failed = []
+    lock = threading.Lock()
+
+    def flaky_call_llm(system_prompt, user_message, **kwargs):
+        with lock:
+            fail = '3段ラック' in user_message and not failed
+            if fail:
+                failed.append(user_message)
+        if fail:
+            raise RateLimited('429 Too Many Requests')
+        return call_llm(system_prompt, user_message, **kwargs)
+
+    monkeypatch.setattr(app_module, 'call_llm', flaky_call_llm)
+    return failed
+
+
+def test_failed_row_is_retried_within_its_chunk(app_module, skill_name, rate_limited_once):
+    read = 0
+    delivered = {}
+
+    def indexed_rows():
+        nonlocal read
+        for row_index, row in enumerate(ROWS):
+            read += 1
+            yield row_index, row
+
+    def on_result(row_index, result_text, conclusion):
+        delivered[row_index] = (conclusion, read)
+
+    app_module.check_rows(indexed_rows(), skill_name, on_result, chunk_size=CHUNK_SIZE)
+
+    assert rate_limited_once
+    assert delivered[1][0] == 'OK'
+    # 再チェックの結果は次のチャンクを読み込む前に届く
+    assert delivered[1][1] == CHUNK_SIZE
+
+
+def test_workbook_buffers_at_most_one_chunk(app_module, skill_name, write_sheet, tmp_path, monkeypatch,
+                                            rate_limited_once):
+    monkeypatch.setattr(app_module, 'CHECK_CHUNK_SIZE', CHUNK_SIZE)
+    appended = 0
+
+    class CountingWriter(ResultWorkbookWriter):
+        def append(self, row, result_text, conclusion):
+            nonlocal appended
+            appended += 1
+            super().append(row, result_text, conclusion)
+
+    monkeypatch.setattr(app_module, 'ResultWorkbookWriter', CountingWriter)
+    reader = CheckSheetReader(write_sheet(ROWS))
+    iter_rows = reader.iter_rows
+    buffered = []
+
+    def counted_rows():
+        for read, row in enumerate(iter_rows(), start=1):
+            buffered.append(read - appended)
+            yield row
+
+    reader.iter_rows = counted_rows
+
+    total_rows = app_module.check_workbook(reader, skill_name, tmp_path / 'result.xlsx')
+
+    assert rate_limited_once
+    assert total_rows == appended == len(ROWS)
+    assert max(buffered) <= CHUNK_SIZE
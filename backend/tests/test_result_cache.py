@@ -0,0 +1,97 @@
+"""Tests for the on-disk result cache"""
+
+import result_cache as result_cache_module
+from result_cache import ResultCache
+
+
+def statements(cache):
+    """Record the SQL statements run on the cache's connection"""
+    executed = []
+    cache._conn.set_trace_callback(executed.append)
+    return executed
+
+
+def test_put_and_get(tmp_path):
+    cache = ResultCache(tmp_path / 'results.sqlite3')
+    cache.put('key', 'skill', 'result', 'OK', {'total_tokens': 10})
+
+    assert cache.get('key') == {'result_text': 'result', 'conclusion': 'OK', 'usage': {'total_tokens': 10}}
+    assert cache.get('missing') is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_put_counts_rows_once_per_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache_module, 'EVICTION_BATCH_RATIO', 0.1)
+    cache = ResultCache(tmp_path / 'results.sqlite3', max_entries=100)
+    executed = statements(cache)
+
+    for i in range(50):
+        cache.put(f'key{i}', 'skill', 'result', 'OK', {})
+    cache.put('key0', 'skill', 'replaced', 'NG', {})
+
+    assert len([sql for sql in executed if 'COUNT(*)' in sql]) == 5
+    assert cache.stats()['entries'] == 50
+
+
+def test_hits_do_not_write_on_every_lookup(tmp_path):
+    cache = ResultCache(tmp_path / 'results.sqlite3')
+    cache.put('key', 'skill', 'result', 'OK', {})
+    executed = statements(cache)
+
+    for _ in range(10):
+        assert cache.get('key')
+
+    assert not [sql for sql in executed if sql.startswith('UPDATE')]
+
+
+def test_eviction_keeps_recently_read_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache_module, 'EVICTION_BATCH_RATIO', 0.1)
+    cache = ResultCache(tmp_path / 'results.sqlite3', max_entries=10)
+    for i in range(10):
+        cache.put(f'key{i}', 'skill', 'result', 'OK', {})
+
+    # 最も古いエントリを読むと、書き込みが遅延されていても削除対象から外れる
+    assert cache.get('key0')
+    cache.put('key10', 'skill', 'result', 'OK', {})
+
+    stats = cache.stats()
+    assert stats['entries'] == 9
+    assert stats['evictions'] == 2
+    assert cache.get('key0')
+    assert cache.get('key1') is None
+    assert cache.get('key2') is None
+    assert cache.get('key3')
+
+
+def test_entries_follow_other_connections(tmp_path):
+    path = tmp_path / 'results.sqlite3'
+    cache = ResultCache(path, max_entries=5)
+    other = ResultCache(path, max_entries=5)
+    for i in range(5):
+        other.put(f'other{i}', 'skill', 'result', 'OK', {})
+
+    cache.put('key', 'skill', 'result', 'OK', {})
+
+    assert cache._count() <= 5
+    assert cache.get('key')
+
+
+def test_skill_change_invalidates_entries(tmp_path):
+    cache = ResultCache(tmp_path / 'results.sqlite3')
+    cache.sync_skill_fingerprint('skill', 'v1')
+    cache.put('key', 'skill', 'result', 'OK', {})
+
+    assert cache.sync_skill_fingerprint('skill', 'v1') == 0
+    assert cache.sync_skill_fingerprint('skill', 'v2') == 1
+    assert cache.get('key') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResultCache(tmp_path / 'results.sqlite3', ttl_seconds=1)
+    cache.put('key', 'skill', 'result', 'OK', {})
+    cache._conn.execute("UPDATE results SET created_at = created_at - 10")
+
+    assert cache.get('key') is None
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,99 @@
+"""Tests for the offline verdicts of fast mode"""
+
+import logging
+
+import pytest
+
+from rule_engine import RuleEngine, VERDICT_NG, VERDICT_OK, VERDICT_REVIEW
+
+
+RULES = {
+    'category_columns': ['薬事区分', '管理カテゴリー中', '管理カテゴリー大'],
+    'product_classes': ['医薬品', '化粧品', '雑品'],
+    'category_map': {'第2類医薬品': '医薬品', 'マスク': '雑品'},
+    'ng_judgements': ['使用禁止'],
+    'ok_judgements': ['薬事区分を確認'],
+}
+METADATA = {
+    '血行': {'判断': '薬事区分を確認', 'OKの場合': {'医薬品'}, 'NGの場合': {'化粧品', '雑品'}},
+    '治る': {'判断': '使用禁止', 'OKの場合': set(), 'NGの場合': set()},
+    '効果': {'判断': '前後関係を確認', 'OKの場合': {'医薬品'}, 'NGの場合': set()},
+}
+
+
+@pytest.fixture
+def engine():
+    return RuleEngine(RULES, METADATA, risk_patterns=['No\\.?1'])
+
+
+@pytest.mark.parametrize('keyword, product_class, verdict', [
+    ('治る', '医薬品', VERDICT_NG),
+    ('血行', None, VERDICT_REVIEW),
+    ('血行', '雑品', VERDICT_NG),
+    ('血行', '医薬品', VERDICT_OK),
+    ('効果', '医薬品', VERDICT_REVIEW),
+    ('未登録', '医薬品', VERDICT_REVIEW),
+])
+def test_judge_keyword(engine, keyword, product_class, verdict):
+    assert engine.judge_keyword(keyword, product_class)[0] == verdict
+
+
+def test_product_class_tries_the_columns_in_order(engine):
+    assert engine.product_class({'管理カテゴリー中': ' マスク ', '管理カテゴリー大': '医薬品'}) == ('雑品', '管理カテゴリー中')
+    assert engine.product_class({'管理カテゴリー中': '衛生用品', '管理カテゴリー大': '第2類医薬品'}) == ('医薬品', '管理カテゴリー大')
+    assert engine.product_class({'薬事区分': '化粧品'}) == ('化粧品', '薬事区分')
+    assert engine.product_class({'管理カテゴリー中': 12, '管理カテゴリー大': ''}) == (None, None)
+
+
+@pytest.mark.parametrize('row', [None, 'マスク', ['マスク'], 3])
+def test_product_class_of_a_row_that_is_not_a_mapping(engine, row):
+    assert engine.product_class(row) == (None, None)
+
+
+def test_evaluate(engine):
+    assert engine.evaluate('血行を促進', ['血行'], {'管理カテゴリー中': 'マスク'})['conclusion'] == VERDICT_NG
+    assert engine.evaluate('血行を促進', ['血行'], {'薬事区分': '医薬品'})['conclusion'] == VERDICT_OK
+    assert engine.evaluate('人気No.1', [], {'薬事区分': '医薬品'})['conclusion'] == VERDICT_REVIEW
+
+    evaluation = engine.evaluate('血行を促進', ['血行', '治る'], 'マスク')
+    assert evaluation['conclusion'] == VERDICT_NG
+    assert evaluation['product_class'] is None
+    assert [item['verdict'] for item in evaluation['verdicts']] == [VERDICT_NG, VERDICT_REVIEW]
+
+
+def test_malformed_rules_are_ignored_at_load(caplog):
+    rules = {
+        'category_columns': '管理カテゴリー中',
+        'product_classes': ['医薬品', None, {'雑品': 1}],
+        'category_map': ['マスク', '雑品'],
+        'ng_judgements': {'使用禁止': True},
+        'ok_judgements': None,
+    }
+
+    with caplog.at_level(logging.WARNING, logger='rule_engine'):
+        engine = RuleEngine(rules, METADATA)
+
+    assert engine.category_columns == []
+    assert engine.product_classes == {'医薬品'}
+    assert engine.category_map == {}
+    assert engine.ng_judgements == set()
+    assert engine.ok_judgements == set()
+    for key in ('category_columns', 'product_classes', 'category_map', 'ng_judgements'):
+        assert key in caplog.text
+    assert 'ok_judgements' not in caplog.text
+    assert engine.evaluate('血行を促進', ['血行'], {'管理カテゴリー中': 'マスク'})['conclusion'] == VERDICT_REVIEW
+
+
+def test_category_map_entries_without_a_class_are_ignored():
+    rules = dict(RULES, category_map={'マスク': '雑品', 'サプリ': None, '衛生用品': ['雑品']})
+
+    engine = RuleEngine(rules, METADATA)
+
+    assert engine.category_map == {'マスク': '雑品'}
+
+
+def test_rules_that_are_not_a_mapping(caplog):
+    engine = RuleEngine(['category_columns'], METADATA)
+
+    assert 'fast_rules' in caplog.text
+    assert engine.evaluate('血行を促進', ['血行'], {'薬事区分': '医薬品'})['conclusion'] == VERDICT_REVIEW
@@ -0,0 +1,108 @@
+"""Tests for parallel checks keeping the row order and the per-process worker resources"""
+
+import os
+import time
+import threading
+import multiprocessing
+
+import openpyxl
+import pytest
+
+from excel_io import CheckSheetReader
+
+
+ROWS = [
+    {'*商品名': f'スチールラック{index}', '*変更前_商品の特徴BtoB': f'スチール製の{index + 2}段ラックです。'}
+    if index % 3 else
+    {'*商品名': f'マッサージ器{index}', '*変更前_商品の特徴BtoB': f'血行を促進します。{index + 1}段階で調節できます。'}
+    for index in range(12)
+]
+EXPECTED = [(row['*商品名'], 'OK' if index % 3 else 'NG') for index, row in enumerate(ROWS)]
+
+
+def read_results(path):
+    """Return (商品名, 結論) of each row of a result workbook"""
+    sheet = openpyxl.load_workbook(path, read_only=True)['チェック結果']
+    rows = list(sheet.iter_rows(values_only=True))
+    name, conclusion = rows[0].index('*商品名'), rows[0].index('結論')
+    return [(row[name], row[conclusion]) for row in rows[1:]]
+
+
+@pytest.fixture
+def reversed_completion(app_module, monkeypatch):
+    """Make later rows finish first, and record the order in which rows finish"""
+    monkeypatch.setattr(app_module, 'result_cache', None)
+    monkeypatch.setattr(app_module, 'CHECK_DEDUP_ENABLED', False)
+    check_batch = app_module.check_batch
+    finished = []
+    lock = threading.Lock()
+
+    def delayed_check_batch(batch, skill_name):
+        time.sleep(0.02 * (len(ROWS) - batch[0]['row_index']))
+        results = check_batch(batch, skill_name)
+        with lock:
+            finished.extend(row_index for row_index, _, _ in results)
+        return results
+
+    monkeypatch.setattr(app_module, 'check_batch', delayed_check_batch)
+    return finished
+
+
+def test_workbook_keeps_row_order(app_module, skill_name, write_sheet, tmp_path, reversed_completion):
+    output_path = tmp_path / 'result.xlsx'
+
+    total_rows = app_module.check_workbook(CheckSheetReader(write_sheet(ROWS)), skill_name, output_path)
+
+    assert total_rows == len(ROWS)
+    assert reversed_completion != sorted(reversed_completion)
+    assert read_results(output_path) == EXPECTED
+
+
+def test_check_excel_endpoint_keeps_row_order(client, skill_name, write_sheet, tmp_path, reversed_completion):
+    with open(write_sheet(ROWS), 'rb') as file:
+        response = client.post('/api/check-excel', data={'file': (file, 'input.xlsx'), 'skill_name': skill_name})
+
+    assert response.status_code == 200
+    result_path = tmp_path / 'result.xlsx'
+    result_path.write_bytes(response.data)
+    assert read_results(result_path) == EXPECTED
+
+
+def test_start_worker_runs_once_per_process(app_module):
+    import litellm
+
+    session = litellm.client_session
+    app_module.start_worker()
+
+    assert litellm.client_session is session
+
+
+def run_forked_worker(app_module, skill_name, parent_session_id, connection):
+    """Start the worker resources in a forked process (like gunicorn's post_fork) and check rows"""
+    import litellm
+
+    app_module.start_worker()
+    results = {}
+    app_module.check_rows(
+        enumerate(ROWS[:3]), skill_name,
+        lambda row_index, result_text, conclusion: results.__setitem__(row_index, conclusion)
+    )
+    connection.send((id(litellm.client_session) != parent_session_id, results))
+    connection.close()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_worker_opens_its_own_pool(app_module, skill_name):
+    import litellm
+
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    worker = multiprocessing.get_context('fork').Process(
+        target=run_forked_worker, args=(app_module, skill_name, id(litellm.client_session), sender)
+    )
+    worker.start()
+    new_pool, results = receiver.recv()
+    worker.join(timeout=30)
+
+    assert worker.exitcode == 0
+    assert new_pool
+    assert results == {0: 'NG', 1: 'OK', 2: 'OK'}
@@ -0,0 +1,50 @@
+"""Tests for compiled skill bundles"""
+
+from pathlib import Path
+
+import pytest
+
+from skill_bundle import FORMAT_VERSION, SkillBundle, write_bundle
+from skill_manager import SkillManager
+
+SKILLS_DIR = Path(__file__).resolve().parent.parent / "skills"
+
+TEXTS = [
+    '高血圧の方にも。血行促進、病院でも使われています',
+    'ｱﾄﾋﾟｰ対策・けっこう促進',
+    'あんしんしてお使いいただけます',
+]
+
+
+@pytest.fixture(scope='module')
+def source_skill():
+    skill_manager = SkillManager(SKILLS_DIR, use_bundles=False)
+    skill_manager.load_all_skills()
+    return skill_manager, next(iter(skill_manager.skills.values()))
+
+
+def test_bundle_restores_the_skill(source_skill, tmp_path):
+    skill_manager, skill = source_skill
+    bundle_path = tmp_path / 'skill.bundle'
+    write_bundle(skill, bundle_path)
+
+    loaded = skill_manager.load_skill_bundle(bundle_path)
+
+    assert SkillBundle(bundle_path).header['format_version'] == FORMAT_VERSION
+    assert loaded['source'] == 'bundle'
+    assert loaded['fingerprint'] == skill['fingerprint']
+    assert loaded['content'] == skill['content']
+    assert dict(loaded['references']) == dict(skill['references'])
+    assert loaded['keyword_metadata'] == skill['keyword_metadata']
+
+
+def test_bundle_stores_the_built_automaton(source_skill, tmp_path):
+    _, skill = source_skill
+    bundle_path = tmp_path / 'skill.bundle'
+    write_bundle(skill, bundle_path)
+
+    matcher = SkillBundle(bundle_path).keyword_matcher()
+
+    assert matcher.to_tables() == skill['keyword_matcher'].to_tables()
+    for text in TEXTS:
+        assert matcher.find_all(text) == skill['keyword_matcher'].find_all(text)
@@ -0,0 +1,118 @@
+"""Tests for skill loading, versioning and dynamic prompts"""
+
+import shutil
+from pathlib import Path
+
+import pytest
+
+from skill_manager import SkillManager, SkillVersion
+
+SKILLS_DIR = Path(__file__).resolve().parent.parent / "skills"
+
+
+@pytest.fixture
+def skills_dir(tmp_path):
+    target = tmp_path / "skills"
+    shutil.copytree(SKILLS_DIR, target, ignore=shutil.ignore_patterns('skill.bundle*'))
+    return target
+
+
+def load(skills_dir):
+    skill_manager = SkillManager(skills_dir, use_bundles=False)
+    skill_manager.load_all_skills()
+    return skill_manager, next(iter(skill_manager.skills.values()))
+
+
+@pytest.mark.parametrize('rules_name', ['prescreen.yaml', 'keyword_rules.yaml', 'fast_rules.yaml'])
+def test_fingerprint_covers_rules_files(skills_dir, rules_name):
+    skill_manager, skill = load(skills_dir)
+    rules_file = skill['path'] / rules_name
+    rules_file.write_text(rules_file.read_text(encoding='utf-8') + "\n# changed\n", encoding='utf-8')
+
+    _, reloaded = load(skills_dir)
+
+    assert reloaded['fingerprint'] != skill['fingerprint']
+
+
+def test_reload_replaces_memoized_prompts(skills_dir):
+    skill_manager, skill = load(skills_dir)
+    before = skill_manager.build_dynamic_system_prompt(skill['name'], ['血行'])
+
+    skill_file = skill['path'] / "SKILL.md"
+    skill_file.write_text(skill_file.read_text(encoding='utf-8') + "\n追加のルール\n", encoding='utf-8')
+    assert skill_manager.reload_changed() == [skill['name']]
+    after = skill_manager.build_dynamic_system_prompt(skill['name'], ['血行'])
+
+    assert '追加のルール' not in before
+    assert '追加のルール' in after
+
+
+def test_prompt_is_assembled_from_the_version_it_is_memoized_for(skills_dir):
+    skill_manager, skill = load(skills_dir)
+    new_skill = dict(skill, content=skill['content'] + "\n新しいルール", fingerprint='new')
+
+    # 旧バージョンを取得した直後に再読み込みで差し替わっても、旧バージョンの内容で組み立てる
+    skill_manager.skills = {skill['name']: new_skill}
+    prompt = skill_manager._dynamic_prompt_cache(SkillVersion(skill), frozenset(['血行']))
+
+    assert '新しいルール' not in prompt
+    assert '新しいルール' in skill_manager.build_dynamic_system_prompt(skill['name'], ['血行'])
+
+
+class CountingTokenizer:
+    """Token counter recording its calls (about two characters per token by default)"""
+
+    def __init__(self, tokens_per_char=0.5):
+        self.calls = 0
+        self.tokens_per_char = tokens_per_char
+
+    def __call__(self, text):
+        self.calls += 1
+        return int(len(text) * self.tokens_per_char)
+
+
+def budget_manager(skills_dir, budget, tokens_per_char=0.5):
+    tokenizer = CountingTokenizer(tokens_per_char)
+    skill_manager = SkillManager(
+        skills_dir, use_bundles=False, token_counter=tokenizer, prompt_token_budget=budget
+    )
+    skill_manager.load_all_skills()
+    return skill_manager, next(iter(skill_manager.skills)), tokenizer
+
+
+def test_prompt_within_estimated_budget_is_not_tokenized(skills_dir):
+    skill_manager, skill_name, tokenizer = budget_manager(skills_dir, 1000000)
+
+    prompt = skill_manager.build_dynamic_system_prompt(skill_name, ['血行', '血圧', '高血圧'])
+
+    assert tokenizer.calls == 0
+    assert '## ガイドライン等の出典' in prompt
+
+
+def test_prompt_near_the_budget_is_tokenized_and_trimmed(skills_dir):
+    keywords = ['血行', '血圧', '高血圧']
+    skill_manager, skill_name, tokenizer = budget_manager(skills_dir, 0)
+    full = skill_manager.build_dynamic_system_prompt(skill_name, keywords)
+
+    # 文字数では予算を超えるが、トークン数（文字数の半分）では出典を省略すれば収まる
+    skill_manager, skill_name, tokenizer = budget_manager(skills_dir, len(full) // 2 - 20)
+    prompt = skill_manager.build_dynamic_system_prompt(skill_name, keywords)
+
+    assert tokenizer.calls > 0
+    assert '## ガイドライン等の出典' not in prompt
+    assert '## 表示例' in prompt
+    assert len(prompt) // 2 <= skill_manager.prompt_token_budget
+
+
+def test_prompt_within_the_budget_by_characters_is_still_tokenized(skills_dir):
+    keywords = ['血行', '血圧', '高血圧']
+    skill_manager, skill_name, tokenizer = budget_manager(skills_dir, 0)
+    full = skill_manager.build_dynamic_system_prompt(skill_name, keywords)
+
+    # 文字数は予算内だが、1文字が2トークンになるテキストでは予算を超える
+    skill_manager, skill_name, tokenizer = budget_manager(skills_dir, len(full) + 10, tokens_per_char=2)
+    prompt = skill_manager.build_dynamic_system_prompt(skill_name, keywords)
+
+    assert tokenizer.calls > 0
+    assert prompt != full
+    assert '## ガイドライン等の出典' not in prompt
@@ -0,0 +1,146 @@
+"""Tests for the structured (JSON) check result and splitting it per product"""
+
+import json
+import types
+
+import pytest
+
+from structured_output import overall_conclusion, parse_result, product_conclusion, render_product
+
+
+def product(product_id, name, conclusion='OK', keywords=()):
+    return {
+        'product_id': product_id,
+        'product_name': name,
+        'conclusion': conclusion,
+        'keywords': list(keywords),
+        'issues': [
+            {'original_text': keyword, 'reason': f"「{keyword}」は使用不可", 'fix': '削除'} for keyword in keywords
+        ],
+        'comments': []
+    }
+
+
+def answer(*products):
+    return json.dumps({'products': list(products)}, ensure_ascii=False)
+
+
+def test_parse_result():
+    products = parse_result(answer(product(1, 'A'), product(2, 'B', 'NG', ['血行'])))
+
+    assert [item['product_name'] for item in products] == ['A', 'B']
+
+
+def test_parse_result_skips_entries_that_are_not_objects():
+    assert parse_result('{"products": [{"product_id": 1}, "B", null]}') == [{'product_id': 1}]
+
+
+@pytest.mark.parametrize('text', ['- 商品A\n  - 結論\n    - OK', '[]', '{"result": "OK"}', '{"products": "OK"}'])
+def test_parse_result_rejects_other_answers(text):
+    with pytest.raises(ValueError):
+        parse_result(text)
+
+
+@pytest.mark.parametrize('conclusion, expected', [('OK', 'OK'), ('NG', 'NG'), ('要確認', 'UNKNOWN'), (None, 'UNKNOWN')])
+def test_product_conclusion(conclusion, expected):
+    assert product_conclusion({'conclusion': conclusion} if conclusion else {}) == expected
+
+
+def test_overall_conclusion():
+    assert overall_conclusion([product(1, 'A'), product(2, 'B', 'NG')]) == 'NG'
+    assert overall_conclusion([product(1, 'A'), product(2, 'B')]) == 'OK'
+    assert overall_conclusion([product(1, 'A'), {'product_id': 2}]) == 'UNKNOWN'
+    assert overall_conclusion([]) == 'UNKNOWN'
+
+
+def test_render_product():
+    assert render_product(product(1, 'マッサージ器', 'NG', ['血行'])) == "\n".join([
+        "- マッサージ器",
+        "  - 結論",
+        "    - NG",
+        "  - 根拠(対象キーワード)",
+        "    - 血行",
+        "  - 問題点・改善点",
+        "    - 問題1",
+        "      - 原文: 血行",
+        "      - 理由: 「血行」は使用不可",
+        "      - 修正案: 削除",
+    ])
+
+
+def test_render_product_without_optional_items():
+    assert render_product({'conclusion': 'OKです'}) == "\n".join([
+        "- 商品名", "  - 結論", "    - UNKNOWN", "  - 根拠(対象キーワード)", "    - なし"
+    ])
+
+
+@pytest.fixture
+def structured(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'STRUCTURED_OUTPUT', True)
+    monkeypatch.setattr(app_module, 'result_cache', None)
+    return app_module
+
+
+def test_interpret_response_falls_back_for_text_answers(structured):
+    text = '- 商品A\n  - 結論\n    - NG'
+
+    assert structured.interpret_response(text) == (text, 'UNKNOWN')
+    assert structured.interpret_response(answer(product(1, 'A', 'NG', ['血行'])))[1] == 'NG'
+
+
+def test_split_answers_maps_products_by_id(structured):
+    answers = structured.split_answers(answer(
+        product(3, 'C', 'NG', ['血行']),
+        product(1, 'A'),
+        product(3, '重複した商品IDは無視'),
+        product(9, '範囲外は無視'),
+        product('2', '整数でない商品IDは無視'),
+        {'product_id': 4, 'product_name': 'D', 'conclusion': '不明'},
+    ), 4)
+
+    assert sorted(answers) == [1, 3, 4]
+    assert answers[1][0].startswith('- A\n') and answers[1][1] == 'OK'
+    assert answers[3][0].startswith('- C\n') and answers[3][1] == 'NG'
+    assert answers[4][1] == 'UNKNOWN'
+
+
+def test_split_answers_of_a_text_answer_is_empty(structured):
+    assert structured.split_answers('### 商品ID: 1\n- 商品A\n  - 結論\n    - OK', 1) == {}
+
+
+def test_check_batch_maps_each_product_to_its_row(structured, skill_name, monkeypatch):
+    rows = {
+        index: {'*商品名': name, '*変更前_商品の特徴BtoB': f'{name}は血行を促進します。'}
+        for index, name in ((10, 'マッサージ器A'), (11, 'マッサージ器B'), (12, 'マッサージ器C'))
+    }
+    batch = [structured.prepare_row(row_index, row, skill_name) for row_index, row in rows.items()]
+    assert all(item['result'] is None for item in batch)
+
+    call_llm = structured.call_llm
+    single_checks = []
+
+    def fake_call_llm(system_prompt, user_message, **kwargs):
+        if '商品ID' not in user_message:
+            single_checks.append(user_message)
+            return call_llm(system_prompt, user_message, **kwargs)
+        # 商品IDの順序が入れ替わり、2番目の商品の回答がなく、3番目が重複した回答
+        content = answer(
+            product(3, 'マッサージ器C', 'NG', ['血行']),
+            product(1, 'マッサージ器A'),
+            product(3, 'マッサージ器B'),
+        )
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))],
+            usage=types.SimpleNamespace(prompt_tokens=300, completion_tokens=90, total_tokens=390)
+        )
+
+    monkeypatch.setattr(structured, 'call_llm', fake_call_llm)
+
+    results = {row_index: (text, conclusion) for row_index, text, conclusion in structured.check_batch(batch, skill_name)}
+
+    assert sorted(results) == [10, 11, 12]
+    assert results[10][0].startswith('- マッサージ器A\n') and results[10][1] == 'OK'
+    assert results[12][0].startswith('- マッサージ器C\n') and results[12][1] == 'NG'
+    # 回答のなかった商品は単独で再チェックされる
+    assert len(single_checks) == 1 and 'マッサージ器B' in single_checks[0]
+    assert 'マッサージ器B' in results[11][0] and results[11][1] == 'NG'
@@ -0,0 +1,200 @@
+"""Tests for the page fetcher and the URL check, against a local HTTP server"""
+
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from web_fetcher import WebFetcher, UnsafeURLError, check_host, normalize_url
+
+
+PAGES = {
+    '/plain': ('スチールラック', 'スチール製の5段ラックです。棚板の高さを変えられます。'),
+    '/ng': ('マッサージ器', '血行を促進します。'),
+}
+ETAG = '"v1"'
+LAST_MODIFIED = 'Wed, 01 Jan 2025 00:00:00 GMT'
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """Serves the test pages over keep-alive HTTP/1.1 connections"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # ハンドラーは接続ごとに作られる
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path.startswith('/slow/'):
+                time.sleep(0.05)
+                self.send_page('ページ', 'スチール製の棚です。')
+            elif self.path == '/etag':
+                if self.headers.get('If-None-Match') == ETAG:
+                    self.send_not_modified()
+                else:
+                    self.send_page('ETag', 'スチール製の棚です。', {'ETag': ETAG})
+            elif self.path == '/last-modified':
+                if self.headers.get('If-Modified-Since') == LAST_MODIFIED:
+                    self.send_not_modified()
+                else:
+                    self.send_page('Last-Modified', 'スチール製の棚です。', {'Last-Modified': LAST_MODIFIED})
+            elif self.path == '/redirect':
+                self.send_response(302)
+                self.send_header('Location', f'http://localhost:{server.server_port}/plain')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            elif self.path in PAGES:
+                self.send_page(*PAGES[self.path])
+            else:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def send_page(self, title, text, headers=None):
+        body = f'<html><head><title>{title}</title></head><body><p>{text}</p></body></html>'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_not_modified(self):
+        self.send_response(304)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def page_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = server.requests = server.active = server.max_active = 0
+    server.url = f'http://127.0.0.1:{server.server_port}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fetcher():
+    fetcher = WebFetcher(max_connections=8, max_per_host=2, timeout=5, allowed_hosts=['127.0.0.1'])
+    yield fetcher
+    fetcher.close()
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1/',
+    'http://localhost/',
+    'http://169.254.169.254/latest/meta-data/',
+    'http://10.0.0.1/',
+    'http://[::1]/',
+    'http://[::ffff:127.0.0.1]/',
+])
+def test_internal_addresses_are_rejected(url):
+    fetcher = WebFetcher()
+    try:
+        page = fetcher.fetch(url)
+    finally:
+        fetcher.close()
+
+    assert page['status'] is None
+    assert 'not allowed' in page['error']
+
+
+@pytest.mark.parametrize('url', ['file:///etc/passwd', 'ftp://example.com/', 'gopher://example.com/'])
+def test_non_http_schemes_are_rejected(url):
+    with pytest.raises(UnsafeURLError):
+        normalize_url(url)
+
+
+def test_public_address_is_allowed():
+    check_host('93.184.216.34', 443)
+
+
+def test_allowlist_only_allows_listed_hosts():
+    check_host('LOCALHOST', 80, {'localhost'})
+    with pytest.raises(UnsafeURLError):
+        check_host('93.184.216.34', 443, {'localhost'})
+
+
+def test_pooled_fetch_reuses_connections(page_server, fetcher):
+    for _ in range(5):
+        page = fetcher.fetch(f'{page_server.url}/plain')
+        assert page['error'] is None
+        assert page['title'] == 'スチールラック'
+        assert '5段ラック' in page['text']
+
+    assert page_server.requests == 5
+    assert page_server.connections == 1
+
+
+def test_fetch_all_respects_per_host_limit(page_server, fetcher):
+    urls = [f'{page_server.url}/slow/{index}' for index in range(12)]
+
+    pages = dict(fetcher.fetch_all(urls))
+
+    assert sorted(pages) == list(range(12))
+    assert all(page['error'] is None for page in pages.values())
+    assert pages[3]['url'] == urls[3]
+    assert page_server.max_active == fetcher.max_per_host
+    assert page_server.connections <= fetcher.max_per_host
+
+
+@pytest.mark.parametrize('path', ['/etag', '/last-modified'])
+def test_not_modified_reuses_extracted_text(page_server, fetcher, path):
+    first = fetcher.fetch(f'{page_server.url}{path}')
+    second = fetcher.fetch(f'{page_server.url}{path}')
+
+    assert (first['status'], first['cached']) == (200, False)
+    assert (second['status'], second['cached']) == (304, True)
+    assert (second['title'], second['text']) == (first['title'], first['text'])
+    assert fetcher.stats()['not_modified'] == 1
+
+
+def test_redirect_to_host_not_allowed_is_blocked(page_server, fetcher):
+    page = fetcher.fetch(f'{page_server.url}/redirect')
+
+    assert page['error'] == 'Host not allowed: localhost'
+    assert page_server.requests == 1
+
+
+def test_check_urls_endpoint(app_module, client, skill_name, page_server, fetcher, monkeypatch):
+    monkeypatch.setattr(app_module, 'web_fetcher', fetcher)
+    urls = [
+        f'{page_server.url}/ng',
+        f'{page_server.url}/plain',
+        f'{page_server.url}/missing',
+        f'http://localhost:{page_server.server_port}/plain',
+        'file:///etc/passwd',
+    ]
+
+    response = client.post('/api/check-urls', json={'skill_name': skill_name, 'urls': urls})
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['url'] for result in results[:4]] == urls[:4]
+    assert [result['conclusion'] for result in results] == ['NG', 'OK', 'ERROR', 'ERROR', 'ERROR']
+    assert results[0]['title'] == 'マッサージ器'
+    assert results[2]['status'] == 404
+    assert 'Host not allowed' in results[3]['result']
+    assert 'Unsupported URL scheme' in results[4]['result']
@@ -0,0 +1,339 @@
+"""
+Web Fetcher for Keywords Checker
+Fetches product pages concurrently through a pooled keep-alive HTTP client with
+per-host limits, revalidates them with ETag/Last-Modified and extracts their text
+"""
+
+import re
+import socket
+import logging
+import ipaddress
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
+}
+
+# 本文として扱わない要素
+SKIP_TAGS = {'script', 'style', 'nav', 'footer', 'header', 'aside', 'iframe', 'noscript'}
+
+# Content-Type に charset がない場合に <meta> から文字コードを探す範囲
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([A-Za-z0-9_\-]+)', re.IGNORECASE)
+_META_SNIFF_BYTES = 4096
+
+
+class TextExtractor(HTMLParser):
+    """Collects the visible text and the title of an HTML page"""
+
+    def __init__(self):
+        super().__init__()
+        self.text = []
+        self.title = []
+        self.skip = 0
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip += 1
+        elif tag == 'title':
+            self.in_title = True
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip = max(0, self.skip - 1)
+        elif tag == 'title':
+            self.in_title = False
+
+    def handle_data(self, data):
+        stripped = data.strip()
+        if not stripped:
+            return
+        if self.in_title:
+            self.title.append(stripped)
+        elif not self.skip:
+            self.text.append(stripped)
+
+    def get_text(self):
+        return '\n'.join(self.text)
+
+    def get_title(self):
+        return ' '.join(self.title)
+
+
+def extract_text(html):
+    """
+    Extract the title and body text of an HTML page
+
+    Returns:
+        Tuple: (title, body_text)
+    """
+    parser = TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.get_title(), parser.get_text()
+
+
+def decode_html(content, charset=None):
+    """Decode an HTML body using the header charset, the <meta> charset or UTF-8"""
+    if not charset:
+        match = _META_CHARSET.search(content[:_META_SNIFF_BYTES])
+        charset = match.group(1).decode('ascii') if match else 'utf-8'
+    try:
+        return content.decode(charset, errors='ignore')
+    except LookupError:
+        return content.decode('utf-8', errors='ignore')
+
+
+class UnsafeURLError(ValueError):
+    """Raised for a URL the fetcher must not request (internal addresses or hosts not allowed)"""
+
+
+def normalize_url(url):
+    """
+    Validate a product page URL (https:// is added when the scheme is missing)
+
+    Raises:
+        ValueError: If the URL is not a valid http(s) URL
+    """
+    if not url or not isinstance(url, str):
+        raise ValueError("Invalid URL provided")
+
+    url = url.strip()
+    scheme = re.match(r'^([A-Za-z][A-Za-z0-9+.\-]*)://', url)
+    if scheme and scheme.group(1).lower() not in ('http', 'https'):
+        raise UnsafeURLError(f"Unsupported URL scheme: {scheme.group(1)}")
+    if not scheme:
+        url = 'https://' + url
+
+    parsed = urlparse(url)
+    if not parsed.netloc or not parsed.hostname:
+        raise ValueError(f"Invalid URL format: {url}")
+    return url
+
+
+def is_public_address(address):
+    """Whether an IP address is globally routable (not private, loopback, link-local, reserved...)"""
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def check_host(host, port, allowed_hosts=None):
+    """
+    Check that a host may be requested
+
+    許可リストがある場合はそのホストだけを許可する（社内の検証サイトなど、内部アドレスも含めて明示的に許可する）
+    許可リストがない場合は、名前解決したアドレスがすべてグローバルアドレスのホストだけを許可する
+    （クラウドのメタデータ・社内システム・localhost へのリクエストを防ぐ）
+
+    Args:
+        host: Host name or IP address of the URL
+        port: Port of the URL
+        allowed_hosts: Set of lower-cased host names allowed exclusively (None = any public host)
+
+    Raises:
+        UnsafeURLError: If the host must not be requested
+    """
+    host = host.lower().strip('[]')
+    if allowed_hosts is not None:
+        if host not in allowed_hosts:
+            raise UnsafeURLError(f"Host not allowed: {host}")
+        return
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError) as e:
+        raise UnsafeURLError(f"Cannot resolve host: {host} ({e})")
+
+    for address in addresses:
+        # IPv6 のスコープ（%eth0 など）は除いて判定する
+        if not is_public_address(address.split('%', 1)[0]):
+            raise UnsafeURLError(f"Internal address not allowed: {host} ({address})")
+
+
+class WebFetcher:
+    """Concurrent page fetcher sharing one keep-alive connection pool"""
+
+    def __init__(self, max_connections=16, max_per_host=4, timeout=15.0, cache_size=1000, allowed_hosts=None):
+        """
+        Initialize the WebFetcher
+
+        Args:
+            max_connections: Maximum number of concurrent requests (and pooled connections)
+            max_per_host: Maximum number of concurrent requests to one host
+            timeout: Timeout of a request in seconds
+            cache_size: Number of pages kept for conditional requests (0 = no cache)
+            allowed_hosts: Host names that may be fetched exclusively (internal addresses included);
+                if empty, any host resolving only to public addresses may be fetched
+        """
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.allowed_hosts = {host.lower() for host in allowed_hosts} if allowed_hosts else None
+        self.client = self._create_client()
+
+        self._host_slots = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _create_client(self):
+        return httpx.Client(
+            headers=DEFAULT_HEADERS,
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            ),
+            # リダイレクト先を含むすべてのリクエストの送信前に、宛先のホストを検査する
+            event_hooks={'request': [self._check_request]}
+        )
+
+    def _check_request(self, request):
+        if request.url.scheme not in ('http', 'https'):
+            raise UnsafeURLError(f"Unsupported URL scheme: {request.url.scheme}")
+        check_host(request.url.host, request.url.port or (443 if request.url.scheme == 'https' else 80),
+                   self.allowed_hosts)
+
+    def reopen(self):
+        """
+        Replace the connection pool
+
+        fork した子プロセスでは親プロセスのソケットを共有しないよう、子プロセスの開始時に呼び出す
+        """
+        self.client = self._create_client()
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return slot
+
+    def _cached(self, url):
+        with self._lock:
+            entry = self._cache.get(url)
+            if entry:
+                self._cache.move_to_end(url)
+            return entry
+
+    def _store(self, url, entry):
+        if not self.cache_size or not (entry['etag'] or entry['last_modified']):
+            return
+        with self._lock:
+            self._cache[url] = entry
+            self._cache.move_to_end(url)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def fetch(self, url):
+        """
+        Fetch a page and extract its text
+
+        前回の取得結果に ETag / Last-Modified があれば条件付きリクエストを送り、
+        304 Not Modified の場合は抽出済みのテキストを再利用する
+
+        Args:
+            url: Page URL
+
+        Returns:
+            Dictionary with url, status, title, text, cached and error
+            (error is set instead of raising when the page cannot be fetched)
+        """
+        page = {'url': url, 'status': None, 'title': '', 'text': '', 'cached': False, 'error': None}
+        try:
+            url = page['url'] = normalize_url(url)
+        except ValueError as e:
+            page['error'] = str(e)
+            return page
+
+        cached = self._cached(url)
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        try:
+            with self._host_slot(url):
+                response = self.client.get(url, headers=headers)
+        except UnsafeURLError as e:
+            logger.warning(f"URL {url} は取得しません: {e}")
+            page['error'] = str(e)
+            return page
+        except httpx.HTTPError as e:
+            page['error'] = f"Connection failed - {type(e).__name__}: {e}"
+            return page
+
+        page['status'] = response.status_code
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self.hits += 1
+            page.update(title=cached['title'], text=cached['text'], cached=True)
+            return page
+
+        with self._lock:
+            self.misses += 1
+        if response.status_code >= 400:
+            page['error'] = f"HTTP {response.status_code}"
+            return page
+
+        title, text = extract_text(decode_html(response.content, response.charset_encoding))
+        page.update(title=title, text=text)
+        if not text:
+            page['error'] = "No text content found"
+            return page
+
+        self._store(url, {
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'title': title,
+            'text': text
+        })
+        return page
+
+    def fetch_all(self, urls):
+        """
+        Fetch pages concurrently
+
+        Args:
+            urls: List of page URLs
+
+        Yields:
+            Tuples of (index in urls, page dictionary) in completion order
+        """
+        with ThreadPoolExecutor(max_workers=min(self.max_connections, max(1, len(urls)))) as executor:
+            futures = {executor.submit(self.fetch, url): index for index, url in enumerate(urls)}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def stats(self):
+        """Return conditional request statistics"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._cache),
+                'not_modified': self.hits,
+                'fetched': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+    def close(self):
+        self.client.close()
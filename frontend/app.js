@@ -4,10 +4,19 @@
  */
 
 const API_BASE_URL = 'http://localhost:5001/api';
+const JOB_POLL_INTERVAL_MS = 2000;
+
+// 一括チェックで一覧に表示する行の結論と表示
+const ROW_LABELS = {
+    NG: '❌ NG',
+    REVIEW: '🔍 要確認',
+    ERROR: '⚠️ エラー'
+};
 
 // DOM Elements
 let skillSelect, productInfo, checkButton, singleResult, singleLoading, singleError;
-let excelFile, batchCheckButton, batchLoading, batchError, batchSkillSelect;
+let excelFile, batchCheckButton, batchLoading, batchProgress, batchError, batchSkillSelect, batchModeSelect;
+let batchRows, batchRowList;
 
 // Initialize when DOM is loaded
 document.addEventListener('DOMContentLoaded', () => {
@@ -32,8 +41,12 @@ function initializeElements() {
     excelFile = document.getElementById('excel-file');
     batchCheckButton = document.getElementById('batch-check-button');
     batchLoading = document.getElementById('batch-loading');
+    batchProgress = document.getElementById('batch-progress');
     batchError = document.getElementById('batch-error');
     batchSkillSelect = document.getElementById('batch-skill-select');
+    batchModeSelect = document.getElementById('batch-mode-select');
+    batchRows = document.getElementById('batch-rows');
+    batchRowList = document.getElementById('batch-row-list');
 }
 
 /**
@@ -95,6 +108,7 @@ async function loadSkills() {
 
 /**
  * Check a single product
+ * The LLM answer is streamed and shown while it is being generated
  */
 async function checkProduct() {
     const productInfoText = productInfo.value.trim();
@@ -118,7 +132,8 @@ async function checkProduct() {
             },
             body: JSON.stringify({
                 skill_name: skillSelect.value,
-                product_info: productInfoText
+                product_info: productInfoText,
+                stream: true
             })
         });
         
@@ -126,8 +141,17 @@ async function checkProduct() {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         
-        const data = await response.json();
-        displaySingleResult(data);
+        let streamedText = '';
+        await readEventStream(response, (event, data) => {
+            if (event === 'token') {
+                streamedText += data.text;
+                displayStreamingResult(streamedText);
+            } else if (event === 'result') {
+                displaySingleResult(data);
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        });
         
     } catch (error) {
         showError(singleError, `エラーが発生しました: ${error.message}`);
@@ -168,6 +192,58 @@ function displaySingleResult(data) {
     }
 }
 
+/**
+ * Display the LLM answer received so far
+ */
+function displayStreamingResult(text) {
+    singleLoading.style.display = 'none';
+    singleResult.style.display = 'block';
+    
+    document.getElementById('single-conclusion').innerHTML = `
+        <div class="conclusion-badge unknown">⏳ 判定中...</div>
+    `;
+    document.getElementById('single-details').innerHTML = `<pre>${escapeHtml(text)}</pre>`;
+    document.getElementById('single-usage').innerHTML = '';
+}
+
+/**
+ * Read a text/event-stream response and call onEvent(event, data) for each message
+ */
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+            return;
+        }
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const message = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            const dataLines = [];
+            message.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) {
+                    event = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    dataLines.push(line.slice(6));
+                }
+            });
+            
+            if (dataLines.length > 0) {
+                onEvent(event, JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+}
+
 /**
  * Handle file selection for batch check
  */
@@ -179,6 +255,8 @@ function handleFileSelect(event) {
 
 /**
  * Check Excel file (batch processing)
+ * Submits the file as a background job, polls its progress and
+ * lists NG/REVIEW/ERROR rows as soon as they finish
  */
 async function checkExcel() {
     const file = excelFile.files[0];
@@ -190,15 +268,19 @@ async function checkExcel() {
     
     // Show loading
     batchLoading.style.display = 'block';
+    batchProgress.textContent = '一括チェック中... しばらくお待ちください';
     batchError.style.display = 'none';
     batchCheckButton.disabled = true;
     
+    let rowEvents = null;
+    
     try {
         const formData = new FormData();
         formData.append('file', file);
         formData.append('skill_name', batchSkillSelect.value);
+        formData.append('mode', batchModeSelect.value);
         
-        const response = await fetch(`${API_BASE_URL}/check-excel`, {
+        const response = await fetch(`${API_BASE_URL}/jobs`, {
             method: 'POST',
             body: formData
         });
@@ -208,28 +290,157 @@ async function checkExcel() {
             throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
         }
         
-        // Download the result file
-        const blob = await response.blob();
-        const url = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = `check_result_${new Date().getTime()}.xlsx`;
-        document.body.appendChild(a);
-        a.click();
-        window.URL.revokeObjectURL(url);
-        document.body.removeChild(a);
+        const job = await response.json();
+        rowEvents = streamJobRows(job.job_id);
+        const finishedJob = await pollJob(job.job_id);
+        
+        if (finishedJob.status === 'failed') {
+            throw new Error(finishedJob.error || 'ジョブが失敗しました');
+        }
+        
+        await downloadJobResult(finishedJob.job_id);
         
         // Show success message
-        showSuccess(batchError, '✅ チェック完了！結果ファイルがダウンロードされました。');
+        showSuccess(batchError, `✅ チェック完了！結果ファイルがダウンロードされました。（${formatCounts(finishedJob.counts)}）`);
         
     } catch (error) {
         showError(batchError, `エラーが発生しました: ${error.message}`);
     } finally {
+        if (rowEvents) {
+            rowEvents.close();
+        }
         batchLoading.style.display = 'none';
         batchCheckButton.disabled = false;
     }
 }
 
+/**
+ * Show the NG/REVIEW/ERROR rows of a job as they finish (Server-Sent Events)
+ * Returns the EventSource so that the caller can close it
+ */
+function streamJobRows(jobId) {
+    batchRowList.innerHTML = '';
+    batchRows.style.display = 'none';
+    
+    const source = new EventSource(`${API_BASE_URL}/jobs/${jobId}/events`);
+    
+    source.addEventListener('row', event => {
+        const row = JSON.parse(event.data);
+        if (!ROW_LABELS[row.conclusion]) {
+            return;
+        }
+        
+        // ヘッダー行があるため、Excel上の行番号は row_index + 2
+        const item = document.createElement('li');
+        item.className = `row-result ${row.conclusion.toLowerCase()}`;
+        item.innerHTML = `
+            <details>
+                <summary>${row.row_index + 2}行目: ${ROW_LABELS[row.conclusion]}</summary>
+                <pre>${escapeHtml(row.result)}</pre>
+            </details>
+        `;
+        batchRowList.appendChild(item);
+        batchRows.style.display = 'block';
+    });
+    
+    source.addEventListener('end', () => source.close());
+    
+    return source;
+}
+
+/**
+ * Poll a job until it is completed or failed
+ */
+async function pollJob(jobId) {
+    while (true) {
+        const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+        
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+        }
+        
+        const job = await response.json();
+        
+        if (job.status === 'completed' || job.status === 'failed') {
+            return job;
+        }
+        
+        batchProgress.textContent = formatJobProgress(job);
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+}
+
+/**
+ * Download the result workbook of a completed job
+ */
+async function downloadJobResult(jobId) {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}/result`);
+    
+    if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+    }
+    
+    // Download the result file
+    const blob = await response.blob();
+    const url = window.URL.createObjectURL(blob);
+    const a = document.createElement('a');
+    a.href = url;
+    a.download = `check_result_${new Date().getTime()}.xlsx`;
+    document.body.appendChild(a);
+    a.click();
+    window.URL.revokeObjectURL(url);
+    document.body.removeChild(a);
+}
+
+/**
+ * Format job progress for display
+ */
+function formatJobProgress(job) {
+    if (job.status === 'queued') {
+        return '順番待ち中...';
+    }
+    
+    let text = `一括チェック中... ${job.rows_done.toLocaleString()} / ${job.total_rows.toLocaleString()} 行`;
+    
+    if (job.rows_done > 0) {
+        text += `（${formatCounts(job.counts)}）`;
+    }
+    
+    if (job.eta_seconds !== null) {
+        text += ` 残り約${formatDuration(job.eta_seconds)}`;
+    }
+    
+    return text;
+}
+
+/**
+ * Format OK/NG/ERROR counts (and REVIEW in fast mode)
+ */
+function formatCounts(counts) {
+    return ['OK', 'NG', 'REVIEW', 'ERROR']
+        .filter(key => key !== 'REVIEW' || counts[key])
+        .map(key => `${key}: ${(counts[key] || 0).toLocaleString()}`)
+        .join(' / ');
+}
+
+/**
+ * Format seconds as a short Japanese duration
+ */
+function formatDuration(seconds) {
+    if (seconds < 60) {
+        return `${Math.ceil(seconds)}秒`;
+    }
+    
+    const minutes = Math.floor(seconds / 60);
+    if (minutes < 60) {
+        return `${minutes}分`;
+    }
+    
+    return `${Math.floor(minutes / 60)}時間${minutes % 60}分`;
+}
+
 /**
  * Show error message
  */